@@ -0,0 +1,91 @@
+"""
+Refreshes every Spotify token that expires within a horizon, so tokens are warm before
+users arrive instead of being refreshed inside their requests.
+
+Usage:
+    python manage.py refresh_tokens --horizon 900 --workers 8
+
+Meant to run periodically (e.g. from cron every few minutes, with a horizon longer than
+the interval). Refreshes go through accounts.utils.refresh_spotify_token with the horizon
+as their refresh margin, so they share its per-user single-flight lock with requests
+refreshing at the same time, and only skip tokens that no longer expire within the horizon.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from accounts.models import SpotifyToken
+from accounts.utils import refresh_spotify_token
+
+REVOKED_ERROR = 'invalid_grant'
+
+
+def refresh_one(username, horizon):
+    """
+    Refreshes one user's token on a worker thread, if it still expires within the
+    horizon (another caller may have refreshed it in the meantime).
+
+    Returns:
+        Tuple of (username, outcome, detail) where outcome is 'refreshed', 'skipped',
+        'revoked' or 'failed'
+    """
+    try:
+        response = refresh_spotify_token(username, margin=horizon)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return username, 'failed', str(e)
+    finally:
+        connection.close()
+    if response is None:
+        return username, 'skipped', 'refreshed by another caller'
+    if response.get('error') == REVOKED_ERROR:
+        return username, 'revoked', response.get('error_description', REVOKED_ERROR)
+    if 'error' in response:
+        return username, 'failed', response.get('error_description', response['error'])
+    return username, 'refreshed', ''
+
+
+class Command(BaseCommand):
+    """
+    Refreshes tokens expiring within --horizon seconds with bounded parallelism.
+    """
+    help = "Refreshes Spotify tokens that expire within a horizon."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=900,
+                            help="Refresh tokens expiring within this many seconds "
+                                 "(expired tokens included).")
+        parser.add_argument('--workers', type=int, default=8,
+                            help="The most refreshes running at once.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only list the tokens that would be refreshed.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() + timedelta(seconds=options['horizon'])
+        usernames = list(SpotifyToken.objects.filter(  # pylint: disable=no-member
+            expires_in__lte=cutoff).order_by('expires_in').values_list('username', flat=True))
+        self.stdout.write(f"{len(usernames)} token(s) expire within {options['horizon']}s")
+        if options['dry_run'] or not usernames:
+            for username in usernames:
+                self.stdout.write(f"  {username}")
+            return
+
+        outcomes = {'refreshed': [], 'skipped': [], 'revoked': [], 'failed': []}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            futures = [executor.submit(refresh_one, username, options['horizon'])
+                       for username in usernames]
+            for future in as_completed(futures):
+                username, outcome, detail = future.result()
+                outcomes[outcome].append((username, detail))
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            f"Refreshed {len(outcomes['refreshed'])}, skipped {len(outcomes['skipped'])}, "
+            f"revoked {len(outcomes['revoked'])}, failed {len(outcomes['failed'])} "
+            f"in {elapsed:.2f}s ({len(usernames) / elapsed if elapsed else 0:.1f} tokens/s)")
+        for outcome in ('revoked', 'failed'):
+            for username, detail in outcomes[outcome]:
+                self.stderr.write(f"  {outcome}: {username}: {detail}")
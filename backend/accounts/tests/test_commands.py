@@ -0,0 +1,86 @@
+"""
+Unit tests for the refresh_tokens management command.
+"""
+
+from io import StringIO
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from accounts.models import SpotifyToken
+
+
+def create_token(username, expires_in_seconds):
+    """Stores a token for username expiring after the given number of seconds."""
+    return SpotifyToken.objects.create(
+        user=username, username=username, access_token='access', refresh_token='refresh',
+        expires_in=timezone.now() + timedelta(seconds=expires_in_seconds), token_type='Bearer')
+
+
+class RefreshTokensCommandTest(TestCase):
+    """Test cases for manage.py refresh_tokens."""
+
+    def setUp(self):
+        create_token('expired', -60)
+        create_token('expiring', 300)
+        create_token('revoked', 600)
+        create_token('broken', 700)
+        create_token('fresh', 3600)
+
+    @patch('accounts.management.commands.refresh_tokens.connection')
+    @patch('accounts.management.commands.refresh_tokens.refresh_spotify_token')
+    def test_refreshes_tokens_within_horizon(self, mock_refresh, mock_connection):
+        """
+        Test that only tokens inside the horizon are refreshed, and outcomes are reported.
+        """
+        def fake_refresh(username, margin):
+            self.assertEqual(margin, 900)
+            if username == 'revoked':
+                return {'error': 'invalid_grant', 'error_description': 'Refresh token revoked'}
+            if username == 'broken':
+                raise ValueError("boom")
+            return {'access_token': 'new'}
+        mock_refresh.side_effect = fake_refresh
+        out, err = StringIO(), StringIO()
+
+        call_command('refresh_tokens', horizon=900, workers=2, stdout=out, stderr=err)
+
+        refreshed = sorted(call.args[0] for call in mock_refresh.call_args_list)
+        self.assertEqual(refreshed, ['broken', 'expired', 'expiring', 'revoked'])
+        self.assertIn("Refreshed 2, skipped 0, revoked 1, failed 1", out.getvalue())
+        self.assertIn("revoked: revoked: Refresh token revoked", err.getvalue())
+        self.assertIn("failed: broken: boom", err.getvalue())
+
+    @patch('accounts.management.commands.refresh_tokens.refresh_spotify_token')
+    def test_dry_run(self, mock_refresh):
+        """
+        Test that a dry run lists the tokens without refreshing them.
+        """
+        out = StringIO()
+
+        call_command('refresh_tokens', horizon=400, dry_run=True, stdout=out)
+
+        mock_refresh.assert_not_called()
+        self.assertIn("2 token(s) expire within 400s", out.getvalue())
+
+
+class RefreshTokensMarginTest(TransactionTestCase):
+    """
+    Test cases for manage.py refresh_tokens going through refresh_spotify_token.
+    A TransactionTestCase, so the worker threads can read the stored tokens.
+    """
+
+    @patch('accounts.utils._post_token_refresh', return_value={'access_token': 'new'})
+    def test_refreshes_tokens_beyond_refresh_margin(self, mock_post):
+        """
+        Test that a token expiring between the refresh margin and the horizon is refreshed
+        rather than taken for one another caller has just refreshed.
+        """
+        create_token('expiring', 600)
+        out = StringIO()
+
+        call_command('refresh_tokens', horizon=900, stdout=out)
+
+        mock_post.assert_called_once_with('expiring')
+        self.assertIn("Refreshed 1, skipped 0", out.getvalue())
@@ -10,42 +10,68 @@ of Spotify tokens, as well as handling of edge cases and errors.
 Dependencies are mocked to isolate tests and avoid external API calls or database interactions.
 """
 
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 from datetime import timedelta
+from django.core.cache import cache
 from django.utils import timezone
 from django.test import TestCase
 from requests.exceptions import RequestException
+from accounts.models import SpotifyToken
 from accounts.utils import (
     get_user_tokens,
     update_or_create_user_tokens,
     is_spotify_authenticated,
-    refresh_spotify_token
+    refresh_spotify_token,
+    schedule_token_refresh,
+    refresh_lock_key,
+    _local_token_cache,
+    _wait_for_refresh
 )
 
 class SpotifyTokensTestCase(TestCase):
     """Test cases for Spotify token management functions."""
 
-    @patch('accounts.models.SpotifyToken.objects')
-    def test_get_user_tokens_exists(self, mock_objects):
+    def setUp(self):
+        """
+        Starts every test with empty token caches.
+        """
+        cache.clear()
+        _local_token_cache().clear()
+
+    def test_get_user_tokens_exists(self):
         """
-        Test that get_user_tokens returns the token when it exists in the database.
+        Test that get_user_tokens returns the token when it exists in the database,
+        with a single query, and serves later lookups from the cache.
         """
         username = 'test_session'
-        token = MagicMock()
+        token = SpotifyToken.objects.create(user=username, username=username,
+                                            access_token='access', refresh_token='refresh',
+                                            expires_in=timezone.now() + timedelta(hours=1),
+                                            token_type='Bearer')
 
-        # Create a mock queryset
-        mock_queryset = MagicMock()
-        mock_queryset.exists.return_value = True
-        mock_queryset.__getitem__.return_value = token  # So user_tokens[0] returns token
+        with self.assertNumQueries(1):
+            result = get_user_tokens(username)
+        self.assertEqual(result, token)
 
-        # Set the return value of filter to be the mock queryset
-        mock_objects.filter.return_value = mock_queryset
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_tokens(username), token)
+        _local_token_cache().clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_tokens(username), token)
 
-        result = get_user_tokens(username)
+    def test_update_invalidates_cached_tokens(self):
+        """
+        Test that updating a token replaces the cached copy.
+        """
+        username = 'test_session'
+        update_or_create_user_tokens('old_access', 'Bearer', 3600, 'refresh', username)
+        self.assertEqual(get_user_tokens(username).access_token, 'old_access')
 
-        mock_objects.filter.assert_called_with(username=username)
-        self.assertEqual(result, token)
+        update_or_create_user_tokens('new_access', 'Bearer', 3600, 'refresh', username)
+
+        self.assertEqual(get_user_tokens(username).access_token, 'new_access')
 
     @patch('accounts.models.SpotifyToken.objects')
     def test_get_user_tokens_not_exists(self, mock_objects):
@@ -53,7 +79,7 @@ class SpotifyTokensTestCase(TestCase):
         Test that get_user_tokens returns None when the token does not exist.
         """
         username = 'test_session'
-        mock_objects.filter.return_value.exists.return_value = False
+        mock_objects.filter.return_value.first.return_value = None
 
         result = get_user_tokens(username=username)
 
@@ -147,6 +173,52 @@ class SpotifyTokensTestCase(TestCase):
         self.assertTrue(result)
         mock_refresh_token.assert_called_once_with(username=username)
 
+    @patch('accounts.utils.schedule_token_refresh')
+    @patch('accounts.utils.refresh_spotify_token')
+    @patch('accounts.utils.get_user_tokens')
+    def test_is_spotify_authenticated_expiring_token(self, mock_get_user_tokens,
+                                                     mock_refresh_token, mock_schedule):
+        """
+        Test that a token about to expire is refreshed in the background, not inline.
+        """
+        username = 'test_session'
+        token = MagicMock()
+        token.expires_in = timezone.now() + timedelta(seconds=60)
+        mock_get_user_tokens.return_value = token
+
+        self.assertTrue(is_spotify_authenticated(username=username))
+
+        mock_refresh_token.assert_not_called()
+        mock_schedule.assert_called_once_with(username)
+
+    @patch('accounts.utils.refresh_spotify_token')
+    def test_schedule_token_refresh_runs_once(self, mock_refresh_token):
+        """
+        Test that a background refresh runs, and is not scheduled twice while pending.
+        """
+        started = threading.Event()
+        release = threading.Event()
+        mock_refresh_token.side_effect = lambda username: (started.set(), release.wait(5))
+
+        future = schedule_token_refresh('test_session')
+        started.wait(5)
+        self.assertIsNone(schedule_token_refresh('test_session'))
+        release.set()
+        future.result(timeout=5)
+
+        mock_refresh_token.assert_called_once_with(username='test_session')
+
+    @patch('accounts.utils.refresh_spotify_token', side_effect=RequestException("down"))
+    def test_schedule_token_refresh_logs_failures(self, mock_refresh_token):
+        """
+        Test that a failed background refresh is logged, and can be scheduled again.
+        """
+        with self.assertLogs('accounts.utils', level='ERROR') as logs:
+            schedule_token_refresh('test_session').result(timeout=5)
+            schedule_token_refresh('test_session').result(timeout=5)
+        self.assertIn('Background token refresh failed for test_session', logs.output[0])
+        self.assertEqual(mock_refresh_token.call_count, 2)
+
     @patch('accounts.utils.get_user_tokens')
     def test_is_spotify_authenticated_no_token(self, mock_get_user_tokens):
         """
@@ -159,6 +231,54 @@ class SpotifyTokensTestCase(TestCase):
 
         self.assertFalse(result)
 
+    @patch('accounts.utils._was_just_refreshed', return_value=False)
+    @patch('accounts.utils._post_token_refresh')
+    def test_refresh_spotify_token_single_flight(self, mock_post_refresh, mock_just_refreshed):
+        """
+        Test that concurrent refreshes for one user post the refresh token only once,
+        and that the other callers wait for it to finish.
+        """
+        started = threading.Event()
+        release = threading.Event()
+        waiting = threading.Semaphore(0)
+        mock_post_refresh.side_effect = lambda username: (started.set(), release.wait(5))
+
+        def wait_for_refresh(username):
+            waiting.release()
+            _wait_for_refresh(username)
+
+        leader = threading.Thread(target=refresh_spotify_token, args=('test_session',))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=refresh_spotify_token, args=('test_session',))
+                     for _ in range(3)]
+        with patch('accounts.utils._wait_for_refresh', side_effect=wait_for_refresh):
+            for follower in followers:
+                follower.start()
+            # only let the leader finish once every follower is waiting for it
+            for _ in followers:
+                self.assertTrue(waiting.acquire(timeout=5))
+            release.set()
+            for thread in [leader] + followers:
+                thread.join(5)
+
+        mock_post_refresh.assert_called_once_with('test_session')
+        self.assertIsNone(cache.get(refresh_lock_key('test_session')))
+
+    @patch('accounts.utils._post_token_refresh')
+    def test_refresh_spotify_token_skips_fresh_token(self, mock_post_refresh):
+        """
+        Test that a token another caller has just refreshed is not refreshed again.
+        """
+        SpotifyToken.objects.create(user='test_session', username='test_session',
+                                    access_token='access', refresh_token='refresh',
+                                    expires_in=timezone.now() + timedelta(hours=1),
+                                    token_type='Bearer')
+
+        refresh_spotify_token('test_session')
+
+        mock_post_refresh.assert_not_called()
+
     @patch('accounts.utils.update_or_create_user_tokens')
     @patch('accounts.utils.post')
     @patch('accounts.utils.get_user_tokens')
@@ -189,7 +309,7 @@ class SpotifyTokensTestCase(TestCase):
 
         mock_load_dotenv.assert_called_once()
         mock_post.assert_called_once_with(
-            'https://accounts.spotify.com/api/tokens',
+            'https://accounts.spotify.com/api/token',
             data={
                 'grant_type': 'refresh_token',
                 'refresh_token': refresh_token,
@@ -236,6 +356,25 @@ class SpotifyTokensTestCase(TestCase):
             refresh_token=refresh_token
         )
 
+    @patch('accounts.utils.update_or_create_user_tokens')
+    @patch('accounts.utils.post')
+    @patch('accounts.utils.get_user_tokens')
+    @patch('accounts.utils.os.getenv')
+    @patch('accounts.utils.load_dotenv')
+    def test_refresh_spotify_token_revoked(self, mock_load_dotenv, mock_getenv,
+                                           mock_get_user_tokens, mock_post, mock_update_tokens):
+        """
+        Test that a revoked refresh token is reported without overwriting the stored tokens.
+        """
+        mock_get_user_tokens.return_value = MagicMock(refresh_token='revoked_refresh_token')
+        mock_getenv.side_effect = lambda key: {'CLIENT_ID': 'client_id',
+                                               'CLIENT_SECRET': 'client_secret'}.get(key)
+        error = {'error': 'invalid_grant', 'error_description': 'Refresh token revoked'}
+        mock_post.return_value.json.return_value = error
+
+        self.assertEqual(refresh_spotify_token('test_session'), error)
+        mock_update_tokens.assert_not_called()
+
     @patch('accounts.utils.post')
     @patch('accounts.utils.get_user_tokens')
     @patch('accounts.utils.os.getenv')
@@ -265,7 +404,7 @@ class SpotifyTokensTestCase(TestCase):
         Test get_user_tokens with an invalid session_id.
         """
         username = None
-        mock_objects.filter.return_value.exists.return_value = False
+        mock_objects.filter.return_value.first.return_value = None
 
         result = get_user_tokens(username)
 
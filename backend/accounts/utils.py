@@ -4,38 +4,116 @@ This module provides utility functions to manage Spotify authentication tokens f
 It includes functionality for retrieving, updating, and refreshing Spotify tokens,
 allowing users to authenticate with the Spotify API.
 
+Tokens are read through two cache layers: a short-lived per-process LRU in front of the
+shared Django cache, in front of the database. update_or_create_user_tokens and
+delete_user_data invalidate both. Tokens close to expiry are refreshed in a background
+thread, so user-facing requests do not wait on accounts.spotify.com.
+
 Functions:
     - get_user_tokens: Retrieve Spotify tokens for a given user by username.
     - update_or_create_user_tokens: Update or create Spotify tokens for a user in the database.
     - is_spotify_authenticated: Check if a user is authenticated with Spotify.
     - refresh_spotify_token: Refresh a user's Spotify access token using their refresh token.
+    - schedule_token_refresh: Refresh a user's token in the background.
+    - invalidate_user_tokens: Drop a user's token from the caches.
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+import logging
 import os
 import secrets
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.utils import timezone
 from dotenv import load_dotenv
-from requests import post
 from accounts.models import SpotifyToken
+from spotify_data.cache import TTLCache
+from spotify_data.client import accounts_url, post
+
+DEFAULT_TOKEN_CACHE = {
+    'ttl': 300,  # seconds a token stays in the shared Django cache
+    'local_ttl': 30,  # seconds a token stays in the per-process cache
+    'max_entries': 1024,  # tokens kept per process
+    'refresh_margin': 300,  # seconds before expiry at which tokens are refreshed
+    'refresh_lock_timeout': 15,  # seconds a refresh may hold the per-user lock
+    'refresh_wait': 10,  # seconds a caller waits for someone else's refresh
+}
+TOKEN_CACHE_PREFIX = 'spotify_token'
+REFRESH_POLL_INTERVAL = 0.05
+
+logger = logging.getLogger(__name__)
+
+_local_tokens = None
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='token-refresh')
+_pending_refreshes = set()
+_pending_refreshes_lock = threading.Lock()
+
+
+def get_token_cache_config():
+    """
+    Returns SPOTIFY_TOKEN_CACHE from settings with missing keys filled from the defaults.
+    """
+    return {**DEFAULT_TOKEN_CACHE, **getattr(settings, 'SPOTIFY_TOKEN_CACHE', {})}
 
+def _local_token_cache():
+    """
+    Returns the per-process token cache, creating it on first use.
+    """
+    global _local_tokens  # pylint: disable=global-statement
+    if _local_tokens is None:
+        config = get_token_cache_config()
+        _local_tokens = TTLCache(config['local_ttl'], config['max_entries'])
+    return _local_tokens
 
-def get_user_tokens(username):
+def token_cache_key(username):
+    """
+    Returns the shared cache key of a user's token.
+    """
+    return f'{TOKEN_CACHE_PREFIX}:{username}'
+
+def invalidate_user_tokens(username):
+    """
+    Drops a user's token from the shared cache and from this process's cache.
+    Other processes may keep serving their copy for up to SPOTIFY_TOKEN_CACHE['local_ttl']
+    seconds, which is safe because a replaced access token stays valid until it expires.
+    """
+    _local_token_cache().delete(username)
+    cache.delete(token_cache_key(username))
+
+
+def get_user_tokens(username, use_cache=True):
     """
     Retrieve the Spotify token for a given user by username.
 
-    This function queries the database to retrieve the user's Spotify token based on their username.
+    This function looks the user's Spotify token up in the per-process cache, then in the
+    shared cache, and finally queries the database with a single query.
     If a token exists, it returns the token; otherwise, it returns None.
 
     Parameters:
         username (str): The username of the user.
+        use_cache (bool): Set to False to always read the database.
 
     Returns:
         SpotifyToken: The SpotifyToken object for the user if it exists, otherwise None.
     """
-    user_tokens = SpotifyToken.objects.filter(username=username)
-    if user_tokens.exists():
-        return user_tokens[0]
-    return None
+    if use_cache:
+        local_tokens = _local_token_cache()
+        tokens = local_tokens.get(username)
+        if tokens is None:
+            tokens = cache.get(token_cache_key(username))
+            if tokens is not None:
+                local_tokens.set(username, tokens)
+        if tokens is not None:
+            return tokens
+
+    tokens = SpotifyToken.objects.filter(username=username).first()
+    if tokens is not None:
+        cache.set(token_cache_key(username), tokens, timeout=get_token_cache_config()['ttl'])
+        _local_token_cache().set(username, tokens)
+    return tokens
 
 def update_or_create_user_tokens(access_token, token_type, expires_in, refresh_token,
                                  username):
@@ -56,7 +134,7 @@ def update_or_create_user_tokens(access_token, token_type, expires_in, refresh_t
     Returns:
         None
     """
-    tokens = get_user_tokens(username=username)
+    tokens = get_user_tokens(username=username, use_cache=False)
     expires_in = timezone.now() + timedelta(seconds=expires_in)
 
     if tokens:
@@ -69,6 +147,7 @@ def update_or_create_user_tokens(access_token, token_type, expires_in, refresh_t
         tokens = SpotifyToken(user=username, username=username, access_token=access_token, token_type=token_type,
                               expires_in=expires_in, refresh_token=refresh_token)
         tokens.save()
+    invalidate_user_tokens(username)
 
 def is_spotify_authenticated(username):
     """
@@ -76,6 +155,8 @@ def is_spotify_authenticated(username):
 
     This function verifies if a user has valid Spotify tokens in the database.
     If the user's access token has expired, it automatically refreshes the token and returns True.
+    If it expires within SPOTIFY_TOKEN_CACHE['refresh_margin'] seconds, it is refreshed in the
+    background instead, so the request does not wait on Spotify.
     If the token is valid or has been refreshed, the user is considered authenticated.
     If no tokens exist for the user, it returns False.
 
@@ -88,24 +169,100 @@ def is_spotify_authenticated(username):
     tokens = get_user_tokens(username)
     if tokens:
         expiry = tokens.expires_in
-        if expiry <= timezone.now():
+        now = timezone.now()
+        if expiry <= now:
             refresh_spotify_token(username=username)
+        elif expiry <= now + timedelta(seconds=get_token_cache_config()['refresh_margin']):
+            schedule_token_refresh(username)
         return True
     return False
 
-def refresh_spotify_token(username):
+def refresh_lock_key(username):
+    """
+    Returns the shared cache key of the lock held while a user's token is refreshed.
+    """
+    return f'{TOKEN_CACHE_PREFIX}:refreshing:{username}'
+
+def _acquire_refresh_lock(username):
+    """
+    Takes the per-user refresh lock in the shared cache.
+
+    Returns:
+        The lock's owner id if the lock was taken, otherwise None.
+    """
+    owner = secrets.token_hex(8)
+    timeout = get_token_cache_config()['refresh_lock_timeout']
+    if cache.add(refresh_lock_key(username), owner, timeout=timeout):
+        return owner
+    return None
+
+def _release_refresh_lock(username, owner):
+    """
+    Releases the per-user refresh lock if it is still ours (it may have timed out).
+    """
+    if cache.get(refresh_lock_key(username)) == owner:
+        cache.delete(refresh_lock_key(username))
+
+def _wait_for_refresh(username):
+    """
+    Waits until the refresh running elsewhere releases its lock, or for at most
+    SPOTIFY_TOKEN_CACHE['refresh_wait'] seconds.
+    """
+    deadline = time.monotonic() + get_token_cache_config()['refresh_wait']
+    while cache.get(refresh_lock_key(username)) is not None:
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(REFRESH_POLL_INTERVAL)
+
+def _was_just_refreshed(username, margin=None):
+    """
+    Returns True if the stored token was refreshed by someone else and is no longer
+    within the refresh margin (SPOTIFY_TOKEN_CACHE['refresh_margin'] seconds by default),
+    so refreshing it again would be redundant.
+    """
+    expiry = SpotifyToken.objects.filter(username=username).values_list(
+        'expires_in', flat=True).first()
+    if margin is None:
+        margin = get_token_cache_config()['refresh_margin']
+    return expiry is not None and expiry > timezone.now() + timedelta(seconds=margin)
+
+def refresh_spotify_token(username, margin=None):
     """
     Refresh the Spotify access token for a user.
 
-    This function sends a POST request to Spotify's API to refresh the access token using
-    the user's stored refresh token. It updates the user's tokens in the database with the new
-    access and refresh tokens.
+    Refreshes are single-flight per user: the first caller takes a lock in the shared cache
+    and refreshes, while concurrent callers wait for it to finish and reuse the stored
+    result instead of posting the same refresh token again. A caller that gets the lock
+    right after another refresh finished skips the refresh as well.
 
     Parameters:
         username (str): The username of the user.
+        margin (int): Refresh the token if it expires within this many seconds
+            (defaults to SPOTIFY_TOKEN_CACHE['refresh_margin']), e.g. the horizon of
+            manage.py refresh_tokens.
 
     Returns:
-        None
+        dict: The token endpoint's response, or None if another caller did the refresh.
+    """
+    owner = _acquire_refresh_lock(username)
+    if owner is None:
+        _wait_for_refresh(username)
+        invalidate_user_tokens(username)
+        return None
+    try:
+        if _was_just_refreshed(username, margin):
+            invalidate_user_tokens(username)
+            return None
+        return _post_token_refresh(username)
+    finally:
+        _release_refresh_lock(username, owner)
+
+def _post_token_refresh(username):
+    """
+    Sends a POST request to Spotify's API to refresh the access token using the user's
+    stored refresh token, and stores the new access and refresh tokens.
+    Error responses (e.g. a revoked refresh token) are returned without touching the
+    stored tokens.
     """
     load_dotenv()
     refresh_token = get_user_tokens(username=username).refresh_token
@@ -115,13 +272,16 @@ def refresh_spotify_token(username):
     if not client_id or not client_secret:
         raise TypeError("SET UP CLIENT ENV VARIABLES")
 
-    response = post('https://accounts.spotify.com/api/tokens', data={
+    response = post(accounts_url('/api/token'), data={
         'grant_type': 'refresh_token',
         'refresh_token': refresh_token,
         'client_id': client_id,
         'client_secret': client_secret
     }, timeout=10).json()
 
+    if 'error' in response:
+        return response
+
     access_token = response.get('access_token')
     token_type = response.get('token_type')
     refresh_token = response.get('refresh_token') or refresh_token
@@ -130,6 +290,37 @@ def refresh_spotify_token(username):
     update_or_create_user_tokens(username=username, access_token=access_token,
                                  token_type=token_type, refresh_token=refresh_token,
                                  expires_in=expires_in)
+    return response
+
+def _refresh_in_background(username):
+    """
+    Refreshes a user's token on a background thread, logging failures.
+    """
+    try:
+        refresh_spotify_token(username=username)
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Background token refresh failed for %s", username)
+    finally:
+        with _pending_refreshes_lock:
+            _pending_refreshes.discard(username)
+        connection.close()
+
+def schedule_token_refresh(username):
+    """
+    Refreshes a user's Spotify token in the background, unless a refresh for that user
+    is already pending in this process.
+
+    Parameters:
+        username (str): The username of the user.
+
+    Returns:
+        Future of the refresh, or None if one was already pending.
+    """
+    with _pending_refreshes_lock:
+        if username in _pending_refreshes:
+            return None
+        _pending_refreshes.add(username)
+    return _refresh_executor.submit(_refresh_in_background, username)
 
 def generate_state():
     '''Generates state for Spotify Encryption for more security'''
@@ -138,3 +329,4 @@ def generate_state():
 def delete_user_data(username):
     '''Deletes user data from spotify token database'''
     SpotifyToken.objects.filter(username=username).delete()
+    invalidate_user_tokens(username)
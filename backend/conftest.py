@@ -9,6 +9,10 @@ such as a test client and a test user.
 Fixtures:
     - client: Provides a Django test client instance for simulating HTTP requests.
     - test_user: Creates and returns a test user instance in the test database.
+    - disable_llm_cache: Turns the LLM completion cache off unless a test enables it.
+    - disable_llm_metrics: Turns LLM call recording off unless a test enables it.
+    - reset_breaker: Gives every test a closed LLM circuit breaker.
+    - fake_llm_backend: Answers LLM calls with the in-process fake instead of Groq.
 
 Functions:
     - pytest_configure: Configures the Django settings for pytest, initializing 
@@ -36,7 +40,8 @@ import django
 
 def pytest_load_initial_conftests(args):
     import os
-    os.environ['GROQ_API_KEY'] = os.environ.get('GROQ_API_KEY')
+    # Any key works with the fake LLM backend the tests run against
+    os.environ.setdefault('GROQ_API_KEY', 'test-groq-key')
 
 def pytest_configure():
     """
@@ -90,3 +95,50 @@ def test_user(db):
     from django.contrib.auth.models import User  # Import User after Django setup
     user = User.objects.create(username="testuser")
     return user
+
+
+@pytest.fixture(autouse=True)
+def disable_llm_cache(settings):
+    """
+    Turns the LLM completion cache off for every test, so tests mocking Groq always
+    reach the mock and do not need the database. Tests of the cache turn it back on
+    with `settings.LLM_CACHE = {'enabled': True}`.
+    """
+    from spotify_data.llm_cache import clear_llm_cache  # Import after Django setup
+    settings.LLM_CACHE = {'enabled': False}
+    clear_llm_cache()
+
+
+@pytest.fixture(autouse=True)
+def reset_breaker():
+    """
+    Gives every test a closed LLM circuit breaker, so tests mocking Groq failures do not
+    open it for the tests that run after them.
+    """
+    from spotify_data.llm_breaker import reset_llm_breaker  # Import after Django setup
+    reset_llm_breaker()
+    yield
+    reset_llm_breaker()
+
+
+@pytest.fixture(autouse=True)
+def fake_llm_backend(settings):
+    """
+    Answers LLM calls with deterministic in-process completions (see
+    spotify_data/llm_standin.py), so no test reaches Groq even if it forgets to mock it.
+    Tests of the real clients set `settings.LLM_BACKEND = 'groq'`.
+    """
+    settings.LLM_BACKEND = 'fake'
+    settings.LLM_FAKE = {}
+
+
+@pytest.fixture(autouse=True)
+def disable_llm_metrics(settings):
+    """
+    Turns LLM call recording off for every test, so tests calling the LLM helpers do not
+    need the database. Tests of the metrics turn it back on with
+    `settings.LLM_METRICS = {'enabled': True}`.
+    """
+    from spotify_data.llm_metrics import clear_llm_metrics  # Import after Django setup
+    settings.LLM_METRICS = {'enabled': False}
+    clear_llm_metrics()
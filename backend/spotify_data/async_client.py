@@ -0,0 +1,106 @@
+"""
+Async counterpart of spotify_data/client.py, built on httpx.AsyncClient.
+
+Async views await these calls instead of blocking a worker thread while Spotify answers,
+so a single ASGI worker can keep hundreds of I/O-bound requests in flight.
+
+httpx connections belong to the event loop that opened them, so one AsyncClient is kept
+per running loop. Under an ASGI server there is a single loop and therefore a single
+shared pool. Under WSGI (e.g. runserver) every async view runs in a loop of its own, so
+the client is closed when the request finishes (see loop_clients.py). Pool sizes reuse the
+SPOTIFY_HTTP_* settings of the sync client, and SPOTIFY_HTTP2 turns on HTTP/2 when the
+optional h2 package is installed.
+
+Requests share the rate limiter of the sync client and are retried the same way on 429.
+"""
+
+import asyncio
+import weakref
+from django.conf import settings
+import httpx
+from . import ratelimit
+from .client import DEFAULT_POOL_MAXSIZE
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def _http2_enabled():
+    """
+    Returns True if HTTP/2 was requested in settings and the h2 package is available.
+    """
+    if not getattr(settings, 'SPOTIFY_HTTP2', False):
+        return False
+    try:
+        import h2  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client():
+    """
+    Creates an AsyncClient whose pool matches the sync client's largest per-host limit.
+    """
+    maxsize = getattr(settings, 'SPOTIFY_HTTP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE)
+    host_limits = getattr(settings, 'SPOTIFY_HTTP_HOST_LIMITS', {})
+    max_connections = sum(host_limits.values()) or maxsize
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(limits=limits, http2=_http2_enabled())
+
+
+def get_async_client():
+    """
+    Returns the shared AsyncClient for the running event loop, creating it on first use.
+
+    Returns:
+        httpx.AsyncClient with a keep-alive connection pool
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[loop] = client
+    return client
+
+
+async def _send(method, url, **kwargs):
+    """
+    Sends a request over the shared AsyncClient, respecting the shared rate limit and
+    retrying 429 responses after the delay Spotify asks for.
+    """
+    client = get_async_client()
+    retry_after = 0
+    for attempt in range(ratelimit.get_rate_limit_config()['max_retries'] + 1):
+        await ratelimit.await_slot()
+        response = await getattr(client, method)(url, **kwargs)
+        if response.status_code != 429:
+            return response
+        retry_after = ratelimit.retry_after_seconds(response, attempt)
+        await ratelimit.arecord_rate_limited(retry_after)
+    raise ratelimit.SpotifyRateLimitError(retry_after)
+
+
+async def get(url, **kwargs):
+    """
+    Sends a GET request over the shared AsyncClient.
+    Accepts the same keyword arguments as httpx.AsyncClient.get.
+    """
+    return await _send('get', url, **kwargs)
+
+
+async def post(url, **kwargs):
+    """
+    Sends a POST request over the shared AsyncClient.
+    Accepts the same keyword arguments as httpx.AsyncClient.post.
+    """
+    return await _send('post', url, **kwargs)
+
+
+async def close_async_client():
+    """
+    Closes the AsyncClient of the running event loop, if there is one.
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
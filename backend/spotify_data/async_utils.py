@@ -0,0 +1,444 @@
+"""
+Async variants of the Spotify and Groq helpers in spotify_data/utils, used by the async views.
+
+Each function mirrors its sync counterpart (same arguments, same return values) but awaits
+the network instead of blocking. Prompts and parsing are shared with spotify_data/utils.
+"""
+
+import asyncio
+from django.core.cache import cache
+from groq import GroqError
+import httpx
+from . import async_client, llm_cache
+from .client import api_url
+from .llm_breaker import get_llm_breaker, llm_call_timeout
+from .llm_hedging import acreate_completion, primary_model
+from .llm_metrics import LLMCallTimer, arecord_llm_call, buffer_llm_call
+from .projections import PROJECTIONS
+from .prompts import (ROAST_SYSTEM_PROMPT, COMPARISON_SYSTEM_PROMPT, description_prompt,
+                      quirky_prompt, comparison_prompt)
+from .ratelimit import SpotifyRateLimitError
+from .roast_templates import description_roast, quirky_roast, comparison_roast
+from .utils import (TERMS, TopArtistsSummary, top_items_depth, top_items_stored,
+                    track_artist_ids, get_cached_artists, artist_batches, cacheable_artists,
+                    artist_cache_key, artist_cache_ttl, apply_track_artist_genres,
+                    top_items_page_params, groq_messages, llm_concurrency, llm_deadline,
+                    BATCH_SYSTEM_PROMPT, item_prompts, batch_prompt, parse_batch_response)
+
+
+async def aget_spotify_user_data(access_token):
+    """
+    Retrieves current user data including spotify id, email, profile image, and username.
+
+    Parameters:
+        - access_token: the access token associated with the current session
+
+    Returns:
+        JSON response containing user data
+    """
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    response = await async_client.get(api_url('/v1/me'), headers=headers, timeout=5)
+    return response.json() if response.status_code == 200 else None
+
+
+async def aiter_user_top_items(access_token, kind, timelimit, depth=None):
+    """
+    Async version of spotify_data.utils.iter_user_top_items: yields the user's favorite
+    tracks or artists one at a time while fetching them a page at a time.
+    """
+    depth = top_items_depth() if depth is None else depth
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+    offset = 0
+    while offset < depth:
+        response = await async_client.get(api_url(f'/v1/me/top/{kind}'),
+                                          headers=headers,
+                                          params=top_items_page_params(timelimit, offset, depth),
+                                          timeout=5)
+        if response.status_code != 200:
+            if offset == 0:
+                raise httpx.HTTPStatusError(
+                    f"{response.status_code} error fetching top {kind}",
+                    request=response.request, response=response)
+            return
+        page = response.json()
+        for item in page['items']:
+            yield PROJECTIONS[kind](item)
+        offset += len(page['items'])
+        if not page['items'] or not page.get('next'):
+            return
+
+
+async def _aget_user_top_items(access_token, kind, timelimit, depth=None):
+    """
+    Returns a list of user favorite tracks or artists over the given term,
+    or None if the first page could not be fetched.
+    """
+    depth = top_items_stored() if depth is None else depth
+    try:
+        return [item async for item in aiter_user_top_items(access_token, kind, timelimit, depth)]
+    except httpx.HTTPStatusError:
+        return None
+
+
+async def aget_user_favorite_tracks(access_token, timelimit, depth=None):
+    """
+    Returns a list of 20 user favorite tracks over one of three time periods.
+    """
+    return await _aget_user_top_items(access_token, 'tracks', timelimit, depth)
+
+
+async def aget_user_favorite_artists(access_token, timelimit, depth=None):
+    """
+    Returns a list of 20 user favorite artists over one of three time periods.
+    """
+    return await _aget_user_top_items(access_token, 'artists', timelimit, depth)
+
+
+async def asummarize_user_top_artists(access_token, timelimit, depth=None):
+    """
+    Async version of spotify_data.utils.summarize_user_top_artists.
+    """
+    summary = TopArtistsSummary()
+    async for artist in aiter_user_top_items(access_token, 'artists', timelimit, depth):
+        summary.add(artist)
+    return summary.result()
+
+
+async def afetch_user_top_items(access_token, terms=TERMS):
+    """
+    Fetches favorite tracks and artists for every term concurrently.
+
+    Parameters:
+        - access_token: the access token associated with the current session
+        - terms: the terms to fetch (defaults to short, medium and long term)
+
+    Returns:
+        Dictionary mapping each term to
+        {'tracks': list, 'artists': list, 'genres': list, 'quirkiest': list, 'errors': list},
+        in the same shape as spotify_data.utils.fetch_user_top_items.
+    """
+    fetchers = {
+        'tracks': aget_user_favorite_tracks,
+        'artists': asummarize_user_top_artists,
+    }
+    jobs = [(term, kind) for term in terms for kind in fetchers]
+    responses = await asyncio.gather(
+        *(fetchers[kind](access_token, term) for term, kind in jobs),
+        return_exceptions=True
+    )
+
+    results = {term: {'tracks': None, 'artists': None, 'genres': None, 'quirkiest': None,
+                      'errors': []}
+               for term in terms}
+    for (term, kind), items in zip(jobs, responses):
+        if isinstance(items, (httpx.HTTPError, SpotifyRateLimitError)):
+            results[term]['errors'].append(f"{kind}: {str(items)}")
+        elif isinstance(items, BaseException):
+            raise items
+        elif kind == 'artists':
+            results[term].update(items)
+        elif items is None:
+            results[term]['errors'].append("tracks: request failed")
+        else:
+            results[term]['tracks'] = items
+
+    artists = await aget_artists(access_token, track_artist_ids(results))
+    apply_track_artist_genres(results, artists)
+    return results
+
+
+async def aget_artists(access_token, artist_ids):
+    """
+    Async version of spotify_data.utils.get_artists.
+    """
+    artists, missing = get_cached_artists(artist_ids)
+    headers = {'Authorization': f'Bearer {access_token}'}
+    for batch in artist_batches(missing):
+        try:
+            response = await async_client.get(api_url('/v1/artists'), headers=headers,
+                                              params={'ids': batch}, timeout=5)
+        except (httpx.HTTPError, SpotifyRateLimitError):
+            break
+        if response.status_code != 200:
+            break
+        fetched = cacheable_artists(response.json())
+        cache.set_many({artist_cache_key(artist_id): artist
+                        for artist_id, artist in fetched.items()}, timeout=artist_cache_ttl())
+        artists.update(fetched)
+    return artists
+
+
+async def _agroq_chat(groq_api_key, system_prompt, user_prompt, function, template):
+    """
+    Sends one chat completion to Groq without blocking and returns the generated text.
+    Behaves like spotify_data.utils._groq_chat, including the LLM cache, the circuit
+    breaker and the call records, and is hedged with the alternate model if LLM_HEDGING
+    is enabled (see llm_hedging.py).
+    """
+    if not groq_api_key:
+        raise GroqError("GROQ_API_KEY environment variable is not set.")
+
+    use_cache = llm_cache.llm_cache_enabled()
+    model = primary_model()['model']
+    key = llm_cache.completion_key(model, system_prompt, user_prompt)
+    timer = LLMCallTimer(function, model, key, system_prompt + user_prompt)
+    if use_cache:
+        cached = await llm_cache.aget_cached_completion(function, key)
+        if cached is not None:
+            await arecord_llm_call(timer.finish('ok', 'hit'))
+            return cached
+    cache_status = 'miss' if use_cache else 'off'
+
+    breaker = get_llm_breaker()
+    if not breaker.allow():
+        await arecord_llm_call(timer.finish('rejected', cache_status))
+        return template
+
+    try:
+        response, answered_by, hedged = await acreate_completion(
+            groq_api_key, function,
+            messages=groq_messages(system_prompt, user_prompt),
+            timeout=llm_call_timeout(),
+        )
+
+        llama_description = response.choices[0].message.content
+    except asyncio.CancelledError:
+        breaker.release()
+        buffer_llm_call(timer.finish('error', cache_status))
+        raise
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        breaker.record_failure()
+        await arecord_llm_call(timer.finish('error', cache_status))
+        print(f"Groq {function} failed, serving a template roast: {e}")
+        return template
+    breaker.record_success()
+    await arecord_llm_call(timer.finish('ok', cache_status, getattr(response, 'usage', None),
+                                        llama_description or '', answered_by, hedged))
+    if use_cache and llama_description:
+        await llm_cache.astore_completion(function, key, answered_by, llama_description)
+    return llama_description
+
+
+async def _astream_groq_chat(groq_api_key, system_prompt, user_prompt, function, template):
+    """
+    Streams one chat completion from Groq, yielding the text as it is generated.
+    The full text is saved to the LLM cache once the stream completes, and a cached
+    completion is yielded in one piece without calling Groq. While the circuit breaker
+    is open, the template roast is yielded instead.
+
+    Unlike _agroq_chat, API errors are raised rather than replaced with the template,
+    since part of the completion may already have been sent.
+    """
+    if not groq_api_key:
+        raise GroqError("GROQ_API_KEY environment variable is not set.")
+
+    use_cache = llm_cache.llm_cache_enabled()
+    model = primary_model()['model']
+    key = llm_cache.completion_key(model, system_prompt, user_prompt)
+    timer = LLMCallTimer(function, model, key, system_prompt + user_prompt, streamed=True)
+    if use_cache:
+        cached = await llm_cache.aget_cached_completion(function, key)
+        if cached is not None:
+            timer.first_token()
+            await arecord_llm_call(timer.finish('ok', 'hit'))
+            yield cached
+            return
+    cache_status = 'miss' if use_cache else 'off'
+
+    breaker = get_llm_breaker()
+    if not breaker.allow():
+        await arecord_llm_call(timer.finish('rejected', cache_status))
+        yield template
+        return
+    parts = []
+    usage = None
+    answered_by, hedged = model, False
+    try:
+        stream, answered_by, hedged = await acreate_completion(
+            groq_api_key, function,
+            messages=groq_messages(system_prompt, user_prompt),
+            stream=True,
+            timeout=llm_call_timeout(),
+        )
+        async for chunk in stream:
+            # Groq reports the usage of a streamed completion on its last chunk
+            usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or usage
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                timer.first_token()
+                parts.append(content)
+                yield content
+    except (asyncio.CancelledError, GeneratorExit):
+        breaker.release()
+        buffer_llm_call(timer.finish('error', cache_status, model=answered_by, hedged=hedged))
+        raise
+    except Exception:
+        breaker.record_failure()
+        buffer_llm_call(timer.finish('error', cache_status, model=answered_by, hedged=hedged))
+        raise
+    breaker.record_success()
+    await arecord_llm_call(timer.finish('ok', cache_status, usage, ''.join(parts),
+                                        answered_by, hedged))
+    if use_cache and parts:
+        await llm_cache.astore_completion(function, key, answered_by, ''.join(parts))
+
+
+async def agenerate_all(jobs, fallbacks, max_concurrency=None, deadline=None):
+    """
+    Runs LLM generations concurrently, so a slide waits about as long as its slowest
+    single call instead of the sum of all of them.
+
+    Parameters:
+        - jobs: list of coroutines, each returning generated text
+        - fallbacks: text to use for each job that does not finish in time
+        - max_concurrency: the most calls in flight at once (defaults to LLM_CONCURRENCY)
+        - deadline: seconds to wait for all jobs (defaults to LLM_DEADLINE)
+
+    Returns:
+        List with the text of each job, in the order of jobs
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or llm_concurrency())
+    deadline = llm_deadline() if deadline is None else deadline
+
+    async def run(job):
+        async with semaphore:
+            return await job
+
+    tasks = [asyncio.ensure_future(run(job)) for job in jobs]
+    if not tasks:
+        return []
+    await asyncio.wait(tasks, timeout=deadline)
+    results = []
+    for task, fallback in zip(tasks, fallbacks):
+        if task.done() and not task.cancelled() and task.exception() is None:
+            results.append(task.result())
+        else:
+            task.cancel()
+            results.append(fallback)
+    return results
+
+
+async def acreate_groq_description(groq_api_key, favorite_artists):
+    """
+    Async version of spotify_data.utils.create_groq_description.
+    """
+    return await _agroq_chat(groq_api_key, ROAST_SYSTEM_PROMPT,
+                             description_prompt(favorite_artists), 'description',
+                             description_roast(favorite_artists))
+
+
+async def acreate_groq_quirky(groq_api_key, favorite_artists):
+    """
+    Async version of spotify_data.utils.create_groq_quirky.
+    """
+    return await _agroq_chat(groq_api_key, ROAST_SYSTEM_PROMPT,
+                             quirky_prompt(favorite_artists), 'quirky',
+                             quirky_roast(favorite_artists))
+
+
+async def astream_groq_description(groq_api_key, favorite_artists):
+    """
+    Streaming version of acreate_groq_description, yielding the text as it is generated.
+    """
+    async for content in _astream_groq_chat(groq_api_key, ROAST_SYSTEM_PROMPT,
+                                            description_prompt(favorite_artists),
+                                            'description', description_roast(favorite_artists)):
+        yield content
+
+
+async def astream_groq_quirky(groq_api_key, favorite_artists):
+    """
+    Streaming version of acreate_groq_quirky, yielding the text as it is generated.
+    """
+    async for content in _astream_groq_chat(groq_api_key, ROAST_SYSTEM_PROMPT,
+                                            quirky_prompt(favorite_artists), 'quirky',
+                                            quirky_roast(favorite_artists)):
+        yield content
+
+
+async def acreate_groq_comparison(groq_api_key, artist_1, artist_2):
+    """
+    Async version of spotify_data.utils.create_groq_comparison.
+    """
+    return await _agroq_chat(groq_api_key, COMPARISON_SYSTEM_PROMPT,
+                             comparison_prompt(artist_1, artist_2), 'comparison',
+                             comparison_roast(artist_1, artist_2))
+
+
+async def acreate_groq_batch(groq_api_key, items):
+    """
+    Generates several texts with a single Groq request that asks for a JSON object
+    keyed by item. Items already in the LLM cache are not requested, and every text
+    received is cached as if it had been generated on its own.
+
+    Parameters:
+        - groq_api_key: API key for Groq
+        - items: dictionary mapping each key to a (function, args) tuple, where function
+                 is 'description', 'quirky' or 'comparison' and args are its prompt arguments
+
+    Returns:
+        Dictionary mapping keys to their texts. Keys missing from the reply, or whose
+        answer is malformed, are left out so the caller can generate them one by one;
+        so are all uncached keys while the circuit breaker is open.
+    """
+    if not groq_api_key:
+        raise GroqError("GROQ_API_KEY environment variable is not set.")
+
+    use_cache = llm_cache.llm_cache_enabled()
+    model = primary_model()['model']
+    results = {}
+    pending = {}
+    cache_keys = {}
+    for key, (function, args) in items.items():
+        if use_cache:
+            cache_keys[key] = llm_cache.completion_key(model, *item_prompts(function, args))
+            cached = await llm_cache.aget_cached_completion(function, cache_keys[key])
+            if cached is not None:
+                results[key] = cached
+                continue
+        pending[key] = (function, args)
+    if not pending:
+        return results
+    prompt = batch_prompt(pending)
+    timer = LLMCallTimer('batch', model,
+                         llm_cache.completion_key(model, BATCH_SYSTEM_PROMPT, prompt),
+                         BATCH_SYSTEM_PROMPT + prompt)
+    cache_status = 'miss' if use_cache else 'off'
+    breaker = get_llm_breaker()
+    if not breaker.allow():
+        await arecord_llm_call(timer.finish('rejected', cache_status))
+        return results
+
+    try:
+        response, answered_by, hedged = await acreate_completion(
+            groq_api_key, 'batch',
+            messages=groq_messages(BATCH_SYSTEM_PROMPT, prompt),
+            response_format={"type": "json_object"},
+            timeout=llm_call_timeout(),
+        )
+        answers = parse_batch_response(response.choices[0].message.content, pending)
+    except asyncio.CancelledError:
+        breaker.release()
+        buffer_llm_call(timer.finish('error', cache_status))
+        raise
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        breaker.record_failure()
+        await arecord_llm_call(timer.finish('error', cache_status))
+        print(f"Batched generation failed: {e}")
+        return results
+    breaker.record_success()
+    await arecord_llm_call(timer.finish('ok', cache_status, getattr(response, 'usage', None),
+                                        response.choices[0].message.content or '',
+                                        answered_by, hedged))
+    for key, text in answers.items():
+        if use_cache:
+            await llm_cache.astore_completion(pending[key][0], cache_keys[key], answered_by,
+                                              text)
+        results[key] = text
+    return results
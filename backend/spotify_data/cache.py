@@ -0,0 +1,94 @@
+"""
+In-process caches with a time-to-live and least-recently-used eviction.
+
+Used as a per-worker layer in front of shared stores, such as the LRU of Spotify tokens
+(accounts/utils.py) and of LLM completions (llm_cache.py). Each cache counts its hits and
+misses so the hit rate can be checked in production.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire after `ttl` seconds, holding at most
+    `max_entries` entries and evicting the least recently used one when full.
+
+    Attributes:
+        - ttl: seconds an entry stays valid
+        - max_entries: the most entries kept at once
+        - hits, misses: lookups that found / did not find a valid entry
+        - evictions: entries dropped to make room
+    """
+    def __init__(self, ttl, max_entries, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the entry for key and marks it as recently used,
+        or default if it is missing or expired.
+        """
+        with self._lock:
+            expires_at, value = self._entries.get(key, (0, _MISSING))
+            if value is _MISSING or expires_at <= self.clock():
+                if value is not _MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores value under key, evicting the least recently used entries if full.
+        """
+        with self._lock:
+            self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Removes the entry for key, if there is one.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns the hit and miss counters, the hit rate and the current size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+        }
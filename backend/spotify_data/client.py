@@ -0,0 +1,144 @@
+"""
+Process-wide HTTP client for talking to Spotify (api.spotify.com and accounts.spotify.com).
+
+Every helper in spotify_data/utils and accounts/utils goes through here instead of calling
+requests.get/post directly, so connections are kept alive and reused between calls rather
+than paying a new TCP + TLS handshake on every request.
+
+One requests.Session is kept per host, each with its own connection pool. Pool sizes are
+read from settings:
+    - SPOTIFY_HTTP_POOL_CONNECTIONS: number of connection pools each session caches
+    - SPOTIFY_HTTP_POOL_MAXSIZE: default number of keep-alive connections per host
+    - SPOTIFY_HTTP_HOST_LIMITS: per-host overrides of SPOTIFY_HTTP_POOL_MAXSIZE
+    - SPOTIFY_HTTP_POOL_BLOCK: wait for a free connection instead of opening an extra one
+
+Base URLs come from SPOTIFY_API_BASE_URL and SPOTIFY_ACCOUNTS_BASE_URL, so the backend can
+be pointed at the local stand-in server (manage.py run_spotify_standin) instead of Spotify.
+Build request URLs with api_url() and accounts_url().
+
+get() and post() mirror requests.get/requests.post so callers only swap the import.
+Every request first takes a token from the shared rate limiter (spotify_data/ratelimit.py),
+and 429 responses are retried after the Retry-After delay. If Spotify is still throttling
+after SPOTIFY_RATE_LIMIT['max_retries'] retries, SpotifyRateLimitError is raised.
+"""
+
+import threading
+from urllib.parse import urlsplit
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from . import ratelimit
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_API_BASE_URL = 'https://api.spotify.com'
+DEFAULT_ACCOUNTS_BASE_URL = 'https://accounts.spotify.com'
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def api_url(path):
+    """
+    Returns the URL of a Web API endpoint (e.g. '/v1/me') on SPOTIFY_API_BASE_URL.
+    """
+    base_url = getattr(settings, 'SPOTIFY_API_BASE_URL', DEFAULT_API_BASE_URL)
+    return base_url.rstrip('/') + path
+
+
+def accounts_url(path):
+    """
+    Returns the URL of an accounts endpoint (e.g. '/api/token') on SPOTIFY_ACCOUNTS_BASE_URL.
+    """
+    base_url = getattr(settings, 'SPOTIFY_ACCOUNTS_BASE_URL', DEFAULT_ACCOUNTS_BASE_URL)
+    return base_url.rstrip('/') + path
+
+
+def _pool_maxsize(host):
+    """
+    Returns the number of keep-alive connections allowed to a given host.
+    """
+    host_limits = getattr(settings, 'SPOTIFY_HTTP_HOST_LIMITS', {})
+    return host_limits.get(host, getattr(settings, 'SPOTIFY_HTTP_POOL_MAXSIZE',
+                                         DEFAULT_POOL_MAXSIZE))
+
+
+def _build_session(host):
+    """
+    Creates a session whose connection pool is sized for the given host.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, 'SPOTIFY_HTTP_POOL_CONNECTIONS',
+                                 DEFAULT_POOL_CONNECTIONS),
+        pool_maxsize=_pool_maxsize(host),
+        pool_block=getattr(settings, 'SPOTIFY_HTTP_POOL_BLOCK', False),
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(url):
+    """
+    Returns the shared session for the host of the given URL, creating it on first use.
+
+    Parameters:
+        - url: any URL on the host we want to talk to
+
+    Returns:
+        requests.Session with a keep-alive connection pool for that host
+    """
+    host = urlsplit(url).netloc
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _build_session(host)
+                _sessions[host] = session
+    return session
+
+
+def _send(method, url, **kwargs):
+    """
+    Sends a request over the pooled session, respecting the shared rate limit and
+    retrying 429 responses after the delay Spotify asks for.
+    """
+    session = get_session(url)
+    retry_after = 0
+    for attempt in range(ratelimit.get_rate_limit_config()['max_retries'] + 1):
+        ratelimit.wait_for_slot()
+        response = getattr(session, method)(url, **kwargs)
+        if response.status_code != 429:
+            return response
+        retry_after = ratelimit.retry_after_seconds(response, attempt)
+        ratelimit.record_rate_limited(retry_after)
+    raise ratelimit.SpotifyRateLimitError(retry_after)
+
+
+def get(url, **kwargs):
+    """
+    Sends a GET request over the pooled session for the URL's host.
+    Accepts the same keyword arguments as requests.get.
+    """
+    return _send('get', url, **kwargs)
+
+
+def post(url, **kwargs):
+    """
+    Sends a POST request over the pooled session for the URL's host.
+    Accepts the same keyword arguments as requests.post.
+    """
+    return _send('post', url, **kwargs)
+
+
+def close_sessions():
+    """
+    Closes every pooled session and drops it, so the next call starts fresh.
+    Used by tests and when settings change.
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,155 @@
+"""
+Circuit breaker around every Groq call.
+
+When Groq is down or slow, waiting for each call to time out would stall every slide once
+per item. The breaker counts consecutive failures (errors and timeouts) and, after
+LLM_CIRCUIT_BREAKER['failure_threshold'] of them, opens: calls are skipped and callers
+serve template roasts (spotify_data/roast_templates.py) instantly. After
+LLM_CIRCUIT_BREAKER['reset_timeout'] seconds it half-opens and lets a single probe call
+through; a success closes it again, a failure re-opens it.
+
+Each call is also bounded by LLM_CIRCUIT_BREAKER['call_timeout'] seconds, so even the
+calls that get through cannot hold a slide for longer than that.
+
+The breaker is per process and shared by threads and event loops; its state changes are
+made under a lock and never await.
+"""
+
+import threading
+import time
+from django.conf import settings
+
+DEFAULT_LLM_CIRCUIT_BREAKER = {
+    'failure_threshold': 5,
+    'reset_timeout': 30,
+    'call_timeout': 5,
+}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker_config():
+    """
+    Returns LLM_CIRCUIT_BREAKER from settings with missing keys filled from the defaults.
+    """
+    return {**DEFAULT_LLM_CIRCUIT_BREAKER, **getattr(settings, 'LLM_CIRCUIT_BREAKER', {})}
+
+
+def llm_call_timeout():
+    """
+    Returns how many seconds a single Groq call may take.
+    """
+    return get_breaker_config()['call_timeout']
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    Attributes:
+        - failure_threshold: consecutive failures that open the circuit
+        - reset_timeout: seconds the circuit stays open before a probe is let through
+        - state: CLOSED, OPEN or HALF_OPEN
+        - failures: consecutive failures so far
+        - opened: times the circuit has opened
+        - rejected: calls skipped because the circuit was open
+    """
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns True if a call may go through. In the half-open state only one probe
+        call is let through at a time.
+        """
+        with self._lock:
+            if self.state == OPEN and self.clock() >= self._opened_at + self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """
+        Records a successful call, closing the circuit.
+        """
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """
+        Records a failed or timed out call, opening the circuit if it was the probe or
+        if there have been failure_threshold failures in a row.
+        """
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == OPEN:
+                return  # a call started before the circuit opened
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened += 1
+                self.state = OPEN
+                self._opened_at = self.clock()
+
+    def release(self):
+        """
+        Records a call that was abandoned (e.g. cancelled at a deadline) without an
+        outcome, so another probe may go through.
+        """
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        """
+        Returns the state and counters of the breaker.
+        """
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'opened': self.opened,
+            'rejected': self.rejected,
+        }
+
+
+def get_llm_breaker():
+    """
+    Returns the circuit breaker of this process, created from LLM_CIRCUIT_BREAKER on
+    first use.
+    """
+    global _breaker  # pylint: disable=global-statement
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                config = get_breaker_config()
+                _breaker = CircuitBreaker(config['failure_threshold'], config['reset_timeout'])
+    return _breaker
+
+
+def reset_llm_breaker():
+    """
+    Drops the circuit breaker, so the next call starts with a closed one built from the
+    current settings. Used by tests and when settings change.
+    """
+    global _breaker  # pylint: disable=global-statement
+    with _breaker_lock:
+        _breaker = None
@@ -0,0 +1,236 @@
+"""
+Persistent cache of LLM completions.
+
+Many users share prompts (e.g. a description of the same top artist), so completions are
+stored in the LLMCompletion table and served from there instead of calling the LLM again.
+An in-memory LRU in front of the table answers the most common prompts without a query.
+
+Entries are keyed by a hash of the model, the system prompt and the normalized user prompt
+(case and whitespace do not matter). Settings come from LLM_CACHE:
+    - enabled: turn the cache off entirely
+    - ttl: seconds a completion is reused
+    - memory_entries: completions kept in memory per process
+    - max_rows: the most rows kept in the table; the oldest are deleted beyond this
+
+Hits and misses are counted per calling function (description, quirky, comparison...)
+and reported by get_llm_cache_stats().
+"""
+
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from .cache import TTLCache
+
+DEFAULT_LLM_CACHE = {
+    'enabled': True,
+    'ttl': 7 * 24 * 60 * 60,
+    'memory_entries': 2048,
+    'max_rows': 50000,
+}
+PRUNE_EVERY = 100  # stores between two prunes of the table
+
+_memory = None
+_stats = defaultdict(lambda: {'memory_hits': 0, 'db_hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+_stores = 0
+
+
+def get_llm_cache_config():
+    """
+    Returns LLM_CACHE from settings with missing keys filled from the defaults.
+    """
+    return {**DEFAULT_LLM_CACHE, **getattr(settings, 'LLM_CACHE', {})}
+
+
+def llm_cache_enabled():
+    """
+    Returns True if completions should be cached.
+    """
+    return get_llm_cache_config()['enabled']
+
+
+def _memory_cache():
+    """
+    Returns the in-memory front of the cache, creating it on first use.
+    """
+    global _memory  # pylint: disable=global-statement
+    if _memory is None:
+        config = get_llm_cache_config()
+        _memory = TTLCache(config['ttl'], config['memory_entries'])
+    return _memory
+
+
+def _completion_model():
+    """
+    Returns the LLMCompletion model (looked up lazily, since models.py imports utils.py).
+    """
+    return apps.get_model('spotify_data', 'LLMCompletion')
+
+
+def normalize_prompt(prompt):
+    """
+    Returns the prompt with case and runs of whitespace normalized.
+    """
+    return ' '.join(prompt.split()).casefold()
+
+
+def completion_key(model, system_prompt, user_prompt):
+    """
+    Returns the cache key of a completion.
+    """
+    canonical = '\x1f'.join([model, system_prompt, normalize_prompt(user_prompt)])
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _count(function, outcome):
+    with _stats_lock:
+        _stats[function][outcome] += 1
+
+
+def _remaining_ttl(created_at):
+    """
+    Returns the seconds a completion stored at created_at stays valid, or 0 if expired.
+    """
+    age = (timezone.now() - created_at).total_seconds()
+    return max(get_llm_cache_config()['ttl'] - age, 0)
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(seconds=get_llm_cache_config()['ttl'])
+
+
+def get_cached_completion(function, key):
+    """
+    Returns the cached completion for key, or None if there is none.
+
+    Parameters:
+        - function: name of the calling function, for the stats
+        - key: key from completion_key()
+    """
+    response = _memory_cache().get(key)
+    if response is not None:
+        _count(function, 'memory_hits')
+        return response
+    entry = _completion_model().objects.filter(  # pylint: disable=no-member
+        key=key, created_at__gt=_expiry_cutoff()).values('response', 'created_at').first()
+    return _memory_hit_from_db(function, key, entry)
+
+
+async def aget_cached_completion(function, key):
+    """
+    Async version of get_cached_completion().
+    """
+    response = _memory_cache().get(key)
+    if response is not None:
+        _count(function, 'memory_hits')
+        return response
+    entry = await _completion_model().objects.filter(  # pylint: disable=no-member
+        key=key, created_at__gt=_expiry_cutoff()).values('response', 'created_at').afirst()
+    return _memory_hit_from_db(function, key, entry)
+
+
+def _memory_hit_from_db(function, key, entry):
+    """
+    Records the outcome of a table lookup and copies a hit into memory.
+    """
+    if entry is None:
+        _count(function, 'misses')
+        return None
+    _count(function, 'db_hits')
+    _memory_cache().set(key, entry['response'], ttl=_remaining_ttl(entry['created_at']))
+    return entry['response']
+
+
+def _should_prune():
+    global _stores  # pylint: disable=global-statement
+    with _stats_lock:
+        _stores += 1
+        return _stores % PRUNE_EVERY == 0
+
+
+def store_completion(function, key, model, response):
+    """
+    Stores a completion in memory and in the table.
+    """
+    _memory_cache().set(key, response)
+    _completion_model().objects.update_or_create(  # pylint: disable=no-member
+        key=key, defaults={'function': function, 'model': model, 'response': response})
+    if _should_prune():
+        prune_completions()
+
+
+async def astore_completion(function, key, model, response):
+    """
+    Async version of store_completion().
+    """
+    _memory_cache().set(key, response)
+    await _completion_model().objects.aupdate_or_create(  # pylint: disable=no-member
+        key=key, defaults={'function': function, 'model': model, 'response': response})
+    if _should_prune():
+        await aprune_completions()
+
+
+def prune_completions():
+    """
+    Deletes expired completions, then the oldest ones beyond LLM_CACHE['max_rows'].
+
+    Returns:
+        The number of rows deleted
+    """
+    model = _completion_model()
+    deleted, _ = model.objects.filter(created_at__lte=_expiry_cutoff()).delete()
+    max_rows = get_llm_cache_config()['max_rows']
+    overflow = model.objects.order_by('-created_at').values_list('key', flat=True)[max_rows:]
+    overflow_keys = list(overflow)
+    if overflow_keys:
+        deleted += model.objects.filter(key__in=overflow_keys).delete()[0]
+    return deleted
+
+
+async def aprune_completions():
+    """
+    Async version of prune_completions().
+    """
+    model = _completion_model()
+    deleted, _ = await model.objects.filter(  # pylint: disable=no-member
+        created_at__lte=_expiry_cutoff()).adelete()
+    max_rows = get_llm_cache_config()['max_rows']
+    overflow_keys = [key async for key in  # pylint: disable=no-member
+                     model.objects.order_by('-created_at').values_list('key', flat=True)[
+                         max_rows:]]
+    if overflow_keys:
+        deleted += (await model.objects.filter(  # pylint: disable=no-member
+            key__in=overflow_keys).adelete())[0]
+    return deleted
+
+
+def get_llm_cache_stats():
+    """
+    Returns the hit and miss counts of this process, per calling function.
+
+    Returns:
+        Dictionary mapping each function to its memory hits, table hits, misses and hit rate
+    """
+    with _stats_lock:
+        stats = {function: dict(counts) for function, counts in _stats.items()}
+    for counts in stats.values():
+        hits = counts['memory_hits'] + counts['db_hits']
+        lookups = hits + counts['misses']
+        counts['hit_rate'] = hits / lookups if lookups else 0.0
+    return stats
+
+
+def clear_llm_cache(stats=True):
+    """
+    Drops the in-memory cache (the table is kept) and optionally resets the stats.
+    The in-memory cache is recreated from the current LLM_CACHE on next use.
+    """
+    global _memory  # pylint: disable=global-statement
+    _memory = None
+    if stats:
+        with _stats_lock:
+            _stats.clear()
@@ -0,0 +1,220 @@
+"""
+Process-wide registry of Groq clients.
+
+Constructing Groq(api_key=...) creates a new httpx client, and with it a new connection
+pool, so every call would pay a TCP + TLS handshake. Instead, clients are created lazily
+and reused:
+    - one Groq client per API key, shared by every thread
+    - one AsyncGroq client per API key and running event loop, since httpx connections
+      belong to the loop that opened them (see spotify_data/async_client.py); outside
+      an ASGI server they are closed at the end of each request (see loop_clients.py)
+
+Pool sizes are read from GROQ_HTTP_POOL_MAXSIZE and GROQ_HTTP_KEEPALIVE_EXPIRY, and
+GROQ_MAX_RETRIES sets how often the SDK retries a failed call. It defaults to none, since
+failures are handled by the circuit breaker (see spotify_data/llm_breaker.py) and every
+retry would stretch the slide's latency.
+
+Every request is traced to count how many needed a new connection and how many reused a
+pooled one; get_llm_client_stats() reports the counts.
+
+Which LLM the clients talk to is set by LLM_BACKEND:
+    - 'groq': the Groq API
+    - 'standin': an OpenAI/Groq-compatible server at LLM_STANDIN_URL, such as the one
+      started by manage.py run_llm_standin (see spotify_data/llm_standin.py)
+    - 'fake': deterministic in-process completions behaving as configured by LLM_FAKE,
+      with no network at all
+
+With the 'groq' backend, a client can also be asked for another OpenAI/Groq-compatible
+base URL, for the alternate providers of the model registry (see spotify_data/llm_hedging.py).
+"""
+
+import asyncio
+import threading
+import weakref
+from django.conf import settings
+from groq import Groq, AsyncGroq
+import httpx
+from .llm_standin import LLMStandinConfig, FakeGroq, AsyncFakeGroq
+
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30  # seconds an idle connection is kept open
+DEFAULT_MAX_RETRIES = 0
+LLM_BACKENDS = ('groq', 'standin', 'fake')
+DEFAULT_LLM_STANDIN_URL = 'http://127.0.0.1:8766'
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+_stats = {'clients_created': 0, 'requests': 0, 'connections_opened': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _limits():
+    """
+    Returns the connection pool limits of Groq clients.
+    """
+    maxsize = getattr(settings, 'GROQ_HTTP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE)
+    return httpx.Limits(max_connections=maxsize, max_keepalive_connections=maxsize,
+                        keepalive_expiry=getattr(settings, 'GROQ_HTTP_KEEPALIVE_EXPIRY',
+                                                 DEFAULT_KEEPALIVE_EXPIRY))
+
+
+def _max_retries():
+    return getattr(settings, 'GROQ_MAX_RETRIES', DEFAULT_MAX_RETRIES)
+
+
+def llm_backend():
+    """
+    Returns the configured LLM backend, one of LLM_BACKENDS.
+    """
+    backend = getattr(settings, 'LLM_BACKEND', 'groq')
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {backend!r}, expected one of {LLM_BACKENDS}")
+    return backend
+
+
+def _fake_config():
+    return LLMStandinConfig(**getattr(settings, 'LLM_FAKE', {}))
+
+
+def _client_key(api_key, base_url=None):
+    """
+    Returns the registry key of the client for an API key under the current settings,
+    so changing the backend (e.g. in tests) never serves a client of the old one.
+    base_url only applies to the 'groq' backend: the stand-in and the fake answer for
+    every provider.
+    """
+    backend = llm_backend()
+    if backend == 'standin':
+        return backend, getattr(settings, 'LLM_STANDIN_URL', DEFAULT_LLM_STANDIN_URL), api_key
+    if backend == 'fake':
+        return backend, repr(sorted(getattr(settings, 'LLM_FAKE', {}).items())), api_key
+    return backend, base_url, api_key
+
+
+def _client_kwargs(key):
+    """
+    Returns the Groq client arguments besides the HTTP client for a registry key.
+    """
+    backend, base_url, api_key = key
+    kwargs = {'api_key': api_key, 'max_retries': _max_retries()}
+    if base_url:
+        kwargs['base_url'] = base_url
+    return kwargs
+
+
+def _trace(event_name, info):  # pylint: disable=unused-argument
+    """
+    httpcore trace callback counting the requests that had to open a connection.
+    """
+    if event_name == 'connection.connect_tcp.complete':
+        _count('connections_opened')
+
+
+async def _atrace(event_name, info):
+    _trace(event_name, info)
+
+
+def _trace_request(request):
+    _count('requests')
+    request.extensions['trace'] = _trace
+
+
+async def _atrace_request(request):
+    _count('requests')
+    request.extensions['trace'] = _atrace
+
+
+def get_groq_client(api_key, base_url=None):
+    """
+    Returns the shared Groq client for an API key (and base URL, defaulting to Groq's),
+    creating it on first use.
+
+    Returns:
+        groq.Groq backed by a keep-alive connection pool, or FakeGroq if LLM_BACKEND
+        is 'fake'
+    """
+    key = _client_key(api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                if key[0] == 'fake':
+                    client = FakeGroq(_fake_config())
+                else:
+                    http_client = httpx.Client(limits=_limits(),
+                                               event_hooks={'request': [_trace_request]})
+                    client = Groq(http_client=http_client, **_client_kwargs(key))
+                _clients[key] = client
+                _count('clients_created')
+    return client
+
+
+def get_async_groq_client(api_key, base_url=None):
+    """
+    Returns the shared AsyncGroq client for an API key (and base URL, defaulting to
+    Groq's) and the running event loop, creating it on first use.
+
+    Returns:
+        groq.AsyncGroq backed by a keep-alive connection pool, or AsyncFakeGroq if
+        LLM_BACKEND is 'fake'
+    """
+    loop = asyncio.get_running_loop()
+    loop_clients = _async_clients.setdefault(loop, {})
+    key = _client_key(api_key, base_url)
+    client = loop_clients.get(key)
+    if client is None or client.is_closed():
+        if key[0] == 'fake':
+            client = AsyncFakeGroq(_fake_config())
+        else:
+            http_client = httpx.AsyncClient(limits=_limits(),
+                                            event_hooks={'request': [_atrace_request]})
+            client = AsyncGroq(http_client=http_client, **_client_kwargs(key))
+        loop_clients[key] = client
+        _count('clients_created')
+    return client
+
+
+async def aclose_async_groq_clients():
+    """
+    Closes and drops the AsyncGroq clients of the running event loop.
+    """
+    loop_clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in loop_clients.values():
+        await client.close()
+
+
+def get_llm_client_stats():
+    """
+    Returns how many clients were created and how many requests reused a connection.
+
+    Returns:
+        Dictionary with clients_created, requests, connections_opened,
+        connections_reused and reuse_rate
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['connections_reused'] = max(stats['requests'] - stats['connections_opened'], 0)
+    stats['reuse_rate'] = (stats['connections_reused'] / stats['requests']
+                           if stats['requests'] else 0.0)
+    return stats
+
+
+def close_llm_clients():
+    """
+    Closes and drops every sync client and resets the stats, so the next call starts
+    fresh. Used by tests and when settings change.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,264 @@
+"""
+Registry of the LLM models the backend can call, and hedged requests across them.
+
+LLM_MODELS names each model and the provider serving it, and LLM_PROVIDERS gives each
+provider's OpenAI/Groq-compatible base URL and the environment variable holding its API
+key ('groq' uses Groq's API and the key passed to the create_groq_* functions).
+LLM_PRIMARY_MODEL is the model every call goes to.
+
+The latency of a slide is the latency of its slowest LLM call, so the tail of a single
+model's latency is the tail of the slides. With LLM_HEDGING enabled, a call that the
+primary model has not answered after its usual p90 latency is hedged: the same request
+is sent to the alternate model and whichever answers first is used, the other being
+cancelled. Since only the slowest ~10% of calls are hedged, the extra cost is bounded,
+and max_rate caps the share of hedged calls in case the primary slows down altogether.
+
+The hedge delay is derived per function (description, quirky, comparison, batch, and
+their streamed versions) from the latencies of the primary model's latest calls. Until
+min_samples are known, initial_delay is used. The model that answered each call, and
+whether it was hedged, is recorded with the call (see llm_metrics.py), and
+get_hedging_stats() counts the wins of each model in this process.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from .llm_clients import get_async_groq_client
+
+DEFAULT_LLM_PROVIDERS = {
+    'groq': {'base_url': None, 'api_key_env': None},
+}
+DEFAULT_LLM_MODELS = {
+    'llama3-8b': {'provider': 'groq', 'model': 'llama3-8b-8192'},
+    'llama3.1-8b': {'provider': 'groq', 'model': 'llama-3.1-8b-instant'},
+}
+DEFAULT_LLM_PRIMARY_MODEL = 'llama3-8b'
+DEFAULT_LLM_HEDGING = {
+    'enabled': False,
+    'alternate': 'llama3.1-8b',
+    'percentile': 0.9,
+    'window': 200,
+    'min_samples': 20,
+    'initial_delay': 1.0,
+    'min_delay': 0.1,
+    'max_delay': 3.0,
+    'max_rate': 0.2,
+}
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_llm_models():
+    """
+    Returns LLM_MODELS from settings merged over the default models.
+    """
+    return {**DEFAULT_LLM_MODELS, **getattr(settings, 'LLM_MODELS', {})}
+
+
+def get_llm_providers():
+    """
+    Returns LLM_PROVIDERS from settings merged over the default providers.
+    """
+    return {**DEFAULT_LLM_PROVIDERS, **getattr(settings, 'LLM_PROVIDERS', {})}
+
+
+def get_hedging_config():
+    """
+    Returns LLM_HEDGING from settings with missing keys filled from the defaults.
+    """
+    return {**DEFAULT_LLM_HEDGING, **getattr(settings, 'LLM_HEDGING', {})}
+
+
+def get_model(name):
+    """
+    Returns a model of the registry with its provider's settings.
+
+    Parameters:
+        - name: name of the model in LLM_MODELS
+
+    Returns:
+        Dictionary with the model's name, provider, model (the name sent to the
+        provider), base_url and api_key_env
+    """
+    models = get_llm_models()
+    if name not in models:
+        raise ValueError(f"Unknown LLM model {name!r}, expected one of {tuple(models)}")
+    entry = models[name]
+    providers = get_llm_providers()
+    if entry['provider'] not in providers:
+        raise ValueError(f"Unknown LLM provider {entry['provider']!r} of model {name!r}")
+    provider = providers[entry['provider']]
+    return {'name': name, 'provider': entry['provider'], 'model': entry['model'],
+            'base_url': provider.get('base_url'), 'api_key_env': provider.get('api_key_env')}
+
+
+def primary_model():
+    """
+    Returns the registry entry of LLM_PRIMARY_MODEL (see get_model).
+    """
+    return get_model(getattr(settings, 'LLM_PRIMARY_MODEL', DEFAULT_LLM_PRIMARY_MODEL))
+
+
+def model_api_key(model, groq_api_key):
+    """
+    Returns the API key of a model's provider: the one in its api_key_env environment
+    variable, or the Groq API key.
+    """
+    if model['api_key_env']:
+        return os.getenv(model['api_key_env'])
+    return groq_api_key
+
+
+def get_async_model_client(model, groq_api_key):
+    """
+    Returns the shared AsyncGroq client of a model's provider (see llm_clients.py).
+    """
+    return get_async_groq_client(model_api_key(model, groq_api_key), model['base_url'])
+
+
+class HedgeTracker:
+    """
+    Keeps the primary model's latest latencies and hedging decisions for one function.
+
+    Parameters:
+        - window: how many of the latest calls to keep
+    """
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.hedges = deque(maxlen=window)
+        self.wins = {'primary': 0, 'alternate': 0}
+        self.lock = threading.Lock()
+
+    def delay(self, config):
+        """
+        Returns how long to wait for the primary model before hedging, in seconds.
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if len(latencies) < config['min_samples']:
+            return config['initial_delay']
+        p = latencies[min(int(config['percentile'] * len(latencies)), len(latencies) - 1)]
+        return min(max(p, config['min_delay']), config['max_delay'])
+
+    def may_hedge(self, config):
+        """
+        Returns True while the share of hedged calls in the window is under max_rate.
+        """
+        with self.lock:
+            return sum(self.hedges) < config['max_rate'] * max(len(self.hedges), 1)
+
+    def observe(self, hedged, winner, primary_seconds):
+        """
+        Records a call: whether it was hedged, which model won, and how long the primary
+        model took to answer, or None if it was cancelled before answering. Only
+        completed latencies are kept, since the time a cancelled call had taken would
+        pull the delay down and make hedging fire earlier and earlier.
+        """
+        with self.lock:
+            self.hedges.append(hedged)
+            self.wins[winner] += 1
+            if primary_seconds is not None:
+                self.latencies.append(primary_seconds)
+
+
+def _tracker(function):
+    with _trackers_lock:
+        tracker = _trackers.get(function)
+        if tracker is None:
+            tracker = _trackers[function] = HedgeTracker(get_hedging_config()['window'])
+        return tracker
+
+
+def get_hedging_stats():
+    """
+    Returns, per function, how many calls were hedged, which model won them and the
+    current hedge delay.
+    """
+    config = get_hedging_config()
+    with _trackers_lock:
+        trackers = dict(_trackers)
+    return {function: {'calls': len(tracker.hedges), 'hedged': sum(tracker.hedges),
+                       'primary_wins': tracker.wins['primary'],
+                       'alternate_wins': tracker.wins['alternate'],
+                       'delay': tracker.delay(config)}
+            for function, tracker in sorted(trackers.items())}
+
+
+def reset_hedging():
+    """
+    Forgets the recorded latencies and wins. Used by tests and when settings change.
+    """
+    with _trackers_lock:
+        _trackers.clear()
+
+
+async def _adiscard(response):
+    """
+    Closes the stream of a response that finished at the same time as the winner.
+    """
+    close = getattr(response, 'close', None) or getattr(response, 'aclose', None)
+    if close is not None:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+async def acreate_completion(groq_api_key, function, **kwargs):
+    """
+    Sends a chat completion to the primary model, hedged with the alternate model if
+    LLM_HEDGING is enabled and the primary is slower than usual.
+
+    Parameters:
+        - groq_api_key: API key for Groq
+        - function: the generating function, whose latencies set the hedge delay
+        - kwargs: arguments of chat.completions.create() besides the model
+
+    Returns:
+        (response, model, hedged): the first response, the name the answering model
+        was called by, and True if the call was hedged. If both models fail, the
+        primary model's error is raised.
+    """
+    primary = primary_model()
+    config = get_hedging_config()
+    if not config['enabled']:
+        response = await get_async_model_client(primary, groq_api_key).chat.completions.create(
+            model=primary['model'], **kwargs)
+        return response, primary['model'], False
+
+    tracker = _tracker(f"{function}:stream" if kwargs.get('stream') else function)
+    started = time.perf_counter()
+    first = asyncio.ensure_future(get_async_model_client(
+        primary, groq_api_key).chat.completions.create(model=primary['model'], **kwargs))
+    tasks = {first: ('primary', primary)}
+    try:
+        done, _ = await asyncio.wait({first}, timeout=tracker.delay(config))
+        if done or not tracker.may_hedge(config):
+            response = await first
+            tracker.observe(False, 'primary', time.perf_counter() - started)
+            return response, primary['model'], False
+
+        alternate = get_model(config['alternate'])
+        second = asyncio.ensure_future(get_async_model_client(
+            alternate, groq_api_key).chat.completions.create(model=alternate['model'], **kwargs))
+        tasks[second] = ('alternate', alternate)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if task.exception() is None]
+            if winners:
+                winner = first if first in winners else winners[0]
+                for task in winners:
+                    if task is not winner:
+                        await _adiscard(task.result())
+                role, model = tasks[winner]
+                tracker.observe(True, role, (time.perf_counter() - started
+                                             if role == 'primary' else None))
+                return winner.result(), model['model'], True
+        raise first.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
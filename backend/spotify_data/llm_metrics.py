@@ -0,0 +1,445 @@
+"""
+Latency and token accounting of LLM calls.
+
+Every create_groq_* call (and their async and streaming versions) is timed and recorded
+as an LLMCall row with its wall time, time to first token when streamed, prompt and
+completion tokens from Groq's usage field (estimated from the text when Groq does not
+report it), whether the LLM cache answered it, its outcome, and which model answered it
+and whether it was hedged (see llm_hedging.py).
+
+Records are tagged with the view and wrap they were made for. Views decorated with
+@tag_llm_calls set the tags in a context variable, which follows the calls into
+asyncio tasks, sync_to_async threads and streamed responses. Views creating a wrap
+generate its texts before the wrap row exists, so the records of a view are held until
+it returns; set_llm_wrap_id() tags them (and the rest of the view's calls) with the
+wrap once it is created.
+
+Records are buffered in memory and written with one bulk insert every
+LLM_METRICS['flush_every'] calls, so recording does not add a query to every call; the
+rows beyond LLM_METRICS['max_rows'] are pruned, oldest first. get_llm_metrics() turns
+the rows into the aggregates served by the llmmetrics endpoint and printed by
+manage.py llm_report.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .prompts import estimate_tokens
+
+DEFAULT_LLM_METRICS = {
+    'enabled': True,
+    'flush_every': 20,
+    'max_rows': 100000,
+}
+PRUNE_EVERY = 50  # flushes between two prunes of the table
+
+_tags = contextvars.ContextVar('llm_call_tags', default=None)
+_buffer = []
+_buffer_lock = threading.Lock()
+_flushes = 0
+
+
+def get_llm_metrics_config():
+    """
+    Returns LLM_METRICS from settings with missing keys filled from the defaults.
+    """
+    return {**DEFAULT_LLM_METRICS, **getattr(settings, 'LLM_METRICS', {})}
+
+
+def _call_model():
+    """
+    Returns the LLMCall model (looked up lazily, since models.py imports utils.py).
+    """
+    return apps.get_model('spotify_data', 'LLMCall')
+
+
+@contextmanager
+def llm_tags(view='', wrap_id=None, hold=False):
+    """
+    Tags the LLM calls made inside the block with a view and a wrap id.
+    With hold, their records are kept in the yielded tags' 'held' list instead of being
+    recorded, for @tag_llm_calls to record once the view returns.
+    """
+    tags = {'view': view, 'wrap_id': wrap_id}
+    if hold:
+        tags['held'] = []
+    token = _tags.set(tags)
+    try:
+        yield tags
+    finally:
+        _tags.reset(token)
+
+
+def set_llm_wrap_id(wrap_id):
+    """
+    Tags the LLM calls of the current view with a wrap id, including the held calls made
+    before the wrap was created. Does nothing outside a tagged view.
+    """
+    tags = _tags.get()
+    if tags is not None:
+        tags['wrap_id'] = wrap_id
+
+
+def _hold(record):
+    """
+    Keeps a record for @tag_llm_calls if the current tags hold records.
+    Returns True if the record was held.
+    """
+    held = (_tags.get() or {}).get('held')
+    if held is None:
+        return False
+    held.append(record)
+    return True
+
+
+def _release(tags):
+    """
+    Returns the records held under the given tags, tagged with their final wrap id,
+    and stops holding.
+    """
+    held = tags.pop('held', [])
+    for record in held:
+        if record['wrap_id'] is None:
+            record['wrap_id'] = tags['wrap_id']
+    return held
+
+
+async def atagged(stream, **tags):
+    """
+    Yields from an async iterator, tagging the LLM calls made while producing each item.
+    Used for streamed responses, which are produced after the view has returned.
+    """
+    iterator = stream.__aiter__()
+    while True:
+        with llm_tags(**tags):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+def _wrap_id(request):
+    try:
+        return int(request.GET.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def tag_llm_calls(view):
+    """
+    Decorator tagging the LLM calls of an async view with its name and the wrap in its
+    'id' query parameter (or the one passed to set_llm_wrap_id by a view creating a wrap),
+    including the calls made while streaming its response.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        with llm_tags(view.__name__, _wrap_id(request), hold=True) as tags:
+            try:
+                response = await view(request, *args, **kwargs)
+            except BaseException:
+                for record in _release(tags):
+                    buffer_llm_call(record)
+                raise
+            for record in _release(tags):
+                await arecord_llm_call(record)
+        if getattr(response, 'is_async', False):
+            response.streaming_content = atagged(response.streaming_content,
+                                                 view=tags['view'], wrap_id=tags['wrap_id'])
+        return response
+    return wrapper
+
+
+class LLMCallTimer:
+    """
+    Times one LLM call and builds its record.
+
+    Parameters:
+        - function: the generating function (description, quirky, comparison, batch)
+        - model: the primary LLM of the call
+        - prompt_key: hash of the prompt (llm_cache.completion_key)
+        - prompt: the system and user prompts, to estimate tokens if Groq does not
+          report them
+        - streamed: True if the completion is streamed
+    """
+    def __init__(self, function, model, prompt_key, prompt, streamed=False):
+        self.function = function
+        self.model = model
+        self.prompt_key = prompt_key
+        self.prompt = prompt
+        self.streamed = streamed
+        self.tags = _tags.get() or {}
+        self.started = time.perf_counter()
+        self.ttft_ms = None
+
+    def first_token(self):
+        """
+        Marks the arrival of the first streamed token.
+        """
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.started) * 1000
+
+    def finish(self, outcome, cache, usage=None, completion=None, model=None,
+               hedged=False):
+        """
+        Returns the record of the finished call.
+
+        Parameters:
+            - outcome: 'ok', 'error' or 'rejected'
+            - cache: 'hit', 'miss' or 'off'
+            - usage: Groq's usage field, if the response had one
+            - completion: the generated text, to estimate tokens without usage
+            - model: the LLM that answered, if not the primary one
+            - hedged: True if the call was also sent to the alternate model
+        """
+        record = {
+            'function': self.function,
+            'view': self.tags.get('view') or '',
+            'wrap_id': self.tags.get('wrap_id'),
+            'model': model or self.model,
+            'hedged': hedged,
+            'prompt_key': self.prompt_key,
+            'cache': cache,
+            'outcome': outcome,
+            'streamed': self.streamed,
+            'wall_ms': (time.perf_counter() - self.started) * 1000,
+            'ttft_ms': self.ttft_ms,
+            'prompt_tokens': None,
+            'completion_tokens': None,
+            'tokens_estimated': False,
+        }
+        if cache == 'hit':
+            record['prompt_tokens'] = record['completion_tokens'] = 0
+        elif usage is not None:
+            record['prompt_tokens'] = usage.prompt_tokens
+            record['completion_tokens'] = usage.completion_tokens
+        elif completion is not None:
+            record['prompt_tokens'] = estimate_tokens(self.prompt)
+            record['completion_tokens'] = estimate_tokens(completion)
+            record['tokens_estimated'] = True
+        return record
+
+
+def _take_batch(record, force=False):
+    """
+    Buffers a record and returns the buffered records once there are enough to flush.
+    """
+    config = get_llm_metrics_config()
+    if not config['enabled']:
+        return []
+    with _buffer_lock:
+        if record is not None:
+            _buffer.append(record)
+        if not force and len(_buffer) < config['flush_every']:
+            return []
+        batch = _buffer[:]
+        _buffer.clear()
+    return batch
+
+
+def _should_prune():
+    global _flushes  # pylint: disable=global-statement
+    with _buffer_lock:
+        _flushes += 1
+        return _flushes % PRUNE_EVERY == 0
+
+
+def record_llm_call(record):
+    """
+    Records a finished call, writing the buffered records if it fills the buffer.
+    """
+    if _hold(record):
+        return
+    batch = _take_batch(record)
+    if batch:
+        _call_model().objects.bulk_create(  # pylint: disable=no-member
+            [_call_model()(**item) for item in batch])
+        if _should_prune():
+            prune_llm_calls()
+
+
+async def arecord_llm_call(record):
+    """
+    Async version of record_llm_call().
+    """
+    if _hold(record):
+        return
+    batch = _take_batch(record)
+    if batch:
+        await _call_model().objects.abulk_create(  # pylint: disable=no-member
+            [_call_model()(**item) for item in batch])
+        if _should_prune():
+            await _aprune_llm_calls()
+
+
+def buffer_llm_call(record):
+    """
+    Buffers a record without writing anything, for calls that cannot wait for a query
+    (e.g. while being cancelled).
+    """
+    if _hold(record):
+        return
+    config = get_llm_metrics_config()
+    if config['enabled']:
+        with _buffer_lock:
+            _buffer.append(record)
+
+
+def flush_llm_calls():
+    """
+    Writes every buffered record. Returns how many were written.
+    """
+    batch = _take_batch(None, force=True)
+    if batch:
+        _call_model().objects.bulk_create(  # pylint: disable=no-member
+            [_call_model()(**item) for item in batch])
+    return len(batch)
+
+
+def prune_llm_calls():
+    """
+    Deletes the oldest records beyond LLM_METRICS['max_rows']. Returns how many.
+    """
+    model = _call_model()
+    overflow = list(model.objects.order_by('-created_at')  # pylint: disable=no-member
+                    .values_list('id', flat=True)[get_llm_metrics_config()['max_rows']:])
+    if not overflow:
+        return 0
+    return model.objects.filter(id__in=overflow).delete()[0]  # pylint: disable=no-member
+
+
+async def _aprune_llm_calls():
+    model = _call_model()
+    overflow = [call_id async for call_id in  # pylint: disable=no-member
+                model.objects.order_by('-created_at').values_list('id', flat=True)[
+                    get_llm_metrics_config()['max_rows']:]]
+    if overflow:
+        await model.objects.filter(id__in=overflow).adelete()  # pylint: disable=no-member
+
+
+def clear_llm_metrics():
+    """
+    Drops the buffered records without writing them. Used by tests.
+    """
+    with _buffer_lock:
+        _buffer.clear()
+
+
+# Calls whose wall time is a model's latency
+_ANSWERED = Q(outcome='ok') & ~Q(cache='hit')
+
+
+def _totals():
+    """
+    Returns the aggregate expressions of the counts and totals of a group of records.
+    """
+    return {
+        'n_calls': Count('id'),
+        'n_cache_hits': Count('id', filter=Q(cache='hit')),
+        'n_errors': Count('id', filter=Q(outcome='error')),
+        'n_rejected': Count('id', filter=Q(outcome='rejected')),
+        'n_hedged': Count('id', filter=Q(hedged=True)),
+        'n_answered': Count('id', filter=_ANSWERED),
+        'n_ttft': Count('ttft_ms'),
+        'max_wall_ms': Max('wall_ms', filter=_ANSWERED),
+        'sum_prompt_tokens': Sum('prompt_tokens'),
+        'sum_completion_tokens': Sum('completion_tokens'),
+    }
+
+
+def _percentile(calls, field, count, share):
+    """
+    Returns the value of field below which the given share of count records fall, read
+    with one ordered query.
+    """
+    if not count:
+        return None
+    return calls.order_by(field).values_list(field, flat=True)[
+        min(int(share * count), count - 1)]
+
+
+def _aggregate(calls, totals):
+    """
+    Returns the counts, latency percentiles and token totals of a queryset of records.
+
+    Parameters:
+        - calls: the records
+        - totals: their counts and totals, aggregated with _totals()
+    """
+    answered = calls.filter(_ANSWERED)
+    streamed = calls.filter(ttft_ms__isnull=False)
+    prompt_tokens = totals['sum_prompt_tokens'] or 0
+    completion_tokens = totals['sum_completion_tokens'] or 0
+    return {
+        'calls': totals['n_calls'],
+        'cache_hits': totals['n_cache_hits'],
+        'errors': totals['n_errors'],
+        'rejected': totals['n_rejected'],
+        'hedged': totals['n_hedged'],
+        'wall_ms_p50': _percentile(answered, 'wall_ms', totals['n_answered'], 0.5),
+        'wall_ms_p95': _percentile(answered, 'wall_ms', totals['n_answered'], 0.95),
+        'wall_ms_max': totals['max_wall_ms'],
+        'ttft_ms_p50': _percentile(streamed, 'ttft_ms', totals['n_ttft'], 0.5),
+        'ttft_ms_p95': _percentile(streamed, 'ttft_ms', totals['n_ttft'], 0.95),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+
+
+def _grouped(calls, field):
+    groups = {}
+    for totals in calls.values(field).annotate(**_totals()).order_by(field):
+        name = totals.pop(field)
+        groups[name or '-'] = _aggregate(calls.filter(**{field: name}), totals)
+    return dict(sorted(groups.items()))
+
+
+def get_llm_metrics(hours=24, top=10):
+    """
+    Aggregates the recorded LLM calls of the last hours, after writing the buffered ones.
+    Counts and totals are aggregated by the database; only the percentiles are read
+    one value each.
+
+    Parameters:
+        - hours: how far back to look
+        - top: how many of the heaviest prompts to list
+
+    Returns:
+        Dictionary with the totals, the same aggregates per function, per view and per
+        answering model, and the prompts that used the most tokens (by prompt_key, with
+        their call counts)
+    """
+    flush_llm_calls()
+    since = timezone.now() - timedelta(hours=hours)
+    calls = _call_model().objects.filter(created_at__gte=since)  # pylint: disable=no-member
+
+    heaviest = calls.values('function', 'prompt_key').annotate(
+        n_calls=Count('id'),
+        sum_prompt_tokens=Coalesce(Sum('prompt_tokens'), 0),
+        sum_completion_tokens=Coalesce(Sum('completion_tokens'), 0),
+        sum_wall_ms=Sum('wall_ms'),
+    ).order_by((F('sum_prompt_tokens') + F('sum_completion_tokens')).desc(),
+               'function', 'prompt_key')[:top]
+    return {
+        'hours': hours,
+        'total': _aggregate(calls, calls.aggregate(**_totals())),
+        'by_function': _grouped(calls, 'function'),
+        'by_view': _grouped(calls, 'view'),
+        'by_model': _grouped(calls, 'model'),
+        'heaviest_prompts': [{'function': prompt['function'],
+                              'prompt_key': prompt['prompt_key'],
+                              'calls': prompt['n_calls'],
+                              'prompt_tokens': prompt['sum_prompt_tokens'],
+                              'completion_tokens': prompt['sum_completion_tokens'],
+                              'wall_ms': prompt['sum_wall_ms']}
+                             for prompt in heaviest],
+    }
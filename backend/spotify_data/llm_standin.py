@@ -0,0 +1,379 @@
+"""
+Local stand-ins for the Groq chat completions API, for benchmarks, load tests and tests.
+
+Two flavours share the same deterministic completions and the same knobs:
+    - make_server() runs an OpenAI/Groq-compatible HTTP server serving
+      POST /openai/v1/chat/completions (and /v1/chat/completions), with and without
+      stream=True, so the real Groq SDK can be pointed at it
+    - FakeGroq and AsyncFakeGroq answer in-process, without any network, and mimic the
+      parts of groq.Groq and groq.AsyncGroq the backend uses
+
+The completion of a prompt only depends on the prompt, so repeated runs see the same
+text. Prompts asking for a JSON object (response_format json_object) whose user message
+is a JSON object of requests, like batched slide prompts, get a JSON object answering
+every key. Responses are delayed by a latency distribution before the first token and
+then sent at tokens_per_second, and a share of them can fail with error_status.
+
+Built on the standard library's ThreadingHTTPServer so it needs no extra dependencies.
+Run the server with `manage.py run_llm_standin` and select a backend with LLM_BACKEND
+(see spotify_data/llm_clients.py).
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+import httpx
+from groq import APIStatusError
+from .standin import parse_latency
+
+COMPLETION_PATHS = ('/openai/v1/chat/completions', '/v1/chat/completions')
+ROAST_SENTENCES = (
+    "Your playlist sounds like a mood ring that only knows one mood.",
+    "You dress like the merch table ran out of your size and you took it personally.",
+    "Somewhere a barista knows your name and regrets it.",
+    "You call it eclectic; your neighbors call it a noise complaint.",
+    "Your idea of a hot take is liking the album before the single.",
+    "You skip the intro of every song because suspense is for people with time.",
+    "Your aux cord privileges were revoked by a unanimous vote.",
+    "You own more tote bags than opinions, and that is saying something.",
+    "Every road trip with you is a hostage situation with a good sound system.",
+    "You think a vinyl collection counts as a personality trait.",
+)
+
+
+@dataclass
+class LLMStandinConfig:
+    """
+    Behaviour of the LLM stand-ins.
+
+    Attributes:
+        - latency: latency distribution before the first token (see standin.parse_latency)
+        - tokens_per_second: rate tokens are generated at once the first one is out,
+          0 for all at once
+        - error_rate: share of requests that fail, between 0 and 1
+        - error_status: HTTP status of failed requests
+        - seed: seed of the latency and error randomness
+        - model_latency: latency distributions of given models, overriding latency
+          (e.g. to make the alternate of hedged requests faster, see llm_hedging.py)
+    """
+    latency: str = 'fixed:0'
+    tokens_per_second: float = 0
+    error_rate: float = 0.0
+    error_status: int = 503
+    seed: int = 0
+    model_latency: dict = field(default_factory=dict)
+    _rng: random.Random = field(init=False, repr=False)
+    _rng_lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self.sample_latency = parse_latency(self.latency)
+        self.model_samplers = {model: parse_latency(spec)
+                               for model, spec in self.model_latency.items()}
+
+    def delay(self, model=None):
+        """
+        Returns how long before the first token of the next response of a model, in seconds.
+        """
+        sample = self.model_samplers.get(model, self.sample_latency)
+        with self._rng_lock:
+            return sample(self._rng)
+
+    def token_delay(self):
+        """
+        Returns the time between two tokens, in seconds.
+        """
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0
+
+    def should_fail(self):
+        """
+        Returns True if the next response should be an injected error.
+        """
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+
+def _roast(prompt):
+    """
+    Returns the deterministic roast answering a prompt.
+    """
+    rng = random.Random(prompt)
+    return ' '.join(rng.sample(ROAST_SENTENCES, 3))
+
+
+def standin_completion(messages, json_mode=False):
+    """
+    Returns the deterministic completion of chat messages.
+
+    Parameters:
+        - messages: list of {'role', 'content'} dictionaries
+        - json_mode: True if a JSON object was asked for
+
+    Returns:
+        The generated text; in JSON mode, a JSON object answering every key of the last
+        user message if it is a JSON object, and an empty one otherwise
+    """
+    prompt = next((message['content'] for message in reversed(messages)
+                   if message.get('role') == 'user'), '')
+    if not json_mode:
+        return _roast(prompt)
+    try:
+        requests = json.loads(prompt)
+    except ValueError:
+        requests = {}
+    if not isinstance(requests, dict):
+        requests = {}
+    return json.dumps({key: _roast(str(request)) for key, request in requests.items()})
+
+
+def split_tokens(text):
+    """
+    Splits a completion into the pieces streamed one at a time (a word and its spacing).
+    """
+    return re.findall(r'\s*\S+', text) or ['']
+
+
+def usage_body(content, prompt_tokens):
+    """
+    Returns the usage field reported for a completion.
+    """
+    completion_tokens = len(split_tokens(content))
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
+
+
+def completion_body(model, content, prompt_tokens=0):
+    """
+    Returns the JSON body of a chat completion, shaped like Groq's.
+    """
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'logprobs': None,
+                     'message': {'role': 'assistant', 'content': content}}],
+        'usage': usage_body(content, prompt_tokens),
+    }
+
+
+def chunk_bodies(model, content, prompt_tokens=0):
+    """
+    Yields the JSON bodies of the chunks streaming a chat completion, shaped like Groq's:
+    the last one carries the usage in its x_groq field.
+    """
+    completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+    created = int(time.time())
+    for token in split_tokens(content):
+        yield {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+               'model': model, 'choices': [{'index': 0, 'finish_reason': None,
+                                            'delta': {'role': 'assistant', 'content': token}}]}
+    yield {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+           'model': model, 'choices': [{'index': 0, 'finish_reason': 'stop',
+                                        'delta': {'content': None}}],
+           'x_groq': {'id': completion_id, 'usage': usage_body(content, prompt_tokens)}}
+
+
+def error_body(status):
+    """
+    Returns the JSON body of an injected error.
+    """
+    error_type = 'internal_server_error' if status >= 500 else 'invalid_request_error'
+    return {'error': {'message': f'Stand-in injected error {status}', 'type': error_type}}
+
+
+def _prompt_tokens(messages):
+    return sum(len(split_tokens(message.get('content') or '')) for message in messages)
+
+
+class LLMStandinHandler(BaseHTTPRequestHandler):
+    """
+    Request handler serving the chat completions endpoint. The server's `config`
+    attribute holds the LLMStandinConfig.
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def _stream(self, model, content, prompt_tokens):
+        """
+        Sends a completion as server-sent events, one token at a time.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        token_delay = self.server.config.token_delay()
+        for body in chunk_bodies(model, content, prompt_tokens):
+            self._write_chunk(f'data: {json.dumps(body)}\n\n'.encode())
+            time.sleep(token_delay)
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Serves the chat completions endpoint.
+        """
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            request = None
+        if urlsplit(self.path).path not in COMPLETION_PATHS:
+            self._send_json(404, {'error': {'message': 'Unknown request URL',
+                                            'type': 'invalid_request_error'}})
+            return
+        if not isinstance(request, dict) or not isinstance(request.get('messages'), list):
+            self._send_json(400, {'error': {'message': "'messages' is required",
+                                            'type': 'invalid_request_error'}})
+            return
+        config = self.server.config
+        model = request.get('model', 'standin')
+        time.sleep(config.delay(model))
+        if config.should_fail():
+            self._send_json(config.error_status, error_body(config.error_status))
+            return
+
+        json_mode = (request.get('response_format') or {}).get('type') == 'json_object'
+        content = standin_completion(request['messages'], json_mode)
+        if request.get('stream'):
+            self._stream(model, content, _prompt_tokens(request['messages']))
+            return
+        time.sleep(config.token_delay() * len(split_tokens(content)))
+        self._send_json(200, completion_body(model, content,
+                                             _prompt_tokens(request['messages'])))
+
+
+def make_server(host='127.0.0.1', port=8766, config=None, verbose=False):
+    """
+    Creates the LLM stand-in server without starting it.
+
+    Parameters:
+        - host, port: address to listen on (port 0 picks a free port)
+        - config: LLMStandinConfig (defaults to instant responses and no errors)
+        - verbose: log every request to stderr
+
+    Returns:
+        ThreadingHTTPServer; call serve_forever() to run it
+    """
+    server = ThreadingHTTPServer((host, port), LLMStandinHandler)
+    server.daemon_threads = True
+    server.config = config or LLMStandinConfig()
+    server.verbose = verbose
+    return server
+
+
+def _namespace(value):
+    """
+    Turns a JSON body into nested attribute objects, like the SDK's response models.
+    """
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_namespace(item) for item in value]
+    return value
+
+
+def _injected_error(status):
+    response = httpx.Response(status, request=httpx.Request('POST', 'http://fake-groq' +
+                                                            COMPLETION_PATHS[0]))
+    body = error_body(status)
+    return APIStatusError(body['error']['message'], response=response, body=body)
+
+
+class _FakeCompletions:
+    def __init__(self, config):
+        self.config = config
+
+    def create(self, messages, model, stream=False, response_format=None,
+               **kwargs):  # pylint: disable=unused-argument
+        """
+        Returns a completion, or an iterator over its chunks if stream is True.
+        """
+        time.sleep(self.config.delay(model))
+        if self.config.should_fail():
+            raise _injected_error(self.config.error_status)
+        json_mode = (response_format or {}).get('type') == 'json_object'
+        content = standin_completion(messages, json_mode)
+        if stream:
+            return self._stream(model, content, _prompt_tokens(messages))
+        time.sleep(self.config.token_delay() * len(split_tokens(content)))
+        return _namespace(completion_body(model, content, _prompt_tokens(messages)))
+
+    def _stream(self, model, content, prompt_tokens):
+        for body in chunk_bodies(model, content, prompt_tokens):
+            yield _namespace(body)
+            time.sleep(self.config.token_delay())
+
+
+class _AsyncFakeCompletions(_FakeCompletions):
+    async def create(self, messages, model, stream=False, response_format=None,
+                     **kwargs):  # pylint: disable=unused-argument,invalid-overridden-method
+        """
+        Returns a completion, or an async iterator over its chunks if stream is True.
+        """
+        await asyncio.sleep(self.config.delay(model))
+        if self.config.should_fail():
+            raise _injected_error(self.config.error_status)
+        json_mode = (response_format or {}).get('type') == 'json_object'
+        content = standin_completion(messages, json_mode)
+        if stream:
+            return self._astream(model, content, _prompt_tokens(messages))
+        await asyncio.sleep(self.config.token_delay() * len(split_tokens(content)))
+        return _namespace(completion_body(model, content, _prompt_tokens(messages)))
+
+    async def _astream(self, model, content, prompt_tokens):
+        for body in chunk_bodies(model, content, prompt_tokens):
+            yield _namespace(body)
+            await asyncio.sleep(self.config.token_delay())
+
+
+class FakeGroq:
+    """
+    In-process stand-in for groq.Groq: client.chat.completions.create() answers with the
+    deterministic stand-in completions without any network.
+    """
+    def __init__(self, config=None):
+        self.config = config or LLMStandinConfig()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self.config))
+
+    def is_closed(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class AsyncFakeGroq(FakeGroq):
+    """
+    In-process stand-in for groq.AsyncGroq, answering like FakeGroq.
+    """
+    def __init__(self, config=None):  # pylint: disable=super-init-not-called
+        self.config = config or LLMStandinConfig()
+        self.chat = SimpleNamespace(completions=_AsyncFakeCompletions(self.config))
+
+    async def close(self):  # pylint: disable=invalid-overridden-method
+        pass
@@ -0,0 +1,56 @@
+"""
+Closes the per-loop HTTP clients of requests served outside an ASGI server.
+
+The async Spotify client (async_client.py) and the AsyncGroq clients (llm_clients.py)
+are kept per event loop. Under an ASGI server every request runs on the server's one
+loop, so the clients and their connection pools are shared and kept open. Under WSGI
+(gunicorn's sync workers, runserver), Django runs each async view in a new event loop
+with async_to_sync, and consumes async streamed responses in yet another one; those loops
+end with the request, and the clients they opened would be left with open sockets.
+
+@close_loop_clients closes the clients of such loops once the view returns, and once
+its streamed response has been sent.
+"""
+
+import functools
+from django.core.handlers.asgi import ASGIRequest
+from .async_client import close_async_client
+from .llm_clients import aclose_async_groq_clients
+
+
+async def aclose_loop_clients():
+    """
+    Closes the Spotify and Groq clients of the running event loop.
+    """
+    await close_async_client()
+    await aclose_async_groq_clients()
+
+
+async def _aclosing(stream):
+    """
+    Yields from an async iterator, then closes the clients of the loop it ran on.
+    """
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        await aclose_loop_clients()
+
+
+def close_loop_clients(view):
+    """
+    Decorator closing the per-loop clients an async view (and its streamed response)
+    opened, unless the request is served by an ASGI server whose loop outlives it.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            return await view(request, *args, **kwargs)
+        try:
+            response = await view(request, *args, **kwargs)
+        finally:
+            await aclose_loop_clients()
+        if getattr(response, 'is_async', False):
+            response.streaming_content = _aclosing(response.streaming_content)
+        return response
+    return wrapper
@@ -0,0 +1,70 @@
+"""
+Prints latency and token aggregates of the recorded LLM calls (see spotify_data/llm_metrics.py).
+
+Usage:
+    python manage.py llm_report --hours 24 --top 10
+    python manage.py llm_report --json
+"""
+
+import json
+from django.core.management.base import BaseCommand
+from spotify_data.llm_metrics import get_llm_metrics
+
+COLUMNS = (
+    ('calls', 'calls'),
+    ('cache_hits', 'hits'),
+    ('errors', 'errors'),
+    ('rejected', 'rejected'),
+    ('hedged', 'hedged'),
+    ('wall_ms_p50', 'p50 ms'),
+    ('wall_ms_p95', 'p95 ms'),
+    ('ttft_ms_p50', 'ttft p50'),
+    ('prompt_tokens', 'prompt tok'),
+    ('completion_tokens', 'compl tok'),
+)
+
+
+def _cell(value):
+    if value is None:
+        return '-'
+    return f'{value:.0f}' if isinstance(value, float) else str(value)
+
+
+class Command(BaseCommand):
+    """
+    Reports LLM calls per function and per view, and the heaviest prompts.
+    """
+    help = "Reports latency and token usage of the LLM calls recorded in the last hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24,
+                            help="How far back to look.")
+        parser.add_argument('--top', type=int, default=10,
+                            help="How many of the heaviest prompts to list.")
+        parser.add_argument('--json', action='store_true',
+                            help="Print the aggregates as JSON.")
+
+    def _table(self, title, groups):
+        self.stdout.write(f"\n{title}")
+        self.stdout.write(f"{'':24}" + ''.join(f'{label:>12}' for _, label in COLUMNS))
+        for name, stats in groups.items():
+            self.stdout.write(f'{name[:24]:24}' + ''.join(f'{_cell(stats[key]):>12}'
+                                                          for key, _ in COLUMNS))
+
+    def handle(self, *args, **options):
+        metrics = get_llm_metrics(hours=options['hours'], top=options['top'])
+        if options['json']:
+            self.stdout.write(json.dumps(metrics, indent=2))
+            return
+
+        self.stdout.write(f"LLM calls in the last {options['hours']:g} hours")
+        self._table('Total', {'all': metrics['total']})
+        self._table('By function', metrics['by_function'])
+        self._table('By view', metrics['by_view'])
+        self._table('By model', metrics['by_model'])
+        self.stdout.write('\nHeaviest prompts')
+        for prompt in metrics['heaviest_prompts']:
+            self.stdout.write(
+                f"{prompt['function']:12} {prompt['prompt_key'][:12]}  "
+                f"{prompt['calls']:>5} calls  {prompt['prompt_tokens']:>7} prompt tok  "
+                f"{prompt['completion_tokens']:>7} compl tok  {prompt['wall_ms']:>9.0f} ms")
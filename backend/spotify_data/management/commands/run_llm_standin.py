@@ -0,0 +1,59 @@
+"""
+Runs the local LLM stand-in server (see spotify_data/llm_standin.py).
+
+Usage:
+    python manage.py run_llm_standin --port 8766 --latency lognormal:300:0.4 \
+        --tokens-per-second 250 --error-rate 0.01
+
+Then start the backend with
+    LLM_BACKEND=standin LLM_STANDIN_URL=http://127.0.0.1:8766
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from spotify_data.llm_standin import LLMStandinConfig, make_server
+
+
+class Command(BaseCommand):
+    """
+    Serves /openai/v1/chat/completions with deterministic completions.
+    """
+    help = "Runs a local OpenAI/Groq-compatible LLM stand-in for benchmarks and load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--latency', default='fixed:0',
+                            help="Latency distribution in ms before the first token: "
+                                 "fixed:MS, uniform:MIN:MAX, normal:MEAN:STDDEV or "
+                                 "lognormal:MEDIAN:SIGMA.")
+        parser.add_argument('--tokens-per-second', type=float, default=0,
+                            help="Rate tokens are generated at (0 for all at once).")
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Share of requests answered with an error (0 to 1).")
+        parser.add_argument('--error-status', type=int, default=503,
+                            help="HTTP status of injected errors.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--verbose-requests', action='store_true',
+                            help="Log every request.")
+
+    def handle(self, *args, **options):
+        try:
+            config = LLMStandinConfig(latency=options['latency'],
+                                      tokens_per_second=options['tokens_per_second'],
+                                      error_rate=options['error_rate'],
+                                      error_status=options['error_status'],
+                                      seed=options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        server = make_server(options['host'], options['port'], config,
+                             verbose=options['verbose_requests'])
+        base_url = f"http://{options['host']}:{server.server_address[1]}"
+        self.stdout.write(f"LLM stand-in listening on {base_url}")
+        self.stdout.write(f"Set LLM_BACKEND=standin and LLM_STANDIN_URL={base_url} to use it.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,57 @@
+"""
+Runs the local Spotify stand-in server (see spotify_data/standin.py).
+
+Usage:
+    python manage.py run_spotify_standin --port 8765 --users 500 \
+        --latency lognormal:80:0.5 --rate-limit-ratio 0.02
+
+Then start the backend with
+    SPOTIFY_API_BASE_URL=http://127.0.0.1:8765 SPOTIFY_ACCOUNTS_BASE_URL=http://127.0.0.1:8765
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from spotify_data.standin import StandinConfig, make_server
+
+
+class Command(BaseCommand):
+    """
+    Serves /v1/me, /v1/me/top/*, /v1/recommendations and /api/token with synthetic users.
+    """
+    help = "Runs a local stand-in for the Spotify Web API for load and integration testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--users', type=int, default=100,
+                            help="Number of synthetic users tokens are spread over.")
+        parser.add_argument('--latency', default='fixed:0',
+                            help="Latency distribution in ms: fixed:MS, uniform:MIN:MAX, "
+                                 "normal:MEAN:STDDEV or lognormal:MEDIAN:SIGMA.")
+        parser.add_argument('--rate-limit-ratio', type=float, default=0.0,
+                            help="Share of requests answered with 429 (0 to 1).")
+        parser.add_argument('--retry-after', type=int, default=1,
+                            help="Retry-After seconds sent with injected 429 responses.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--verbose-requests', action='store_true',
+                            help="Log every request.")
+
+    def handle(self, *args, **options):
+        try:
+            config = StandinConfig(users=options['users'], latency=options['latency'],
+                                   rate_limit_ratio=options['rate_limit_ratio'],
+                                   retry_after=options['retry_after'], seed=options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        server = make_server(options['host'], options['port'], config,
+                             verbose=options['verbose_requests'])
+        base_url = f"http://{options['host']}:{server.server_address[1]}"
+        self.stdout.write(f"Spotify stand-in listening on {base_url}")
+        self.stdout.write(f"Set SPOTIFY_API_BASE_URL={base_url} and "
+                          f"SPOTIFY_ACCOUNTS_BASE_URL={base_url} to use it.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
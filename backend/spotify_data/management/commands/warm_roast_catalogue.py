@@ -0,0 +1,45 @@
+"""
+Pre-generates roasts of the most popular artists and tracks (see spotify_data/roast_catalogue.py).
+
+Usage:
+    python manage.py warm_roast_catalogue --top 500 --concurrency 5
+    python manage.py warm_roast_catalogue --kind artist --top 100 --refresh
+"""
+
+import os
+from asgiref.sync import async_to_sync
+from dotenv import load_dotenv
+from django.core.management.base import BaseCommand, CommandError
+from spotify_data.roast_catalogue import RANKED_FIELDS, awarm_catalogue
+
+
+class Command(BaseCommand):
+    """
+    Ranks artists and tracks by how often they appear in users' favorites and catalogues
+    roasts of the top ones.
+    """
+    help = "Pre-generates roasts of the artists and tracks most often in users' favorites."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=tuple(RANKED_FIELDS), action='append',
+                            help="Catalogue only artists or only tracks (default: both).")
+        parser.add_argument('--top', type=int, default=200,
+                            help="How many of the most frequent ones to catalogue per kind.")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="The most LLM calls in flight at once "
+                                 "(default: LLM_CONCURRENCY).")
+        parser.add_argument('--refresh', action='store_true',
+                            help="Regenerate roasts that are already catalogued.")
+
+    def handle(self, *args, **options):
+        load_dotenv()
+        groq_api_key = os.getenv('GROQ_API_KEY')
+        if not groq_api_key:
+            raise CommandError("GROQ_API_KEY environment variable is not set.")
+
+        for kind in options['kind'] or RANKED_FIELDS:
+            counts = async_to_sync(awarm_catalogue)(groq_api_key, kind, options['top'],
+                                                    options['concurrency'], options['refresh'])
+            self.stdout.write(f"{kind}s: {counts['ranked']} ranked, {counts['catalogued']} "
+                              f"already catalogued, {counts['generated']} generated, "
+                              f"{counts['failed']} failed")
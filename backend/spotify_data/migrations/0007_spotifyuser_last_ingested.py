@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_data', '0006_alter_duowrapped_datetime_created_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spotifyuser',
+            name='last_ingested_long',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='spotifyuser',
+            name='last_ingested_medium',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='spotifyuser',
+            name='last_ingested_short',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='duowrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-02-50-27-940026', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='spotifywrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-02-50-27-940026', max_length=50),
+        ),
+    ]
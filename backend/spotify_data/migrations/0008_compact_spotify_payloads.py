@@ -0,0 +1,113 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:05
+
+from django.db import migrations
+
+# A frozen copy of the projections in spotify_data/projections.py as of this migration,
+# so later changes to them do not change what this migration does.
+ARTIST_FIELDS = ('id', 'name', 'popularity', 'genres')
+TRACK_FIELDS = ('id', 'name', 'popularity')
+TRACK_ARTIST_FIELDS = ('id', 'name', 'genres', 'popularity')
+
+USER_ARTIST_FIELDS = ('favorite_artists_short', 'favorite_artists_medium',
+                      'favorite_artists_long', 'quirkiest_artists_short',
+                      'quirkiest_artists_medium', 'quirkiest_artists_long')
+USER_TRACK_FIELDS = ('favorite_tracks_short', 'favorite_tracks_medium',
+                     'favorite_tracks_long')
+WRAP_ARTIST_FIELDS = ('favorite_artists', 'quirkiest_artists')
+WRAP_TRACK_FIELDS = ('favorite_tracks',)
+
+
+def _pick(item, fields):
+    return {field: item[field] for field in fields if field in item}
+
+
+def _project_images(images):
+    return [{'url': images[0]['url']}] if images else []
+
+
+def _project_artist(artist):
+    if not isinstance(artist, dict):
+        return artist
+    projected = _pick(artist, ARTIST_FIELDS)
+    if 'images' in artist:
+        projected['images'] = _project_images(artist['images'])
+    return projected
+
+
+def _project_track(track):
+    if not isinstance(track, dict):
+        return track
+    projected = _pick(track, TRACK_FIELDS)
+    if 'artists' in track:
+        projected['artists'] = [_pick(artist, TRACK_ARTIST_FIELDS)
+                                for artist in track['artists'][:1]]
+    if 'album' in track:
+        projected['album'] = {'images': _project_images(track['album'].get('images'))}
+    return projected
+
+
+PROJECTIONS = {
+    'artists': _project_artist,
+    'tracks': _project_track,
+}
+
+
+def project_fields(row, artist_fields, track_fields):
+    """
+    Projects the JSON list fields of a stored row (a model instance or a dictionary),
+    returning the names of the fields that changed.
+    """
+    changed = []
+    for kind, fields in (('artists', artist_fields), ('tracks', track_fields)):
+        for field in fields:
+            if isinstance(row, dict):
+                if field not in row:
+                    continue
+                value = row[field]
+            else:
+                value = getattr(row, field)
+            if value is None:
+                continue
+            projected = [PROJECTIONS[kind](item) for item in value]
+            if projected == value:
+                continue
+            if isinstance(row, dict):
+                row[field] = projected
+            else:
+                setattr(row, field, projected)
+            changed.append(field)
+    return changed
+
+
+def compact_payloads(apps, schema_editor):
+    """
+    Projects the Spotify objects already stored on users and wraps (including the
+    wraps copied into past_roasts) down to the fields the views read.
+    """
+    SpotifyUser = apps.get_model('spotify_data', 'SpotifyUser')
+    for spotify_user in SpotifyUser.objects.iterator(chunk_size=200):
+        changed = project_fields(spotify_user, USER_ARTIST_FIELDS, USER_TRACK_FIELDS)
+        for roast in spotify_user.past_roasts or []:
+            if isinstance(roast, dict) and project_fields(roast, WRAP_ARTIST_FIELDS,
+                                                          WRAP_TRACK_FIELDS):
+                changed.append('past_roasts')
+        if changed:
+            spotify_user.save(update_fields=set(changed))
+
+    for model_name in ('SpotifyWrapped', 'DuoWrapped'):
+        model = apps.get_model('spotify_data', model_name)
+        for wrapped in model.objects.iterator(chunk_size=200):
+            changed = project_fields(wrapped, WRAP_ARTIST_FIELDS, WRAP_TRACK_FIELDS)
+            if changed:
+                wrapped.save(update_fields=changed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_data', '0007_spotifyuser_last_ingested'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_payloads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_data', '0008_compact_spotify_payloads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCompletion',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('function', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('response', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='duowrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-02-37-318648', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='spotifywrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-02-37-318648', max_length=50),
+        ),
+    ]
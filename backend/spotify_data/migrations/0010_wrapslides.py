@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_data', '0009_llmcompletion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='duowrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-04-25-204396', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='spotifywrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-04-25-204396', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='WrapSlides',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wrap_id', models.IntegerField()),
+                ('is_duo', models.BooleanField(default=False)),
+                ('artists', models.JSONField(blank=True, null=True)),
+                ('tracks', models.JSONField(blank=True, null=True)),
+                ('genres', models.TextField(blank=True, null=True)),
+                ('quirky', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('wrap_id', 'is_duo')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_data', '0010_wrapslides'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('function', models.CharField(max_length=50)),
+                ('view', models.CharField(blank=True, default='', max_length=100)),
+                ('wrap_id', models.IntegerField(blank=True, null=True)),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_key', models.CharField(max_length=64)),
+                ('cache', models.CharField(max_length=10)),
+                ('outcome', models.CharField(max_length=10)),
+                ('streamed', models.BooleanField(default=False)),
+                ('wall_ms', models.FloatField()),
+                ('ttft_ms', models.FloatField(blank=True, null=True)),
+                ('prompt_tokens', models.IntegerField(blank=True, null=True)),
+                ('completion_tokens', models.IntegerField(blank=True, null=True)),
+                ('tokens_estimated', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='duowrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-22-34-009628', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='spotifywrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-22-34-009628', max_length=50),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_data', '0011_llmcall'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='duowrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-25-41-497484', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='spotifywrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-25-41-497484', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='RoastCatalogue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('spotify_id', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=300)),
+                ('text', models.TextField()),
+                ('appearances', models.IntegerField(default=0)),
+                ('model', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'spotify_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotify_data', '0012_roastcatalogue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='llmcall',
+            name='hedged',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='duowrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-30-38-054807', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='spotifywrapped',
+            name='datetime_created',
+            field=models.CharField(default='2026-10-18-03-30-38-054807', max_length=50),
+        ),
+    ]
@@ -16,7 +16,8 @@ class Song(models.Model):
 class SpotifyUser(models.Model):
     """
     Model for each Spotify user that registers on our website.
-    Never updated after the user registers.
+    Top items are re-ingested from Spotify once a term's data is older than its
+    SPOTIFY_INGEST_TTL.
 
     Parameters:
         - user: links Spotify id to Django User model
@@ -40,6 +41,9 @@ class SpotifyUser(models.Model):
         - llama_description: gives a description of how the user acts/thinks/dresses using an LLM
         - llama_songrecs: a string containing song recommendation as pulled from the LLM
         - past_roasts: a collection of past Spotify Roasts by this user
+        - last_ingested_short: when short term top items were last fetched from Spotify
+        - last_ingested_medium: when medium term top items were last fetched from Spotify
+        - last_ingested_long: when long term top items were last fetched from Spotify
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     spotify_id = models.CharField(max_length=100, unique=True)
@@ -62,6 +66,11 @@ class SpotifyUser(models.Model):
     quirkiest_artists_long = models.JSONField(default=list, blank=True, null=True)
     past_roasts = models.JSONField(default=list, blank=True, null=True)
 
+    # When each term was last ingested, used to skip refetching fresh data
+    last_ingested_short = models.DateTimeField(blank=True, null=True)
+    last_ingested_medium = models.DateTimeField(blank=True, null=True)
+    last_ingested_long = models.DateTimeField(blank=True, null=True)
+
 class WrapBase(models.Model):
     """
     Abstract base model for shared fields between SpotifyWrapped and DuoWrapped.
@@ -94,3 +103,110 @@ class DuoWrapped(WrapBase):
     Model for Duo Wrapped.
     """
     user2 = models.CharField(max_length=100)  # Additional field for DuoWrapped
+
+
+class LLMCompletion(models.Model):
+    """
+    Cached LLM completion, shared by every user sending the same prompt (see llm_cache.py).
+
+    Parameters:
+        - key: hash of the model, system prompt and normalized user prompt
+        - function: the function that generated it (description, quirky, comparison...)
+        - model: the LLM that generated it
+        - response: the generated text
+        - created_at: when it was generated, used for the TTL and eviction
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    function = models.CharField(max_length=50)
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    created_at = models.DateTimeField(auto_now=True, db_index=True)
+
+
+class WrapSlides(models.Model):
+    """
+    LLM texts shown on a wrap's slides, generated once when the wrap is created
+    (see slides.py). A section is null until it has been generated.
+
+    Parameters:
+        - wrap_id: id of the SpotifyWrapped or DuoWrapped
+        - is_duo: True if wrap_id is a DuoWrapped
+        - artists: one text per top artist, in order
+        - tracks: one text per top track, in order
+        - genres: description of the top genres
+        - quirky: roast of the quirkiest artists
+    """
+    wrap_id = models.IntegerField()
+    is_duo = models.BooleanField(default=False)
+    artists = models.JSONField(blank=True, null=True)
+    tracks = models.JSONField(blank=True, null=True)
+    genres = models.TextField(blank=True, null=True)
+    quirky = models.TextField(blank=True, null=True)
+
+    class Meta:
+        '''Meta'''
+        unique_together = ('wrap_id', 'is_duo')
+
+
+class LLMCall(models.Model):
+    """
+    One LLM call, recorded for latency and token accounting (see llm_metrics.py).
+
+    Parameters:
+        - created_at: when the call finished
+        - function: the generating function (description, quirky, comparison, batch)
+        - view: the view the call was made for, blank outside a tagged view
+        - wrap_id: id of the wrap the call was made for, if known
+        - model: the LLM that answered the call
+        - hedged: True if the call was also sent to the alternate model (see llm_hedging.py)
+        - prompt_key: hash of the prompt, the same as its LLMCompletion key
+        - cache: 'hit', 'miss', or 'off' when the LLM cache is disabled
+        - outcome: 'ok', 'error', or 'rejected' by the circuit breaker
+        - streamed: True if the completion was streamed
+        - wall_ms: time from the call to its last token
+        - ttft_ms: time to the first token of a streamed completion
+        - prompt_tokens, completion_tokens: from Groq's usage field, or estimated
+        - tokens_estimated: True if Groq did not report the usage
+    """
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    function = models.CharField(max_length=50)
+    view = models.CharField(max_length=100, blank=True, default='')
+    wrap_id = models.IntegerField(blank=True, null=True)
+    model = models.CharField(max_length=100)
+    hedged = models.BooleanField(default=False)
+    prompt_key = models.CharField(max_length=64)
+    cache = models.CharField(max_length=10)
+    outcome = models.CharField(max_length=10)
+    streamed = models.BooleanField(default=False)
+    wall_ms = models.FloatField()
+    ttft_ms = models.FloatField(blank=True, null=True)
+    prompt_tokens = models.IntegerField(blank=True, null=True)
+    completion_tokens = models.IntegerField(blank=True, null=True)
+    tokens_estimated = models.BooleanField(default=False)
+
+
+class RoastCatalogue(models.Model):
+    """
+    Roast of a popular artist or track, generated ahead of time and shared by every wrap
+    showing it (see roast_catalogue.py).
+
+    Parameters:
+        - kind: 'artist' or 'track'
+        - spotify_id: Spotify ID of the artist or track
+        - name: the subject the roast was generated for, e.g. 'Song by Artist'
+        - text: the roast
+        - appearances: how often it appeared in users' favorites when it was generated
+        - model: the LLM that generated it
+        - created_at: when it was generated
+    """
+    kind = models.CharField(max_length=10)
+    spotify_id = models.CharField(max_length=64)
+    name = models.CharField(max_length=300)
+    text = models.TextField()
+    appearances = models.IntegerField(default=0)
+    model = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        '''Meta'''
+        unique_together = ('kind', 'spotify_id')
@@ -0,0 +1,120 @@
+"""
+Compact projections of Spotify API objects, applied before anything is persisted.
+
+Spotify returns much more than we use: available_markets arrays, external_urls, full
+album objects and every image size. The views only ever read an item's name, id,
+popularity, genres, one image URL and a track's first artist (with the genres and
+popularity added by artist enrichment), so only those fields are kept. Projected objects
+keep Spotify's key names (e.g. artist['images'][0]['url']) so they can be read the same
+way as the raw payloads.
+
+Projections are idempotent; migration 0008 applied a frozen copy of them to stored rows.
+"""
+
+ARTIST_FIELDS = ('id', 'name', 'popularity', 'genres')
+TRACK_FIELDS = ('id', 'name', 'popularity')
+TRACK_ARTIST_FIELDS = ('id', 'name', 'genres', 'popularity')  # genres after enrichment
+
+# Fields of SpotifyUser and WrapBase holding lists of projected objects
+USER_ARTIST_FIELDS = ('favorite_artists_short', 'favorite_artists_medium',
+                      'favorite_artists_long', 'quirkiest_artists_short',
+                      'quirkiest_artists_medium', 'quirkiest_artists_long')
+USER_TRACK_FIELDS = ('favorite_tracks_short', 'favorite_tracks_medium',
+                     'favorite_tracks_long')
+WRAP_ARTIST_FIELDS = ('favorite_artists', 'quirkiest_artists')
+WRAP_TRACK_FIELDS = ('favorite_tracks',)
+
+
+def _pick(item, fields):
+    """
+    Returns the given fields of a dictionary, skipping the ones it does not have.
+    """
+    return {field: item[field] for field in fields if field in item}
+
+
+def project_images(images):
+    """
+    Keeps only the URL of the first (largest) image, Spotify lists them largest first.
+    """
+    return [{'url': images[0]['url']}] if images else []
+
+
+def project_artist(artist):
+    """
+    Returns the fields of a Spotify artist object that we store.
+
+    Parameters:
+        - artist: an artist object from /v1/me/top/artists
+
+    Returns:
+        Dictionary with id, name, popularity, genres and a single image
+    """
+    if not isinstance(artist, dict):
+        return artist
+    projected = _pick(artist, ARTIST_FIELDS)
+    if 'images' in artist:
+        projected['images'] = project_images(artist['images'])
+    return projected
+
+
+def project_track(track):
+    """
+    Returns the fields of a Spotify track object that we store.
+
+    Parameters:
+        - track: a track object from /v1/me/top/tracks
+
+    Returns:
+        Dictionary with id, name, popularity, the first artist and the album's image
+    """
+    if not isinstance(track, dict):
+        return track
+    projected = _pick(track, TRACK_FIELDS)
+    if 'artists' in track:
+        projected['artists'] = [_pick(artist, TRACK_ARTIST_FIELDS)
+                                for artist in track['artists'][:1]]
+    if 'album' in track:
+        projected['album'] = {'images': project_images(track['album'].get('images'))}
+    return projected
+
+
+PROJECTIONS = {
+    'artists': project_artist,
+    'tracks': project_track,
+}
+
+
+def project_items(kind, items):
+    """
+    Projects a list of 'artists' or 'tracks', passing None through unchanged.
+    """
+    if items is None:
+        return None
+    return [PROJECTIONS[kind](item) for item in items]
+
+
+def project_fields(row, artist_fields, track_fields):
+    """
+    Projects the JSON list fields of a stored row (a model instance or a dictionary).
+
+    Returns:
+        The names of the fields that changed
+    """
+    changed = []
+    for kind, fields in (('artists', artist_fields), ('tracks', track_fields)):
+        for field in fields:
+            if isinstance(row, dict):
+                if field not in row:
+                    continue
+                value = row[field]
+            else:
+                value = getattr(row, field)
+            projected = project_items(kind, value)
+            if projected == value:
+                continue
+            if isinstance(row, dict):
+                row[field] = projected
+            else:
+                setattr(row, field, projected)
+            changed.append(field)
+    return changed
@@ -0,0 +1,165 @@
+"""
+Compact, bounded prompts for every Groq call.
+
+Callers hand the prompt builders whatever they have: a name, a comma-separated string,
+or whole lists of (projected) Spotify objects. Interpolating those as they are puts ids,
+image URLs and every other field into the prompt, thousands of tokens for what should
+be a few names. Instead, subjects are rendered as:
+    - at most LLM_PROMPT['max_items'] names, each cut to LLM_PROMPT['max_name_chars']
+    - the LLM_PROMPT['max_genres'] most common genres among them
+    - a popularity bucket ('underground' to 'mainstream') instead of raw scores
+
+and the subjects are cut further if needed so that every user prompt stays within
+LLM_PROMPT['max_tokens'] estimated tokens, as a hard cap.
+The estimate (estimate_tokens) is the usual ~4 characters per token for English text,
+which is close enough to size prompts without loading a tokenizer.
+"""
+
+import math
+from collections import Counter
+from django.conf import settings
+
+DEFAULT_LLM_PROMPT = {
+    'max_items': 5,
+    'max_genres': 3,
+    'max_name_chars': 40,
+    'max_tokens': 120,
+}
+CHARS_PER_TOKEN = 4
+
+# Lowest Spotify popularity (0-100) of each bucket, highest first
+POPULARITY_BUCKETS = (
+    (70, 'mainstream'),
+    (45, 'popular'),
+    (20, 'niche'),
+    (0, 'underground'),
+)
+
+ROAST_SYSTEM_PROMPT = ("You are a music analyst who roasts and insults the user "
+                       "(use 2nd perspective) behavior based on their music tastes"
+                       " in less than 100 words.")
+
+COMPARISON_SYSTEM_PROMPT = ("You are a music critic who roasts and humorously compares two "
+                            "artists (use 2nd perspective) in less than 100 words. "
+                            "Be witty and sarcastic.")
+
+
+def get_prompt_config():
+    """
+    Returns LLM_PROMPT from settings with missing keys filled from the defaults.
+    """
+    return {**DEFAULT_LLM_PROMPT, **getattr(settings, 'LLM_PROMPT', {})}
+
+
+def estimate_tokens(text):
+    """
+    Returns the estimated number of tokens of a text.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cuts a text to at most max_tokens estimated tokens, at a word boundary if possible.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 3]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip(' ,;') + '...'
+
+
+def popularity_bucket(popularity):
+    """
+    Returns the bucket name of a Spotify popularity score, e.g. 'niche' for 30.
+    """
+    return next(name for threshold, name in POPULARITY_BUCKETS if popularity >= threshold)
+
+
+def _shorten(name, max_chars):
+    name = ' '.join(str(name).split())
+    return name if len(name) <= max_chars else name[:max_chars - 3].rstrip() + '...'
+
+
+def item_name(item):
+    """
+    Returns the name of an artist, a track ('Song by Artist') or a plain string.
+    """
+    if not isinstance(item, dict):
+        return str(item)
+    if item.get('artists'):
+        return f"{item.get('name', '')} by {item['artists'][0].get('name', '')}"
+    return str(item.get('name', ''))
+
+
+def render_subject(subject):
+    """
+    Renders what a prompt is about as a short line.
+
+    Parameters:
+        - subject: a string, an artist or track dictionary, or a list of either
+
+    Returns:
+        The names, followed by the top genres and the popularity bucket when the subject
+        has them, e.g. 'Drake, Adele (genres: pop, rap; mostly mainstream)'
+    """
+    config = get_prompt_config()
+    items = list(subject[:config['max_items']]) if isinstance(subject, (list, tuple)) \
+        else [subject]
+    names = ', '.join(_shorten(item_name(item), config['max_name_chars']) for item in items)
+
+    dicts = [item for item in items if isinstance(item, dict)]
+    genres = Counter(genre for item in dicts for genre in item.get('genres') or ())
+    scores = [item['popularity'] for item in dicts
+              if isinstance(item.get('popularity'), (int, float))]
+    details = []
+    if genres:
+        details.append('genres: ' + ', '.join(
+            _shorten(genre, config['max_name_chars'])
+            for genre, _ in genres.most_common(config['max_genres'])))
+    if scores:
+        details.append('mostly ' + popularity_bucket(sum(scores) / len(scores)))
+    return f"{names} ({'; '.join(details)})" if details else names
+
+
+def build_prompt(template, *subjects):
+    """
+    Fills a prompt template with rendered subjects, cutting the subjects so the whole
+    prompt stays within LLM_PROMPT['max_tokens'] estimated tokens.
+
+    Parameters:
+        - template: the prompt with one {} per subject
+        - subjects: what the prompt is about (see render_subject)
+    """
+    fixed = estimate_tokens(template.format(*([''] * len(subjects))))
+    budget = max(get_prompt_config()['max_tokens'] - fixed, len(subjects)) // len(subjects)
+    return template.format(*(truncate_to_tokens(render_subject(subject), budget)
+                             for subject in subjects))
+
+
+def description_prompt(favorite_artists):
+    """
+    Builds the user prompt asking how fans of the given artists act, think, and dress.
+    """
+    return build_prompt("Describe how someone who listens to artists like {} tends to act, "
+                        "think, and dress.", favorite_artists)
+
+
+def quirky_prompt(favorite_artists):
+    """
+    Builds the user prompt roasting someone who listens to obscure artists to stand out.
+    """
+    return build_prompt("Describe how someone who only listens to artists like {} just to "
+                        "be quirky and stand out from the crowd tends to act, think, and "
+                        "dress.", favorite_artists)
+
+
+def comparison_prompt(artist_1, artist_2):
+    """
+    Builds the user prompt comparing two artists.
+    """
+    return build_prompt("Compare {} and {} in a funny and way that roasts both. Highlight "
+                        "their differences in style, fanbase, and anything else that makes "
+                        "them opposites.", artist_1, artist_2)
@@ -0,0 +1,202 @@
+"""
+Client-side rate limiting for the Spotify Web API.
+
+Spotify enforces one rolling rate limit for the whole app, so the budget is kept in the
+Django cache where every worker sees it (set REDIS_URL to share it through Redis
+in production; the default local-memory cache only covers one process).
+
+Two mechanisms slow requests down before Spotify has to:
+    - a token bucket that hands out SPOTIFY_RATE_LIMIT['requests'] tokens per
+      SPOTIFY_RATE_LIMIT['window'] seconds, refilled at the start of every window
+    - a shared cooldown set from the Retry-After header of a 429 response, during which
+      no worker sends anything
+
+Callers that would have to wait longer than SPOTIFY_RATE_LIMIT['max_wait'] seconds get a
+SpotifyRateLimitError instead, so requests fail fast rather than hanging.
+
+Time spent waiting is counted in the cache and reported by get_throttle_stats().
+
+The async path (await_slot, arecord_rate_limited) runs the cache calls in a worker thread,
+so a networked cache backend never blocks the event loop. The cache's own async API is not
+used: its aincr() is a get followed by a set, which would let workers take the same token.
+"""
+
+import asyncio
+import math
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_RATE_LIMIT = {
+    'requests': 100,
+    'window': 30,
+    'max_retries': 3,
+    'max_wait': 10,
+}
+
+CACHE_PREFIX = 'spotify_rate'
+BLOCKED_UNTIL_KEY = f'{CACHE_PREFIX}:blocked_until'
+THROTTLED_MS_KEY = f'{CACHE_PREFIX}:throttled_ms'
+THROTTLED_WAITS_KEY = f'{CACHE_PREFIX}:throttled_waits'
+RATE_LIMITED_KEY = f'{CACHE_PREFIX}:rate_limited_responses'
+
+
+class SpotifyRateLimitError(Exception):
+    """
+    Raised when Spotify keeps answering 429, or when waiting for the rate limit
+    would take longer than the configured maximum.
+
+    Attributes:
+        retry_after: seconds after which a new attempt is likely to succeed
+    """
+    def __init__(self, retry_after):
+        super().__init__(f"Spotify rate limit reached, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def get_rate_limit_config():
+    """
+    Returns SPOTIFY_RATE_LIMIT from settings with missing keys filled from the defaults.
+    """
+    return {**DEFAULT_RATE_LIMIT, **getattr(settings, 'SPOTIFY_RATE_LIMIT', {})}
+
+
+def _incr(key, delta=1):
+    """
+    Atomically increments a counter in the cache, creating it if needed.
+    """
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def reserve_slot(now=None):
+    """
+    Takes one token from the shared bucket.
+
+    Parameters:
+        - now: current time in seconds (defaults to time.time())
+
+    Returns:
+        0 if the request may be sent right away, otherwise the number of seconds
+        to wait before trying again.
+    """
+    now = time.time() if now is None else now
+    blocked_until = cache.get(BLOCKED_UNTIL_KEY)
+    if blocked_until and blocked_until > now:
+        return blocked_until - now
+
+    config = get_rate_limit_config()
+    window = config['window']
+    window_index = int(now // window)
+    key = f'{CACHE_PREFIX}:window:{window_index}'
+    cache.add(key, 0, timeout=window * 2)
+    try:
+        used = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=window * 2)
+        used = 1
+
+    if used <= config['requests']:
+        return 0
+    return (window_index + 1) * window - now
+
+
+def retry_after_seconds(response, attempt):
+    """
+    Returns how long to back off after a 429: the Retry-After header when Spotify
+    sends one, otherwise exponential backoff based on the attempt number.
+    """
+    retry_after = response.headers.get('Retry-After')
+    try:
+        return max(float(retry_after), 0)
+    except (TypeError, ValueError):
+        return float(2 ** attempt)
+
+
+def record_rate_limited(retry_after):
+    """
+    Records a 429 response and pauses every worker until Retry-After has passed.
+    """
+    _incr(RATE_LIMITED_KEY)
+    blocked_until = time.time() + retry_after
+    if (cache.get(BLOCKED_UNTIL_KEY) or 0) < blocked_until:
+        cache.set(BLOCKED_UNTIL_KEY, blocked_until, timeout=math.ceil(retry_after) + 1)
+
+
+async def arecord_rate_limited(retry_after):
+    """
+    Async version of record_rate_limited().
+    """
+    await sync_to_async(record_rate_limited, thread_sensitive=False)(retry_after)
+
+
+def record_throttle(seconds):
+    """
+    Adds time spent waiting for the rate limit to the shared metrics.
+    """
+    _incr(THROTTLED_MS_KEY, int(seconds * 1000))
+    _incr(THROTTLED_WAITS_KEY)
+
+
+def get_throttle_stats():
+    """
+    Returns the rate-limit metrics collected so far.
+
+    Returns:
+        Dictionary with the total seconds spent waiting, the number of requests that had
+        to wait, and the number of 429 responses received from Spotify.
+    """
+    return {
+        'throttled_seconds': (cache.get(THROTTLED_MS_KEY) or 0) / 1000,
+        'throttled_waits': cache.get(THROTTLED_WAITS_KEY) or 0,
+        'rate_limited_responses': cache.get(RATE_LIMITED_KEY) or 0,
+    }
+
+
+def wait_for_slot():
+    """
+    Blocks until the shared bucket allows another request.
+
+    Raises:
+        SpotifyRateLimitError if the total wait would exceed the configured maximum
+    """
+    max_wait = get_rate_limit_config()['max_wait']
+    waited = 0
+    try:
+        while True:
+            delay = reserve_slot()
+            if delay <= 0:
+                return
+            if waited + delay > max_wait:
+                raise SpotifyRateLimitError(delay)
+            time.sleep(delay)
+            waited += delay
+    finally:
+        if waited:
+            record_throttle(waited)
+
+
+async def await_slot():
+    """
+    Async version of wait_for_slot() that sleeps without blocking the event loop.
+    """
+    max_wait = get_rate_limit_config()['max_wait']
+    waited = 0
+    try:
+        while True:
+            delay = await sync_to_async(reserve_slot, thread_sensitive=False)()
+            if delay <= 0:
+                return
+            if waited + delay > max_wait:
+                raise SpotifyRateLimitError(delay)
+            await asyncio.sleep(delay)
+            waited += delay
+    finally:
+        if waited:
+            await sync_to_async(record_throttle, thread_sensitive=False)(waited)
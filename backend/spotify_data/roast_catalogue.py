@@ -0,0 +1,130 @@
+"""
+Catalogue of roasts of popular artists and tracks, generated ahead of time.
+
+The roast of an artist (or track) on a slide does not depend on who is looking at it, and
+the same few hundred popular artists show up in most wraps. manage.py warm_roast_catalogue
+ranks artists and tracks by how often they appear in SpotifyUser favorites and generates
+the roasts of the top ones offline, with bounded concurrency, into the RoastCatalogue
+table. Slide generation (see slides.py) reads the catalogue before calling the LLM, so
+slides of popular artists never wait for it.
+
+Catalogued roasts are generated with the same prompt as the slide item they replace
+(create_groq_description of the artist name, or of 'Song by Artist' for tracks).
+"""
+
+import asyncio
+from collections import Counter
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.db.models import Q
+from .async_utils import acreate_groq_description
+from .llm_hedging import primary_model
+from .prompts import item_name
+from .roast_templates import description_roast
+from .utils import llm_concurrency
+
+# Favorites fields of SpotifyUser ranked for each kind of catalogued roast
+RANKED_FIELDS = {
+    'artist': ('favorite_artists_short', 'favorite_artists_medium', 'favorite_artists_long'),
+    'track': ('favorite_tracks_short', 'favorite_tracks_medium', 'favorite_tracks_long'),
+}
+
+
+def _catalogue_model():
+    """
+    Returns the RoastCatalogue model (looked up lazily, since models.py imports utils.py).
+    """
+    return apps.get_model('spotify_data', 'RoastCatalogue')
+
+
+async def aget_catalogued_roasts(keys):
+    """
+    Returns the catalogued roasts of the given artists and tracks.
+
+    Parameters:
+        - keys: iterable of (kind, spotify_id) tuples, kind being 'artist' or 'track'
+
+    Returns:
+        Dictionary mapping each catalogued (kind, spotify_id) to its roast
+    """
+    ids = {}
+    for kind, spotify_id in keys:
+        ids.setdefault(kind, set()).add(spotify_id)
+    if not ids:
+        return {}
+    query = Q()
+    for kind, spotify_ids in ids.items():
+        query |= Q(kind=kind, spotify_id__in=spotify_ids)
+    rows = _catalogue_model().objects.filter(query)  # pylint: disable=no-member
+    return {(row['kind'], row['spotify_id']): row['text']
+            async for row in rows.values('kind', 'spotify_id', 'text')}
+
+
+def rank_subjects(kind, top):
+    """
+    Ranks artists or tracks by how often they appear in users' favorites over all terms.
+
+    Parameters:
+        - kind: 'artist' or 'track'
+        - top: how many to return
+
+    Returns:
+        List of (spotify_id, name, appearances) tuples, most frequent first
+    """
+    spotify_user = apps.get_model('spotify_data', 'SpotifyUser')
+    counts = Counter()
+    names = {}
+    rows = spotify_user.objects.values_list(*RANKED_FIELDS[kind])  # pylint: disable=no-member
+    for favorites in rows.iterator(chunk_size=200):
+        for items in favorites:
+            for item in items or ():
+                if isinstance(item, dict) and item.get('id'):
+                    counts[item['id']] += 1
+                    names.setdefault(item['id'], item_name(item))
+    return [(spotify_id, names[spotify_id], appearances)
+            for spotify_id, appearances in counts.most_common(top)]
+
+
+async def awarm_catalogue(groq_api_key, kind, top, concurrency=None, refresh=False):
+    """
+    Generates and stores the roasts of the top artists or tracks.
+
+    Parameters:
+        - groq_api_key: API key for Groq
+        - kind: 'artist' or 'track'
+        - top: how many of the most frequent ones to catalogue
+        - concurrency: the most LLM calls in flight at once (defaults to LLM_CONCURRENCY)
+        - refresh: regenerate roasts that are already catalogued
+
+    Returns:
+        Dictionary with how many were ranked, already catalogued, generated and failed
+        (failed roasts are left out, so the next run retries them)
+    """
+    ranked = await sync_to_async(rank_subjects)(kind, top)
+    model = _catalogue_model()
+    existing = set()
+    if not refresh:
+        catalogued = model.objects.filter(  # pylint: disable=no-member
+            kind=kind, spotify_id__in=[spotify_id for spotify_id, _, _ in ranked])
+        existing = {spotify_id async for spotify_id
+                    in catalogued.values_list('spotify_id', flat=True)}
+    pending = [subject for subject in ranked if subject[0] not in existing]
+
+    semaphore = asyncio.Semaphore(concurrency or llm_concurrency())
+
+    async def generate(name):
+        async with semaphore:
+            return await acreate_groq_description(groq_api_key, name)
+
+    texts = await asyncio.gather(*(generate(name) for _, name, _ in pending))
+    llm_model = primary_model()['model']
+    rows = [model(kind=kind, spotify_id=spotify_id, name=name, text=text,
+                  appearances=appearances, model=llm_model)
+            for (spotify_id, name, appearances), text in zip(pending, texts)
+            if text and text != description_roast(name)]
+    if rows:
+        await model.objects.abulk_create(  # pylint: disable=no-member
+            rows, update_conflicts=True, unique_fields=['kind', 'spotify_id'],
+            update_fields=['name', 'text', 'appearances', 'model', 'created_at'])
+    return {'ranked': len(ranked), 'catalogued': len(existing), 'generated': len(rows),
+            'failed': len(pending) - len(rows)}
@@ -0,0 +1,141 @@
+"""
+Deterministic roasts built from templates, served instead of LLM text when Groq is failing,
+too slow, or cut off by the circuit breaker (see spotify_data/llm_breaker.py).
+
+They only use the data we already have (artist names, genres and popularity), cost
+nothing to build, and always give the same roast for the same subject, so a slide reads
+the same on every reload.
+"""
+
+import zlib
+
+DESCRIPTION_TEMPLATES = (
+    "You listen to {names}, which explains the vintage jacket you wear indoors "
+    "and the opinions nobody asked for.",
+    "Someone who plays {names} on repeat owns at least one candle named after a feeling "
+    "and tells everyone about it.",
+    "{names}? You definitely cry in the car, then act surprised when someone notices.",
+    "Fans of {names} dress like a mood board and think skipping a song is a personality "
+    "flaw.",
+)
+QUIRKY_TEMPLATES = (
+    "You only listen to {names} so you can say you heard them first. Nobody asked, "
+    "and nobody will.",
+    "{names}: the musical equivalent of ordering oat milk just to mention it.",
+    "Listening to {names} to stand out is bold for someone whose playlist is mostly skips.",
+)
+COMPARISON_TEMPLATES = (
+    "{first} and {second} share a fanbase the way cats and cucumbers share a kitchen.",
+    "Putting {first} next to {second} is like pairing socks with sandals: technically "
+    "allowed, spiritually wrong.",
+    "{first} fans think {second} fans are posers, and {second} fans have not noticed "
+    "{first} exists.",
+)
+POPULARITY_REMARKS = (
+    (70, " Also, your taste is about as underground as a billboard."),
+    (40, " Mainstream enough for the radio, obscure enough to be smug about it."),
+    (0, " Your artists have fewer monthly listeners than your group chat."),
+)
+
+
+def _name(item):
+    return item.get('name', '') if isinstance(item, dict) else str(item)
+
+
+def _names(subject):
+    """
+    Returns the names in a subject: a string, an artist dictionary, or a list of either.
+    """
+    if isinstance(subject, (list, tuple)):
+        return [_name(item) for item in subject]
+    return [_name(subject)]
+
+
+def _popularity(subject):
+    """
+    Returns the average popularity of the artists in a subject, or None if it is unknown.
+    """
+    items = subject if isinstance(subject, (list, tuple)) else [subject]
+    scores = [item['popularity'] for item in items
+              if isinstance(item, dict) and isinstance(item.get('popularity'), (int, float))]
+    return sum(scores) / len(scores) if scores else None
+
+
+def _genre(subject):
+    """
+    Returns the first genre of the artists in a subject, or None if there is none.
+    """
+    items = subject if isinstance(subject, (list, tuple)) else [subject]
+    for item in items:
+        if isinstance(item, dict) and item.get('genres'):
+            return item['genres'][0]
+    return None
+
+
+def _pick(templates, seed):
+    """
+    Picks a template deterministically from a seed string.
+    """
+    return templates[zlib.crc32(seed.encode()) % len(templates)]
+
+
+def _remarks(subject):
+    """
+    Returns the popularity and genre remarks appended to a roast, if the data is there.
+    """
+    remarks = ''
+    popularity = _popularity(subject)
+    if popularity is not None:
+        remarks += next(remark for threshold, remark in POPULARITY_REMARKS
+                        if popularity >= threshold)
+    genre = _genre(subject)
+    if genre:
+        remarks += f" And {genre}? Of course it is."
+    return remarks
+
+
+def description_roast(subject):
+    """
+    Returns a template roast of someone who listens to the given artists (or tracks, genres).
+    """
+    names = ', '.join(_names(subject))
+    return _pick(DESCRIPTION_TEMPLATES, names).format(names=names) + _remarks(subject)
+
+
+def quirky_roast(subject):
+    """
+    Returns a template roast of someone who listens to obscure artists to stand out.
+    """
+    names = ', '.join(_names(subject))
+    return _pick(QUIRKY_TEMPLATES, names).format(names=names) + _remarks(subject)
+
+
+def comparison_roast(first, second):
+    """
+    Returns a template roast comparing two artists (or tracks).
+    """
+    first_name, second_name = _name(first), _name(second)
+    roast = _pick(COMPARISON_TEMPLATES, first_name + second_name).format(
+        first=first_name, second=second_name)
+    first_popularity, second_popularity = _popularity(first), _popularity(second)
+    if first_popularity is not None and second_popularity is not None \
+            and first_popularity != second_popularity:
+        bigger, smaller = ((first_name, second_name) if first_popularity > second_popularity
+                           else (second_name, first_name))
+        roast += f" {bigger} at least has fans; {smaller} has a cousin with a Spotify account."
+    return roast
+
+
+def template_roast(function, args):
+    """
+    Returns the template roast standing in for one generated text.
+
+    Parameters:
+        - function: 'description', 'quirky' or 'comparison'
+        - args: the prompt arguments of that text, e.g. (artist_1, artist_2)
+    """
+    if function == 'comparison':
+        return comparison_roast(*args)
+    if function == 'quirky':
+        return quirky_roast(*args)
+    return description_roast(*args)
@@ -0,0 +1,255 @@
+"""
+Generation stage for the texts shown on a wrap's slides.
+
+A wrap's artists, tracks, genres and quirkiest artists never change once the wrap is
+created, so every LLM text its slides show is generated once, while the wrap is created,
+and stored in WrapSlides. The display views then only read them.
+
+Roasts of popular artists and tracks are read from the roast catalogue (see
+roast_catalogue.py). All other texts of a wrap are requested in one batched LLM call
+returning JSON, and only the texts missing from its reply are generated with one call
+each. Slides are grouped in sections:
+    - artists: one text per top artist (in duo wraps, a comparison with the next artist)
+    - tracks: one text per top track (in duo wraps, a comparison with the next track)
+    - genres: one description of the top genres
+    - quirky: one roast of the quirkiest artists
+
+Wraps created before WrapSlides existed have no stored texts; each section is generated
+the first time it is displayed and stored from then on. A section where any call missed
+the deadline is shown with template roasts (see roast_templates.py) but not stored, so it
+is retried next time.
+Single-text sections can also be streamed as they are generated (see astream_slide).
+"""
+
+import asyncio
+import os
+from groq import GroqError
+from .async_utils import (agenerate_all, acreate_groq_batch, acreate_groq_description,
+                          acreate_groq_quirky, acreate_groq_comparison,
+                          astream_groq_description, astream_groq_quirky)
+from .models import WrapSlides
+from .roast_catalogue import aget_catalogued_roasts
+from .roast_templates import template_roast
+from .utils import llm_deadline
+
+SLIDE_SECTIONS = ('artists', 'tracks', 'genres', 'quirky')
+SLIDE_ITEMS = 5  # items shown on the artists, tracks, genres and quirky slides
+STREAMED_SECTIONS = ('genres', 'quirky')  # sections made of a single text
+# Sections whose items can come from the roast catalogue: (kind, field of the subjects)
+CATALOGUED_SECTIONS = {'artists': ('artist', 'favorite_artists'),
+                       'tracks': ('track', 'favorite_tracks')}
+
+
+def track_title(track):
+    """
+    Returns how a track is named in prompts, e.g. 'Song by Artist'.
+    """
+    return track['name'] + ' by ' + track['artists'][0]['name']
+
+
+def _pair_items(subjects, prompt_args, is_duo):
+    """
+    Builds one item per subject: in duo wraps, subjects with a next subject are compared
+    with it, the others are described.
+    """
+    items = []
+    for i, subject in enumerate(subjects):
+        if is_duo and i + 1 < len(subjects):
+            # Compare with the next item instead of describing this one
+            items.append(('comparison', (prompt_args[i], prompt_args[i + 1])))
+        else:
+            items.append(('description', (subject,)))
+    return items
+
+
+def slide_items(wrapped_data, section, is_duo):
+    """
+    Lists the texts to generate for one slide section.
+
+    Parameters:
+        - wrapped_data: the stored fields of the wrap
+        - section: one of SLIDE_SECTIONS
+        - is_duo: True for a DuoWrapped
+
+    Returns:
+        List of (function, args) tuples, where function is 'description', 'quirky' or
+        'comparison' and args are its prompt arguments
+    """
+    if section == 'artists':
+        artists = wrapped_data['favorite_artists'][:SLIDE_ITEMS]
+        compared = [{'name': artist['name'], 'popularity': artist.get('popularity', 0)}
+                    for artist in artists]
+        return _pair_items([artist['name'] for artist in artists], compared, is_duo)
+    if section == 'tracks':
+        titles = [track_title(track) for track in wrapped_data['favorite_tracks'][:SLIDE_ITEMS]]
+        return _pair_items(titles, titles, is_duo)
+    if section == 'genres':
+        genres = ', '.join(wrapped_data['favorite_genres'][:SLIDE_ITEMS])
+        return [('description', (genres,))]
+    names = ', '.join(artist['name']
+                      for artist in wrapped_data['quirkiest_artists'][:SLIDE_ITEMS])
+    return [('quirky', (names,))]
+
+
+def _item_job(groq_api_key, function, args):
+    """
+    Returns the coroutine generating one item on its own.
+    """
+    if function == 'comparison':
+        return acreate_groq_comparison(groq_api_key, *args)
+    if function == 'quirky':
+        return acreate_groq_quirky(groq_api_key, *args)
+    return acreate_groq_description(groq_api_key, *args)
+
+
+async def _abatch(groq_api_key, items, timeout):
+    """
+    Generates items with one batched request, returning {} if it fails or takes longer
+    than timeout seconds.
+    """
+    if not items:
+        return {}
+    try:
+        return await asyncio.wait_for(acreate_groq_batch(groq_api_key, items),
+                                      timeout=timeout)
+    except (asyncio.TimeoutError, GroqError) as e:
+        print(f"Batched generation skipped: {e!r}")
+        return {}
+
+
+def _catalogue_key(wrapped_data, key, item):
+    """
+    Returns the (kind, spotify_id) of the catalogued roast that can stand in for a slide
+    item, or None if it cannot come from the catalogue.
+    """
+    section, index = key.rsplit('_', 1)
+    if item[0] != 'description' or section not in CATALOGUED_SECTIONS:
+        return None
+    kind, field = CATALOGUED_SECTIONS[section]
+    subject = wrapped_data[field][int(index)]
+    return (kind, subject['id']) if subject.get('id') else None
+
+
+async def _acatalogued(wrapped_data, items):
+    """
+    Returns the texts of the items found in the roast catalogue.
+    """
+    keys = {key: _catalogue_key(wrapped_data, key, item) for key, item in items.items()}
+    keys = {key: catalogue_key for key, catalogue_key in keys.items() if catalogue_key}
+    if not keys:
+        return {}
+    roasts = await aget_catalogued_roasts(keys.values())
+    return {key: roasts[catalogue_key] for key, catalogue_key in keys.items()
+            if catalogue_key in roasts}
+
+
+async def agenerate_slides(wrapped_data, is_duo, sections=SLIDE_SECTIONS):
+    """
+    Generates the texts of the given slide sections.
+
+    Artists and tracks described on their own are first read from the roast catalogue
+    (see roast_catalogue.py). Every other text is requested in one batched call (see
+    acreate_groq_batch); the ones missing from its reply are then generated one by one,
+    concurrently. All of it shares one LLM_DEADLINE, so the calls made one by one only
+    get the time the batched call left.
+
+    Returns:
+        Tuple of (slides, complete) where slides maps each section to its texts (a list
+        for artists and tracks, a string otherwise) and complete is the set of sections
+        where no text is a template roast
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + llm_deadline()
+    groq_api_key = os.getenv('GROQ_API_KEY')
+    items = {}
+    fallbacks = {}
+    keys = {}
+    for section in sections:
+        keys[section] = []
+        for i, (function, args) in enumerate(slide_items(wrapped_data, section, is_duo)):
+            key = f'{section}_{i}'
+            items[key] = (function, args)
+            fallbacks[key] = template_roast(function, args)
+            keys[section].append(key)
+
+    texts = await _acatalogued(wrapped_data, items)
+    texts.update(await _abatch(groq_api_key, {key: item for key, item in items.items()
+                                              if key not in texts},
+                               max(deadline - loop.time(), 0)))
+    missing = [key for key in items if key not in texts]
+    results = await agenerate_all([_item_job(groq_api_key, *items[key]) for key in missing],
+                                  [fallbacks[key] for key in missing],
+                                  deadline=max(deadline - loop.time(), 0))
+    texts.update(zip(missing, results))
+
+    slides = {}
+    complete = set()
+    for section in sections:
+        section_texts = [texts[key] for key in keys[section]]
+        slides[section] = (section_texts if section in ('artists', 'tracks')
+                           else section_texts[0])
+        if not any(texts[key] == fallbacks[key] for key in keys[section]):
+            complete.add(section)
+    return slides, complete
+
+
+async def astore_slides(wrap_id, is_duo, slides):
+    """
+    Stores generated slide texts of a wrap, keeping its other sections.
+    """
+    await WrapSlides.objects.aupdate_or_create(  # pylint: disable=no-member
+        wrap_id=wrap_id, is_duo=is_duo, defaults=slides)
+
+
+async def aget_slide(wrapped_data, is_duo, section):
+    """
+    Returns the texts of one slide section, generating and storing them if the wrap
+    has none yet.
+
+    Parameters:
+        - wrapped_data: the stored fields of the wrap, including its id
+        - is_duo: True for a DuoWrapped
+        - section: one of SLIDE_SECTIONS
+    """
+    stored = await WrapSlides.objects.filter(  # pylint: disable=no-member
+        wrap_id=wrapped_data.get('id'), is_duo=is_duo).values(section).afirst()
+    if stored is not None and stored[section] is not None:
+        return stored[section]
+    slides, complete = await agenerate_slides(wrapped_data, is_duo, (section,))
+    if section in complete and wrapped_data.get('id') is not None:
+        await astore_slides(wrapped_data['id'], is_duo, {section: slides[section]})
+    return slides[section]
+
+
+async def astream_slide(wrapped_data, is_duo, section):
+    """
+    Yields the text of a single-text slide section as it is generated, so the first words
+    show up before the whole text is ready. Stored texts are yielded in one piece, and a
+    completed stream is stored like a generated section.
+
+    Parameters:
+        - wrapped_data: the stored fields of the wrap, including its id
+        - is_duo: True for a DuoWrapped
+        - section: one of STREAMED_SECTIONS
+    """
+    stored = await WrapSlides.objects.filter(  # pylint: disable=no-member
+        wrap_id=wrapped_data.get('id'), is_duo=is_duo).values(section).afirst()
+    if stored is not None and stored[section] is not None:
+        yield stored[section]
+        return
+
+    function, args = slide_items(wrapped_data, section, is_duo)[0]
+    stream = astream_groq_quirky if function == 'quirky' else astream_groq_description
+    parts = []
+    try:
+        async for content in stream(os.getenv('GROQ_API_KEY'), *args):
+            parts.append(content)
+            yield content
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        print(f"Streaming {section} slide failed: {e}")
+        if not parts:
+            yield template_roast(function, args)
+        return
+    text = ''.join(parts)
+    if text and text != template_roast(function, args) and wrapped_data.get('id') is not None:
+        await astore_slides(wrapped_data['id'], is_duo, {section: text})
@@ -0,0 +1,335 @@
+"""
+Local stand-in for the Spotify Web API and accounts service, for load and integration testing.
+
+Serves the endpoints the backend calls:
+    - GET  /v1/me
+    - GET  /v1/me/top/tracks and /v1/me/top/artists (paged with limit/offset like Spotify)
+    - GET  /v1/artists?ids= (up to 50 ids)
+    - GET  /v1/recommendations
+    - POST /api/token (authorization_code and refresh_token grants)
+    - GET  /authorize (redirects straight back to redirect_uri with a code)
+
+Every bearer token maps onto one of `users` synthetic users, and each user gets a
+deterministic set of top tracks and artists per term, so repeated runs see the same data.
+Responses can be delayed by a latency distribution, and a share of them can be answered
+with 429 and a Retry-After header to exercise the client's rate limiting.
+
+Built on the standard library's ThreadingHTTPServer so it needs no extra dependencies.
+Run it with `manage.py run_spotify_standin` and point SPOTIFY_API_BASE_URL and
+SPOTIFY_ACCOUNTS_BASE_URL at it.
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+GENRES = ('pop', 'rock', 'hip hop', 'indie', 'jazz', 'metal', 'folk', 'r&b', 'edm',
+          'country', 'k-pop', 'shoegaze', 'hyperpop', 'bossa nova', 'emo')
+TERMS = ('short_term', 'medium_term', 'long_term')
+TOP_ITEMS_TOTAL = 100  # items available per term, like Spotify's top-items cap
+
+
+def parse_latency(spec):
+    """
+    Parses a latency distribution in milliseconds into a function returning seconds.
+
+    Parameters:
+        - spec: 'fixed:MS', 'uniform:MIN:MAX', 'normal:MEAN:STDDEV'
+                or 'lognormal:MEDIAN:SIGMA'
+
+    Returns:
+        Function taking a random.Random and returning a delay in seconds
+    """
+    name, *args = spec.split(':')
+    try:
+        args = [float(arg) for arg in args]
+        distributions = {
+            'fixed': lambda rng: args[0],
+            'uniform': lambda rng: rng.uniform(args[0], args[1]),
+            'normal': lambda rng: rng.gauss(args[0], args[1]),
+            'lognormal': lambda rng: args[0] * rng.lognormvariate(0, args[1]),
+        }
+        sample = distributions[name]
+        sample(random.Random())
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Invalid latency distribution: {spec}") from e
+    return lambda rng: max(sample(rng), 0) / 1000
+
+
+@dataclass
+class StandinConfig:
+    """
+    Behaviour of the stand-in server.
+
+    Attributes:
+        - users: number of synthetic users that tokens are spread over
+        - latency: latency distribution of every response (see parse_latency)
+        - rate_limit_ratio: share of requests answered with 429, between 0 and 1
+        - retry_after: Retry-After seconds sent with injected 429 responses
+        - seed: seed of the latency and 429 randomness
+    """
+    users: int = 100
+    latency: str = 'fixed:0'
+    rate_limit_ratio: float = 0.0
+    retry_after: int = 1
+    seed: int = 0
+    _rng: random.Random = field(init=False, repr=False)
+    _rng_lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self.sample_latency = parse_latency(self.latency)
+
+    def delay(self):
+        """
+        Returns how long the next response should be delayed, in seconds.
+        """
+        with self._rng_lock:
+            return self.sample_latency(self._rng)
+
+    def should_rate_limit(self):
+        """
+        Returns True if the next response should be an injected 429.
+        """
+        with self._rng_lock:
+            return self._rng.random() < self.rate_limit_ratio
+
+
+def user_index(token, users):
+    """
+    Maps a bearer token onto a synthetic user, stable across runs.
+    """
+    return zlib.crc32(token.encode()) % users
+
+
+def synthetic_user(index):
+    """
+    Returns the /v1/me profile of synthetic user number index.
+    """
+    return {
+        'id': f'standin_user_{index}',
+        'display_name': f'Stand-in User {index}',
+        'email': f'standin_user_{index}@example.com',
+        'images': [{'url': f'https://picsum.photos/seed/user{index}/300', 'height': 300,
+                    'width': 300}],
+        'country': 'US',
+        'product': 'premium',
+        'type': 'user',
+    }
+
+
+def synthetic_artist(artist_id, rng):
+    """
+    Returns a Spotify-shaped artist object.
+    """
+    return {
+        'id': f'artist_{artist_id}',
+        'name': f'Artist {artist_id}',
+        'popularity': rng.randint(0, 100),
+        'genres': rng.sample(GENRES, rng.randint(1, 3)),
+        'images': [{'url': f'https://picsum.photos/seed/artist{artist_id}/{size}',
+                    'height': size, 'width': size} for size in (640, 320, 160)],
+        'external_urls': {'spotify': f'https://open.spotify.com/artist/artist_{artist_id}'},
+        'followers': {'href': None, 'total': rng.randint(0, 10 ** 7)},
+        'type': 'artist',
+        'uri': f'spotify:artist:artist_{artist_id}',
+    }
+
+
+def synthetic_track(track_id, rng):
+    """
+    Returns a Spotify-shaped track object, including the bulky fields Spotify sends.
+    """
+    artist = synthetic_artist(rng.randint(0, 999), rng)
+    return {
+        'id': f'track_{track_id}',
+        'name': f'Track {track_id}',
+        'popularity': rng.randint(0, 100),
+        'duration_ms': rng.randint(90, 400) * 1000,
+        'artists': [{key: artist[key] for key in ('id', 'name', 'external_urls', 'uri')}],
+        'album': {
+            'id': f'album_{track_id}',
+            'name': f'Album {track_id}',
+            'release_date': '2024-01-01',
+            'images': [{'url': f'https://picsum.photos/seed/album{track_id}/{size}',
+                        'height': size, 'width': size} for size in (640, 300, 64)],
+            'available_markets': ['US', 'GB', 'DE', 'FR', 'JP'],
+        },
+        'available_markets': ['US', 'GB', 'DE', 'FR', 'JP'],
+        'external_urls': {'spotify': f'https://open.spotify.com/track/track_{track_id}'},
+        'preview_url': None,
+        'type': 'track',
+        'uri': f'spotify:track:track_{track_id}',
+    }
+
+
+def synthetic_top_items(index, kind, term):
+    """
+    Returns every top track or artist of a synthetic user over a term, in rank order.
+    """
+    rng = random.Random(f'{index}:{kind}:{term}')
+    build = synthetic_track if kind == 'tracks' else synthetic_artist
+    ids = rng.sample(range(10000), TOP_ITEMS_TOTAL)
+    return [build(item_id, random.Random(f'{kind}:{item_id}')) for item_id in ids]
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """
+    Request handler serving the stand-in endpoints. The server's `config` attribute
+    holds the StandinConfig.
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _throttle(self):
+        """
+        Applies the configured latency, then answers 429 if one is injected.
+        Returns True if the request has been answered.
+        """
+        config = self.server.config
+        time.sleep(config.delay())
+        if config.should_rate_limit():
+            self._send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                            {'Retry-After': str(config.retry_after)})
+            return True
+        return False
+
+    def _current_user(self):
+        """
+        Returns the synthetic user index of the bearer token, or None if there is none.
+        """
+        authorization = self.headers.get('Authorization', '')
+        if not authorization.startswith('Bearer ') or not authorization[7:]:
+            return None
+        return user_index(authorization[7:], self.server.config.users)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Serves the Web API endpoints and the authorize redirect.
+        """
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/authorize':
+            code = f'standin-code-{random.getrandbits(32)}'
+            location = f"{query.get('redirect_uri', '/')}?" + urlencode(
+                {'code': code, 'state': query.get('state', '')})
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self._throttle():
+            return
+        index = self._current_user()
+        if index is None:
+            self._send_json(401, {'error': {'status': 401, 'message': 'No token provided'}})
+        elif url.path == '/v1/me':
+            self._send_json(200, synthetic_user(index))
+        elif url.path in ('/v1/me/top/tracks', '/v1/me/top/artists'):
+            self._send_top_items(index, url.path.rsplit('/', 1)[1], query)
+        elif url.path == '/v1/artists':
+            self._send_artists(query.get('ids', ''))
+        elif url.path == '/v1/recommendations':
+            rng = random.Random(url.query)
+            limit = int(query.get('limit', 20))
+            self._send_json(200, {'tracks': [synthetic_track(rng.randint(0, 9999), rng)
+                                             for _ in range(limit)], 'seeds': []})
+        else:
+            self._send_json(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+    def _send_artists(self, ids):
+        ids = [artist_id for artist_id in ids.split(',') if artist_id]
+        if not ids or len(ids) > 50:
+            self._send_json(400, {'error': {'status': 400, 'message': 'Invalid ids'}})
+            return
+        artists = []
+        for artist_id in ids:
+            number = artist_id.removeprefix('artist_')
+            artists.append(synthetic_artist(int(number), random.Random(f'artists:{number}'))
+                           if number.isdigit() else None)
+        self._send_json(200, {'artists': artists})
+
+    def _send_top_items(self, index, kind, query):
+        term = query.get('time_range', 'medium_term')
+        if term not in TERMS:
+            self._send_json(400, {'error': {'status': 400, 'message': 'Invalid time range'}})
+            return
+        limit = min(int(query.get('limit', 20)), 50)
+        offset = int(query.get('offset', 0))
+        items = synthetic_top_items(index, kind, term)
+        next_offset = offset + limit
+        self._send_json(200, {
+            'items': items[offset:next_offset],
+            'total': len(items),
+            'limit': limit,
+            'offset': offset,
+            'next': (f"http://{self.headers.get('Host')}/v1/me/top/{kind}?" + urlencode(
+                {'time_range': term, 'limit': limit, 'offset': next_offset})
+                     if next_offset < len(items) else None),
+            'previous': None,
+        })
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Serves the token endpoint.
+        """
+        length = int(self.headers.get('Content-Length', 0))
+        form = {key: values[0]
+                for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        if urlsplit(self.path).path != '/api/token':
+            self._send_json(404, {'error': 'not_found'})
+            return
+        if self._throttle():
+            return
+        grant_type = form.get('grant_type')
+        if grant_type == 'authorization_code' and form.get('code'):
+            refresh_token = f"standin-refresh-{form['code']}"
+        elif grant_type == 'refresh_token' and form.get('refresh_token'):
+            refresh_token = form['refresh_token']
+        else:
+            self._send_json(400, {'error': 'invalid_grant'})
+            return
+        self._send_json(200, {
+            'access_token': f'standin-access-{refresh_token}-{random.getrandbits(32)}',
+            'token_type': 'Bearer',
+            'expires_in': 3600,
+            'refresh_token': refresh_token,
+            'scope': form.get('scope', ''),
+        })
+
+
+def make_server(host='127.0.0.1', port=8765, config=None, verbose=False):
+    """
+    Creates the stand-in server without starting it.
+
+    Parameters:
+        - host, port: address to listen on (port 0 picks a free port)
+        - config: StandinConfig (defaults to instant responses and no 429s)
+        - verbose: log every request to stderr
+
+    Returns:
+        ThreadingHTTPServer; call serve_forever() to run it
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.config = config or StandinConfig()
+    server.verbose = verbose
+    return server
@@ -0,0 +1,164 @@
+"""Tests for the async Spotify and Groq helpers in spotify_data/async_utils."""
+
+from unittest.mock import patch, Mock, MagicMock, AsyncMock
+import asyncio
+import time
+import pytest
+import httpx
+from asgiref.sync import async_to_sync
+from groq import GroqError
+from spotify_data.roast_templates import description_roast
+from spotify_data.llm_breaker import llm_call_timeout
+from spotify_data.async_utils import (aget_spotify_user_data, afetch_user_top_items,
+                                      acreate_groq_description, agenerate_all,
+                                      acreate_groq_batch, astream_groq_quirky)
+
+
+@pytest.mark.parametrize("status_code, expected_result", [
+    (200, {'id': '123', 'display_name': 'Test User'}),
+    (401, None),
+])
+def test_aget_spotify_user_data(status_code, expected_result):
+    """Tests that a user's profile can be retrieved without blocking."""
+    response = Mock(status_code=status_code)
+    response.json.return_value = {'id': '123', 'display_name': 'Test User'}
+    with patch('spotify_data.async_client.get', new_callable=AsyncMock, return_value=response):
+        result = async_to_sync(aget_spotify_user_data)('valid_token')
+    assert result == expected_result
+
+
+def test_afetch_user_top_items_partial_failure():
+    """Tests that a failed request is reported against its own term only."""
+    async def fake_get(url, params=None, **kwargs):
+        if params['time_range'] == 'long_term' and url.endswith('artists'):
+            raise httpx.ConnectTimeout("timed out")
+        response = Mock(status_code=200)
+        response.json.return_value = {'items': [{'name': params['time_range'], 'genres': ['pop'],
+                                                 'popularity': 1}]}
+        return response
+
+    with patch('spotify_data.async_client.get', side_effect=fake_get):
+        result = async_to_sync(afetch_user_top_items)('valid_token')
+
+    item = {'name': 'short_term', 'genres': ['pop'], 'popularity': 1}
+    track = {'name': 'short_term', 'popularity': 1}  # tracks are projected without genres
+    assert result['short_term'] == {'tracks': [track], 'artists': [item], 'genres': ['pop'],
+                                    'quirkiest': [item], 'errors': []}
+    assert result['long_term']['errors'] == ['artists: timed out']
+    assert result['long_term']['artists'] is None
+
+
+def test_acreate_groq_description_returns_response():
+    """Tests that the async Groq client's answer is returned."""
+    mock_response = MagicMock()
+    mock_response.choices[0].message.content = "Sample description."
+    with patch('spotify_data.llm_hedging.get_async_groq_client') as mock_groq:
+        mock_groq.return_value.chat.completions.create = AsyncMock(return_value=mock_response)
+        result = async_to_sync(acreate_groq_description)("mock_api_key", ["Artist1"])
+    assert result == "Sample description."
+
+
+def test_acreate_groq_description_api_error():
+    """Tests that API errors are turned into a template roast."""
+    with patch('spotify_data.llm_hedging.get_async_groq_client') as mock_groq:
+        mock_groq.return_value.chat.completions.create = AsyncMock(
+            side_effect=Exception("API error"))
+        result = async_to_sync(acreate_groq_description)("mock_api_key", ["Artist1"])
+    assert result == description_roast(["Artist1"])
+
+
+def test_acreate_groq_description_no_api_key():
+    """Tests that GroqError is raised when no API key is provided."""
+    with pytest.raises(GroqError, match="GROQ_API_KEY environment variable is not set."):
+        async_to_sync(acreate_groq_description)("", ["Artist1"])
+
+
+def test_agenerate_all_runs_concurrently_with_bound():
+    """Tests that generations overlap, but never more than max_concurrency at once."""
+    running = []
+    peak = []
+
+    async def generate(text):
+        running.append(text)
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(text)
+        return text
+
+    started = time.monotonic()
+    results = async_to_sync(agenerate_all)([generate(str(i)) for i in range(6)],
+                                           ['fallback'] * 6, max_concurrency=3, deadline=5)
+
+    assert results == [str(i) for i in range(6)]
+    assert max(peak) == 3
+    assert time.monotonic() - started < 0.25
+
+
+def test_agenerate_all_falls_back_per_item_after_deadline():
+    """Tests that only the items still running at the deadline get their fallback."""
+    async def generate(text, delay):
+        await asyncio.sleep(delay)
+        return text
+
+    results = async_to_sync(agenerate_all)(
+        [generate('fast', 0), generate('slow', 5), generate('also fast', 0.01)],
+        ['fallback 1', 'fallback 2', 'fallback 3'], deadline=0.2)
+
+    assert results == ['fast', 'fallback 2', 'also fast']
+
+
+def test_acreate_groq_batch_sends_one_json_request():
+    """Tests that all items are requested at once and malformed answers are left out."""
+    items = {'artists_0': ('description', ('Drake',)),
+             'artists_1': ('comparison', ('Drake', 'Adele')),
+             'quirky_0': ('quirky', ('Björk',))}
+    response = MagicMock()
+    response.choices = [MagicMock(message=MagicMock(
+        content='{"artists_0": "Roast", "artists_1": 42}'))]
+    with patch('spotify_data.llm_hedging.get_async_groq_client') as mock_groq:
+        create = mock_groq.return_value.chat.completions.create
+        create.side_effect = AsyncMock(return_value=response)
+        result = async_to_sync(acreate_groq_batch)('key', items)
+
+    assert result == {'artists_0': "Roast"}
+    create.assert_called_once()
+    assert create.call_args.kwargs['response_format'] == {"type": "json_object"}
+    assert create.call_args.kwargs['timeout'] == llm_call_timeout()
+
+
+def test_acreate_groq_batch_api_error_returns_nothing():
+    """Tests that a failed batch leaves every item to be generated on its own."""
+    with patch('spotify_data.llm_hedging.get_async_groq_client') as mock_groq:
+        mock_groq.return_value.chat.completions.create.side_effect = AsyncMock(
+            side_effect=Exception("rate limited"))
+        result = async_to_sync(acreate_groq_batch)('key', {'a': ('description', ('Drake',))})
+    assert result == {}
+
+
+def _chunk(content):
+    return MagicMock(choices=[MagicMock(delta=MagicMock(content=content))])
+
+
+async def _collect(stream):
+    return [content async for content in stream]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_astream_groq_quirky_streams_then_caches(settings):
+    """Tests that text is yielded as it arrives and the full text is cached afterwards."""
+    settings.LLM_CACHE = {'enabled': True}
+
+    async def chunks():
+        for content in ("You ", None, "listen ", "to noise."):
+            yield _chunk(content)
+
+    with patch('spotify_data.llm_hedging.get_async_groq_client') as mock_groq:
+        create = mock_groq.return_value.chat.completions.create
+        create.side_effect = AsyncMock(side_effect=lambda **kwargs: chunks())
+        first = async_to_sync(_collect)(astream_groq_quirky('key', 'Björk'))
+        second = async_to_sync(_collect)(astream_groq_quirky('key', 'Björk'))
+
+    assert first == ["You ", "listen ", "to noise."]
+    assert second == ["You listen to noise."]
+    create.assert_called_once()
+    assert create.call_args.kwargs['stream'] is True
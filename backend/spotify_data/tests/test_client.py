@@ -0,0 +1,48 @@
+"""Tests for the pooled Spotify HTTP client in spotify_data/client."""
+
+from unittest.mock import patch
+import pytest
+from django.test import override_settings
+from spotify_data import client
+
+
+@pytest.fixture(autouse=True)
+def fresh_sessions():
+    """Makes sure every test starts and ends without cached sessions."""
+    client.close_sessions()
+    yield
+    client.close_sessions()
+
+
+def test_get_session_is_reused_per_host():
+    """Tests that calls to the same host share one session."""
+    first = client.get_session('https://api.spotify.com/v1/me')
+    second = client.get_session('https://api.spotify.com/v1/me/top/tracks')
+    other = client.get_session('https://accounts.spotify.com/api/token')
+
+    assert first is second
+    assert first is not other
+
+
+@override_settings(SPOTIFY_HTTP_POOL_MAXSIZE=7,
+                   SPOTIFY_HTTP_HOST_LIMITS={'accounts.spotify.com': 3})
+def test_get_session_uses_per_host_limits():
+    """Tests that per-host limits override the default pool size."""
+    api_adapter = client.get_session('https://api.spotify.com/v1/me').get_adapter(
+        'https://api.spotify.com/v1/me')
+    accounts_adapter = client.get_session('https://accounts.spotify.com/api/token').get_adapter(
+        'https://accounts.spotify.com/api/token')
+
+    assert api_adapter._pool_maxsize == 7  # pylint: disable=protected-access
+    assert accounts_adapter._pool_maxsize == 3  # pylint: disable=protected-access
+
+
+def test_get_and_post_go_through_shared_session():
+    """Tests that get() and post() forward to the pooled session."""
+    with patch('requests.Session.get') as mock_get, patch('requests.Session.post') as mock_post:
+        client.get('https://api.spotify.com/v1/me', headers={'a': 'b'}, timeout=5)
+        client.post('https://accounts.spotify.com/api/token', data={'c': 'd'}, timeout=10)
+
+    mock_get.assert_called_once_with('https://api.spotify.com/v1/me', headers={'a': 'b'}, timeout=5)
+    mock_post.assert_called_once_with('https://accounts.spotify.com/api/token',
+                                      data={'c': 'd'}, timeout=10)
@@ -0,0 +1,133 @@
+"""Tests for the LLM circuit breaker and the template roasts served while it is open."""
+
+from unittest.mock import patch, MagicMock, AsyncMock
+from asgiref.sync import async_to_sync
+from spotify_data.async_utils import acreate_groq_quirky
+from spotify_data.llm_breaker import (CircuitBreaker, CLOSED, OPEN, HALF_OPEN,
+                                      get_llm_breaker)
+from spotify_data.roast_templates import (description_roast, quirky_roast,
+                                          comparison_roast, template_roast)
+from spotify_data.utils import create_groq_description
+
+
+class FakeClock:
+    """Clock the tests move forward by hand."""
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def _groq_response(content):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    return response
+
+
+def test_breaker_opens_after_threshold():
+    """Tests that the breaker opens after failure_threshold failures in a row."""
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=FakeClock())
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats() == {'state': OPEN, 'failures': 3, 'opened': 1, 'rejected': 1}
+
+
+def test_breaker_success_resets_failures():
+    """Tests that only consecutive failures count towards the threshold."""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    """Tests that after reset_timeout a single probe goes through and decides the state."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_release_frees_the_probe():
+    """Tests that an abandoned probe lets the next call probe instead."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_open_breaker_skips_groq(settings):
+    """Tests that once the breaker opens, Groq is not called and templates are served."""
+    settings.LLM_CIRCUIT_BREAKER = {'failure_threshold': 2}
+    with patch('spotify_data.utils.get_groq_client') as mock_groq:
+        create = mock_groq.return_value.chat.completions.create
+        create.side_effect = Exception("down")
+        for _ in range(3):
+            assert create_groq_description('key', ['Drake']) == description_roast(['Drake'])
+    assert create.call_count == 2
+    assert get_llm_breaker().stats()['rejected'] == 1
+
+
+def test_async_calls_share_the_breaker(settings):
+    """Tests that failures of sync calls also stop async calls."""
+    settings.LLM_CIRCUIT_BREAKER = {'failure_threshold': 1}
+    with patch('spotify_data.utils.get_groq_client') as mock_groq:
+        mock_groq.return_value.chat.completions.create.side_effect = Exception("down")
+        create_groq_description('key', ['Drake'])
+    with patch('spotify_data.llm_hedging.get_async_groq_client') as mock_groq:
+        create = mock_groq.return_value.chat.completions.create = AsyncMock(
+            return_value=_groq_response("Quirky"))
+        result = async_to_sync(acreate_groq_quirky)('key', 'Drake')
+    assert result == quirky_roast('Drake')
+    create.assert_not_called()
+
+
+def test_calls_are_bounded_by_call_timeout(settings):
+    """Tests that every Groq call is given the configured timeout."""
+    settings.LLM_CIRCUIT_BREAKER = {'call_timeout': 2}
+    with patch('spotify_data.utils.get_groq_client') as mock_groq:
+        create = mock_groq.return_value.chat.completions.create
+        create.return_value = _groq_response("Roast")
+        create_groq_description('key', ['Drake'])
+    assert create.call_args.kwargs['timeout'] == 2
+
+
+def test_template_roasts_are_deterministic():
+    """Tests that the same subject always gets the same roast."""
+    artists = [{'name': 'Drake', 'popularity': 95, 'genres': ['rap']}]
+    assert description_roast(artists) == description_roast(artists)
+    assert 'Drake' in description_roast(artists)
+    assert 'billboard' in description_roast(artists)
+    assert 'rap' in description_roast(artists)
+    assert quirky_roast('Nobody') == template_roast('quirky', ('Nobody',))
+
+
+def test_comparison_roast_uses_popularity():
+    """Tests that comparison roasts mention which artist is more popular."""
+    roast = comparison_roast({'name': 'Drake', 'popularity': 95},
+                             {'name': 'Tiny Band', 'popularity': 3})
+    assert 'Drake at least has fans; Tiny Band has a cousin' in roast
+    assert comparison_roast('A', 'B') == template_roast('comparison', ('A', 'B'))
@@ -0,0 +1,116 @@
+"""Tests for the persistent LLM completion cache in spotify_data/llm_cache."""
+
+from datetime import timedelta
+from unittest.mock import patch, MagicMock, AsyncMock
+import pytest
+from asgiref.sync import async_to_sync
+from django.utils import timezone
+from spotify_data.async_utils import acreate_groq_description
+from spotify_data.llm_cache import (completion_key, get_llm_cache_stats, clear_llm_cache,
+                                    prune_completions, astore_completion)
+from spotify_data.models import LLMCompletion
+from spotify_data.roast_templates import comparison_roast
+from spotify_data.utils import create_groq_description, create_groq_comparison
+
+
+@pytest.fixture
+def llm_cache_on(settings, db):
+    """Enables the LLM cache with an empty memory front and stats."""
+    settings.LLM_CACHE = {'enabled': True, 'ttl': 3600, 'memory_entries': 10, 'max_rows': 100}
+    clear_llm_cache()
+
+
+def _groq_response(content):
+    response = MagicMock()
+    response.choices = [MagicMock(message=MagicMock(content=content))]
+    return response
+
+
+def test_completion_key_normalizes_user_prompt():
+    """Tests that case and whitespace in the user prompt do not change the key."""
+    assert (completion_key('model', 'system', 'Artists like  Drake\n')
+            == completion_key('model', 'system', 'artists like drake'))
+    assert completion_key('model', 'system', 'a') != completion_key('other', 'system', 'a')
+    assert completion_key('model', 'system', 'a') != completion_key('model', 'other', 'a')
+
+
+def test_repeated_prompt_skips_groq(llm_cache_on):
+    """Tests that a repeated prompt is answered from memory, then from the table."""
+    with patch('spotify_data.utils.get_groq_client') as mock_groq:
+        mock_groq.return_value.chat.completions.create.return_value = _groq_response("Roast")
+        assert create_groq_description('key', 'Drake, Adele') == "Roast"
+        assert create_groq_description('key', 'drake,  adele') == "Roast"
+        clear_llm_cache(stats=False)  # a new process only has the table
+        assert create_groq_description('key', 'Drake, Adele') == "Roast"
+
+    mock_groq.return_value.chat.completions.create.assert_called_once()
+    assert LLMCompletion.objects.get().function == 'description'  # pylint: disable=no-member
+    stats = get_llm_cache_stats()['description']
+    assert (stats['misses'], stats['memory_hits'], stats['db_hits']) == (1, 1, 1)
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+
+def test_errors_are_not_cached(llm_cache_on):
+    """Tests that a failed call is retried next time instead of being served from the cache."""
+    with patch('spotify_data.utils.get_groq_client') as mock_groq:
+        create = mock_groq.return_value.chat.completions.create
+        create.side_effect = [Exception("down"), _groq_response("Both are bad")]
+        assert create_groq_comparison('key', 'Drake', 'Adele') == comparison_roast('Drake', 'Adele')
+        assert create_groq_comparison('key', 'Drake', 'Adele') == "Both are bad"
+    assert create.call_count == 2
+
+
+def test_expired_completion_is_regenerated(llm_cache_on):
+    """Tests that completions older than the TTL are not served."""
+    key = completion_key('llama3-8b-8192', 'system', 'prompt')
+    LLMCompletion.objects.create(key=key, function='description',  # pylint: disable=no-member
+                                 model='llama3-8b-8192', response="Old")
+    LLMCompletion.objects.filter(key=key).update(  # pylint: disable=no-member
+        created_at=timezone.now() - timedelta(hours=2))
+    with patch('spotify_data.utils.ROAST_SYSTEM_PROMPT', 'system'), \
+            patch('spotify_data.utils.description_prompt', return_value='prompt'), \
+            patch('spotify_data.utils.get_groq_client') as mock_groq:
+        mock_groq.return_value.chat.completions.create.return_value = _groq_response("New")
+        assert create_groq_description('key', 'ignored') == "New"
+    assert LLMCompletion.objects.get(key=key).response == "New"  # pylint: disable=no-member
+
+
+def test_prune_completions_bounds_table(llm_cache_on, settings):
+    """Tests that pruning drops expired rows and the oldest rows beyond max_rows."""
+    settings.LLM_CACHE = {**settings.LLM_CACHE, 'max_rows': 2}
+    now = timezone.now()
+    for age, key in ((7200, 'expired'), (30, 'oldest'), (20, 'older'), (10, 'newest')):
+        LLMCompletion.objects.create(key=key, function='quirky',  # pylint: disable=no-member
+                                     model='m', response=key)
+        LLMCompletion.objects.filter(key=key).update(  # pylint: disable=no-member
+            created_at=now - timedelta(seconds=age))
+    assert prune_completions() == 2
+    assert set(LLMCompletion.objects.values_list('key', flat=True)) == {  # pylint: disable=no-member
+        'older', 'newest'}
+
+
+def test_async_store_bounds_table(llm_cache_on, settings):
+    """Tests that async stores also prune the oldest rows beyond max_rows."""
+    settings.LLM_CACHE = {**settings.LLM_CACHE, 'max_rows': 2}
+    with patch('spotify_data.llm_cache.PRUNE_EVERY', 1):
+        for age, key in ((30, 'oldest'), (20, 'older'), (10, 'newest')):
+            async_to_sync(astore_completion)('quirky', key, 'm', key)
+            LLMCompletion.objects.filter(key=key).update(  # pylint: disable=no-member
+                created_at=timezone.now() - timedelta(seconds=age))
+    assert LLMCompletion.objects.count() == 2  # pylint: disable=no-member
+    assert not LLMCompletion.objects.filter(key='oldest').exists()  # pylint: disable=no-member
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_repeated_prompt_skips_groq(settings):
+    """Tests that the async helpers share the cache."""
+    settings.LLM_CACHE = {'enabled': True}
+    clear_llm_cache()
+    with patch('spotify_data.llm_hedging.get_async_groq_client') as mock_groq:
+        create = mock_groq.return_value.chat.completions.create
+        create.side_effect = AsyncMock(return_value=_groq_response("Roast"))
+        assert async_to_sync(acreate_groq_description)('key', 'Drake') == "Roast"
+        clear_llm_cache(stats=False)
+        assert async_to_sync(acreate_groq_description)('key', 'Drake') == "Roast"
+    create.assert_called_once()
+    assert get_llm_cache_stats()['description']['db_hits'] == 1
@@ -0,0 +1,88 @@
+"""Tests for the shared Groq clients in spotify_data/llm_clients."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from asgiref.sync import async_to_sync
+from spotify_data import llm_clients
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients(settings):
+    """Makes sure every test starts and ends without cached clients of the Groq backend."""
+    settings.LLM_BACKEND = 'groq'
+    llm_clients.close_llm_clients()
+    yield
+    llm_clients.close_llm_clients()
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Answers every GET with an empty JSON object over a keep-alive connection."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answers with an empty JSON object."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+
+@pytest.fixture
+def server_url():
+    """Runs a local keep-alive HTTP server for the duration of a test."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_groq_client_is_reused_per_key():
+    """Tests that calls with the same API key share one client."""
+    first = llm_clients.get_groq_client('key')
+    assert llm_clients.get_groq_client('key') is first
+    assert llm_clients.get_groq_client('other key') is not first
+    assert llm_clients.get_llm_client_stats()['clients_created'] == 2
+
+
+def test_get_groq_client_is_thread_safe():
+    """Tests that threads racing for a new key end up with the same client."""
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(llm_clients.get_groq_client('k')))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(client is clients[0] for client in clients)
+
+
+def test_connections_are_reused(server_url):
+    """Tests that requests after the first reuse the pooled connection and are counted."""
+    http_client = llm_clients.get_groq_client('key')._client  # pylint: disable=protected-access
+    for _ in range(3):
+        assert http_client.get(server_url).status_code == 200
+
+    stats = llm_clients.get_llm_client_stats()
+    assert stats['requests'] == 3
+    assert stats['connections_opened'] == 1
+    assert stats['connections_reused'] == 2
+    assert stats['reuse_rate'] == pytest.approx(2 / 3)
+
+
+def test_async_client_is_reused_within_a_loop(server_url):
+    """Tests that one event loop shares an AsyncGroq client and its connections."""
+    async def requests_in_one_loop():
+        client = llm_clients.get_async_groq_client('key')
+        assert llm_clients.get_async_groq_client('key') is client
+        for _ in range(2):
+            await client._client.get(server_url)  # pylint: disable=protected-access
+
+    async_to_sync(requests_in_one_loop)()
+    stats = llm_clients.get_llm_client_stats()
+    assert (stats['requests'], stats['connections_opened']) == (2, 1)
@@ -0,0 +1,182 @@
+"""Tests for the model registry and hedged LLM calls in spotify_data/llm_hedging."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+from asgiref.sync import async_to_sync
+from spotify_data.async_utils import acreate_groq_description, astream_groq_quirky
+from spotify_data.llm_hedging import (HedgeTracker, _tracker, get_hedging_config,
+                                      get_hedging_stats, get_model, primary_model,
+                                      reset_hedging)
+from spotify_data.models import LLMCall
+from spotify_data.roast_templates import description_roast
+
+pytestmark = pytest.mark.django_db
+
+PRIMARY = 'llama3-8b-8192'
+ALTERNATE = 'llama-3.1-8b-instant'
+
+
+@pytest.fixture(autouse=True)
+def hedging(settings):
+    """Records every call right away and hedges after 20ms."""
+    settings.LLM_METRICS = {'enabled': True, 'flush_every': 1}
+    settings.LLM_HEDGING = {'enabled': True, 'initial_delay': 0.02}
+    reset_hedging()
+    yield
+    reset_hedging()
+
+
+def _slow_primary(settings):
+    settings.LLM_FAKE = {'model_latency': {PRIMARY: 'fixed:500', ALTERNATE: 'fixed:0'}}
+
+
+class RacingCompletions:
+    """Chat completions failing or answering per model, noting cancelled requests."""
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.cancelled = []
+
+    async def create(self, model, **kwargs):  # pylint: disable=unused-argument
+        """Sleeps for the model's delay, then answers or raises its error."""
+        delay, answer = self.behaviour[model]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if isinstance(answer, Exception):
+            raise answer
+        return SimpleNamespace(usage=None, choices=[
+            SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+
+def _racing(behaviour):
+    completions = RacingCompletions(behaviour)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return completions, patch('spotify_data.llm_hedging.get_async_groq_client',
+                              return_value=client)
+
+
+def test_registry(settings):
+    """Tests that models are resolved with their provider's settings."""
+    assert primary_model()['model'] == PRIMARY
+    settings.LLM_PROVIDERS = {'other': {'base_url': 'http://llm.local', 'api_key_env': 'KEY'}}
+    settings.LLM_MODELS = {'mini': {'provider': 'other', 'model': 'mini-1'}}
+    settings.LLM_PRIMARY_MODEL = 'mini'
+    assert primary_model() == {'name': 'mini', 'provider': 'other', 'model': 'mini-1',
+                               'base_url': 'http://llm.local', 'api_key_env': 'KEY'}
+    assert get_model('llama3.1-8b')['model'] == ALTERNATE
+    with pytest.raises(ValueError):
+        get_model('gpt-none')
+
+
+def test_hedge_delay_follows_the_primary_latency():
+    """Tests that the delay is the clamped percentile of the primary's latencies."""
+    config = {**get_hedging_config(), 'min_samples': 5, 'max_delay': 0.8}
+    tracker = HedgeTracker(window=10)
+    for tenth in range(1, 5):
+        tracker.observe(False, 'primary', tenth / 10)
+    assert tracker.delay(config) == config['initial_delay']
+    for tenth in range(5, 11):
+        tracker.observe(False, 'primary', tenth / 10)
+    assert tracker.delay({**config, 'percentile': 0.5}) == 0.6
+    assert tracker.delay(config) == 0.8
+
+
+def test_slow_primary_is_hedged(settings):
+    """Tests that the alternate model answers when the primary is slow, and is recorded."""
+    _slow_primary(settings)
+    started = time.perf_counter()
+    assert async_to_sync(acreate_groq_description)('key', ['Drake'])
+    assert time.perf_counter() - started < 0.4
+
+    call = LLMCall.objects.get()
+    assert (call.model, call.hedged, call.outcome) == (ALTERNATE, True, 'ok')
+    assert get_hedging_stats()['description']['alternate_wins'] == 1
+
+
+def test_fast_primary_is_not_hedged(settings):
+    """Tests that calls the primary answers within the delay go to the primary only."""
+    settings.LLM_HEDGING = {'enabled': True, 'initial_delay': 1}
+    completions, client = _racing({PRIMARY: (0, "Primary"), ALTERNATE: (0, "Alternate")})
+    with client:
+        assert async_to_sync(acreate_groq_description)('key', ['Drake']) == "Primary"
+    call = LLMCall.objects.get()
+    assert (call.model, call.hedged) == (PRIMARY, False)
+    assert not completions.cancelled
+
+
+def test_loser_is_cancelled():
+    """Tests that the primary's request is cancelled once the alternate answers."""
+    completions, client = _racing({PRIMARY: (5, "Primary"), ALTERNATE: (0, "Alternate")})
+    with client:
+        assert async_to_sync(acreate_groq_description)('key', ['Drake']) == "Alternate"
+    assert completions.cancelled == [PRIMARY]
+
+
+def test_cancelled_primary_latency_is_not_recorded():
+    """Tests that only the latencies of calls the primary answered set the hedge delay."""
+    _, client = _racing({PRIMARY: (5, "Primary"), ALTERNATE: (0, "Alternate")})
+    with client:
+        async_to_sync(acreate_groq_description)('key', ['Drake'])
+    _, client = _racing({PRIMARY: (0.05, "Primary"), ALTERNATE: (5, "Alternate")})
+    with client:
+        async_to_sync(acreate_groq_description)('key', ['Adele'])
+
+    stats = get_hedging_stats()['description']
+    assert (stats['primary_wins'], stats['alternate_wins']) == (1, 1)
+    latencies = list(_tracker('description').latencies)
+    assert len(latencies) == 1 and latencies[0] >= 0.05
+
+
+def test_failed_primary_falls_back_to_alternate():
+    """Tests that a hedged call is answered by whichever model succeeds."""
+    completions, client = _racing({PRIMARY: (0.05, RuntimeError("down")),
+                                   ALTERNATE: (0.1, "Alternate")})
+    with client:
+        assert async_to_sync(acreate_groq_description)('key', ['Drake']) == "Alternate"
+
+    completions, client = _racing({PRIMARY: (0.05, RuntimeError("down")),
+                                   ALTERNATE: (0, RuntimeError("down too"))})
+    with client:
+        assert async_to_sync(acreate_groq_description)('key', ['Drake']) == \
+            description_roast(['Drake'])
+    assert not completions.cancelled
+    assert LLMCall.objects.order_by('-id').first().outcome == 'error'
+
+
+def test_hedged_share_is_bounded(settings):
+    """Tests that no call is hedged beyond max_rate, however slow the primary is."""
+    settings.LLM_HEDGING = {'enabled': True, 'initial_delay': 0.01, 'max_rate': 0.5}
+    completions, client = _racing({PRIMARY: (0.05, "Primary"), ALTERNATE: (0, "Alternate")})
+    with client:
+        texts = [async_to_sync(acreate_groq_description)('key', [f'Artist {number}'])
+                 for number in range(4)]
+    assert texts == ["Alternate", "Primary", "Primary", "Alternate"]
+    assert len(completions.cancelled) == 2
+    assert get_hedging_stats()['description']['hedged'] == 2
+
+
+def test_streams_are_hedged_before_the_first_token(settings):
+    """Tests that streamed calls are hedged while waiting for the stream to start."""
+    _slow_primary(settings)
+
+    async def consume():
+        return [part async for part in astream_groq_quirky('key', ['Drake'])]
+    assert async_to_sync(consume)()
+
+    call = LLMCall.objects.get()
+    assert call.streamed and (call.model, call.hedged) == (ALTERNATE, True)
+    assert 'quirky:stream' in get_hedging_stats()
+
+
+def test_disabled_hedging_only_calls_the_primary(settings):
+    """Tests that calls are not hedged unless LLM_HEDGING is enabled."""
+    settings.LLM_HEDGING = {'enabled': False}
+    completions, client = _racing({PRIMARY: (0.05, "Primary"), ALTERNATE: (0, "Alternate")})
+    with client:
+        assert async_to_sync(acreate_groq_description)('key', ['Drake']) == "Primary"
+    assert not completions.cancelled and not get_hedging_stats()
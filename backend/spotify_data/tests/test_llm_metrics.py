@@ -0,0 +1,201 @@
+"""Tests for the LLM call records in spotify_data/llm_metrics."""
+
+import json
+from io import StringIO
+from unittest.mock import AsyncMock, MagicMock
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from spotify_data.async_utils import astream_groq_quirky, acreate_groq_batch
+from spotify_data.llm_metrics import (flush_llm_calls, get_llm_metrics, llm_tags,
+                                      set_llm_wrap_id, tag_llm_calls)
+from spotify_data.models import LLMCall, SpotifyUser, SpotifyWrapped
+from spotify_data.utils import create_groq_description
+from spotify_data.views import add_spotify_wrapped, display_llm_metrics
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def llm_metrics_on(settings):
+    """Records every call right away."""
+    settings.LLM_METRICS = {'enabled': True, 'flush_every': 1}
+
+
+def test_call_is_recorded_with_usage_and_tags():
+    """Tests that a call is recorded with its tags, timing and Groq's token usage."""
+    with llm_tags(view='display_artists', wrap_id=7):
+        create_groq_description('key', ['Drake'])
+
+    call = LLMCall.objects.get()
+    assert (call.function, call.view, call.wrap_id) == ('description', 'display_artists', 7)
+    assert (call.cache, call.outcome, call.streamed) == ('off', 'ok', False)
+    assert call.prompt_tokens > 0 and call.completion_tokens > 0
+    assert not call.tokens_estimated
+    assert call.wall_ms >= 0 and call.ttft_ms is None
+
+
+def test_cache_hits_cost_no_tokens(settings):
+    """Tests that calls answered by the LLM cache are recorded as hits without tokens."""
+    settings.LLM_CACHE = {'enabled': True}
+    create_groq_description('key', ['Drake'])
+    create_groq_description('key', ['Drake'])
+
+    first, second = LLMCall.objects.order_by('id')
+    assert first.cache == 'miss' and first.completion_tokens > 0
+    assert second.cache == 'hit' and second.completion_tokens == 0
+    assert first.prompt_key == second.prompt_key
+
+
+def test_failures_are_recorded(settings):
+    """Tests that errors and calls rejected by the circuit breaker are recorded."""
+    settings.LLM_FAKE = {'error_rate': 1.0}
+    settings.LLM_CIRCUIT_BREAKER = {'failure_threshold': 1}
+    create_groq_description('key', ['Drake'])
+    create_groq_description('key', ['Drake'])
+    assert list(LLMCall.objects.order_by('id').values_list('outcome', flat=True)) == \
+        ['error', 'rejected']
+
+
+def test_streamed_call_records_time_to_first_token():
+    """Tests that streams record the time to first token and the usage of the last chunk."""
+    async def consume():
+        return [part async for part in astream_groq_quirky('key', ['Drake'])]
+    async_to_sync(consume)()
+
+    call = LLMCall.objects.get()
+    assert call.streamed and call.ttft_ms is not None
+    assert call.ttft_ms <= call.wall_ms
+    assert call.completion_tokens > 0 and not call.tokens_estimated
+
+
+def test_batch_is_recorded_once():
+    """Tests that a batched request is one record."""
+    items = {'a': ('description', ('Drake',)), 'b': ('quirky', ('Adele',))}
+    async_to_sync(acreate_groq_batch)('key', items)
+    assert list(LLMCall.objects.values_list('function', flat=True)) == ['batch']
+
+
+def test_records_are_written_in_batches(settings):
+    """Tests that records are buffered until flush_every of them are waiting."""
+    settings.LLM_METRICS = {'enabled': True, 'flush_every': 3}
+    create_groq_description('key', ['A'])
+    create_groq_description('key', ['B'])
+    assert not LLMCall.objects.exists()
+    create_groq_description('key', ['C'])
+    assert LLMCall.objects.count() == 3
+    create_groq_description('key', ['D'])
+    assert flush_llm_calls() == 1
+
+
+def test_tagged_view_tags_streamed_calls():
+    """Tests that calls made while streaming a tagged view's response carry its tags."""
+    @tag_llm_calls
+    async def stream_view(request):
+        async def events():
+            async for part in astream_groq_quirky('key', ['Drake']):
+                yield part
+        return StreamingHttpResponse(events())
+
+    async def read(response):
+        return b''.join([part async for part in response.streaming_content])
+
+    request = MagicMock()
+    request.GET = {'id': '12'}
+    response = async_to_sync(stream_view)(request)
+    assert async_to_sync(read)(response)
+    call = LLMCall.objects.get()
+    assert (call.view, call.wrap_id) == ('stream_view', 12)
+
+
+def test_wrap_creation_tags_calls_with_the_new_wrap(monkeypatch):
+    """Tests that the calls made before a wrap is created are tagged with its id."""
+    monkeypatch.setenv('GROQ_API_KEY', 'key')
+    user = User.objects.create_user(username='testuser', password='password')
+    SpotifyUser.objects.create(
+        user=user, spotify_id='spotify_testuser', display_name='testuser',
+        favorite_artists_short=[{'name': 'Drake', 'popularity': 90}],
+        favorite_tracks_short=[{'name': 'Song', 'artists': [{'name': 'Drake'}]}],
+        favorite_genres_short=['rap'],
+        quirkiest_artists_short=[{'name': 'Björk', 'popularity': 10}])
+    request = MagicMock()
+    request.GET = {'termselection': '0'}
+    request.auser = AsyncMock(return_value=user)
+
+    assert async_to_sync(add_spotify_wrapped)(request).status_code == 200
+
+    wrapped = SpotifyWrapped.objects.get()
+    calls = LLMCall.objects.all()
+    assert calls.count() > 1
+    assert {(call.view, call.wrap_id) for call in calls} == {('add_spotify_wrapped',
+                                                             wrapped.id)}
+
+
+def test_wrap_id_outside_a_tagged_view_is_ignored():
+    """Tests that set_llm_wrap_id outside a tagged view does not tag later calls."""
+    set_llm_wrap_id(7)
+    create_groq_description('key', ['Drake'])
+    assert LLMCall.objects.get().wrap_id is None
+
+
+def test_metrics_aggregate_by_function_and_view():
+    """Tests the aggregates served by the metrics endpoint."""
+    with llm_tags(view='display_genres'):
+        create_groq_description('key', ['Drake'])
+        create_groq_description('key', ['Drake'])
+    create_groq_description('key', ['Adele'])
+
+    metrics = get_llm_metrics(top=1)
+    assert metrics['total']['calls'] == 3
+    assert metrics['by_view']['display_genres']['calls'] == 2
+    assert metrics['by_view']['-']['calls'] == 1
+    assert metrics['by_function']['description']['wall_ms_p95'] is not None
+    assert metrics['total']['total_tokens'] == \
+        metrics['total']['prompt_tokens'] + metrics['total']['completion_tokens']
+    assert len(metrics['heaviest_prompts']) == 1
+    assert metrics['heaviest_prompts'][0]['calls'] == 2
+
+
+def test_metrics_percentiles_and_heaviest_prompts():
+    """Tests the percentiles and token totals aggregated by the database."""
+    for tenth in range(1, 11):
+        LLMCall.objects.create(function='description', model='m', prompt_key=f'p{tenth % 2}',
+                               cache='miss', outcome='ok', wall_ms=tenth * 10,
+                               prompt_tokens=tenth, completion_tokens=None)
+    LLMCall.objects.create(function='description', model='m', prompt_key='p0', cache='hit',
+                           outcome='ok', wall_ms=1000)
+
+    metrics = get_llm_metrics(top=1)
+    total = metrics['total']
+    assert (total['calls'], total['cache_hits']) == (11, 1)
+    assert (total['wall_ms_p50'], total['wall_ms_p95'], total['wall_ms_max']) == (60, 100, 100)
+    assert total['ttft_ms_p50'] is None
+    assert (total['prompt_tokens'], total['completion_tokens']) == (55, 0)
+    assert metrics['by_model']['m']['calls'] == 11
+    assert metrics['heaviest_prompts'] == [{'function': 'description', 'prompt_key': 'p0',
+                                            'calls': 6, 'prompt_tokens': 30,
+                                            'completion_tokens': 0, 'wall_ms': 1300.0}]
+
+
+def test_metrics_endpoint_and_report():
+    """Tests the llmmetrics endpoint and the llm_report command."""
+    create_groq_description('key', ['Drake'])
+    request = MagicMock()
+    request.GET = {'hours': '1'}
+    request.auser = AsyncMock(return_value=User(username='admin', is_staff=True))
+    response = async_to_sync(display_llm_metrics)(request)
+    assert response.status_code == 200
+    assert json.loads(response.content)['total']['calls'] == 1
+
+    request.GET = {'hours': 'soon'}
+    assert async_to_sync(display_llm_metrics)(request).status_code == 400
+
+    request.auser = AsyncMock(return_value=AnonymousUser())
+    assert async_to_sync(display_llm_metrics)(request).status_code == 403
+
+    out = StringIO()
+    call_command('llm_report', stdout=out)
+    assert 'description' in out.getvalue()
+    assert 'Heaviest prompts' in out.getvalue()
@@ -0,0 +1,115 @@
+"""Tests running the LLM helpers against the LLM stand-in server and the in-process fake."""
+
+import json
+import threading
+import pytest
+from asgiref.sync import async_to_sync
+from spotify_data import llm_clients
+from spotify_data.async_utils import (acreate_groq_batch, acreate_groq_comparison,
+                                      astream_groq_quirky)
+from spotify_data.llm_standin import (LLMStandinConfig, FakeGroq, make_server,
+                                      split_tokens, standin_completion)
+from spotify_data.roast_templates import description_roast
+from spotify_data.prompts import quirky_prompt
+from spotify_data.utils import create_groq_description, groq_messages
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    """Drops clients built for another backend or stand-in."""
+    llm_clients.close_llm_clients()
+    yield
+    llm_clients.close_llm_clients()
+
+
+@pytest.fixture
+def llm_standin(settings):
+    """Starts an LLM stand-in server on a free port and points the LLM backend at it."""
+    servers = []
+
+    def start(**config):
+        server = make_server(port=0, config=LLMStandinConfig(**config))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        settings.LLM_BACKEND = 'standin'
+        settings.LLM_STANDIN_URL = f'http://127.0.0.1:{server.server_address[1]}'
+        return settings.LLM_STANDIN_URL
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+async def _collect(stream):
+    return [part async for part in stream]
+
+
+def test_completions_are_deterministic():
+    """Tests that the same prompt always gets the same completion."""
+    messages = groq_messages("system", "Roast Drake")
+    assert standin_completion(messages) == standin_completion(messages)
+    assert standin_completion(messages) != standin_completion(groq_messages("system", "Adele"))
+    assert ''.join(split_tokens(standin_completion(messages))) == standin_completion(messages)
+
+
+def test_json_mode_answers_every_key():
+    """Tests that batched prompts get a JSON object with an answer per key."""
+    messages = groq_messages("system", json.dumps({'a': "Roast Drake", 'b': "Roast Adele"}))
+    answers = json.loads(standin_completion(messages, json_mode=True))
+    assert set(answers) == {'a', 'b'}
+    assert json.loads(standin_completion(groq_messages("system", "not json"), True)) == {}
+
+
+def test_fake_backend_answers_without_network():
+    """Tests that the fake backend the tests run with answers every helper."""
+    description = create_groq_description('key', ['Drake'])
+    assert description == create_groq_description('key', ['Drake'])
+    assert isinstance(llm_clients.get_groq_client('key'), FakeGroq)
+
+    parts = async_to_sync(_collect)(astream_groq_quirky('key', ['Drake']))
+    assert len(parts) > 1
+    assert ''.join(parts) == standin_completion(groq_messages("", quirky_prompt(['Drake'])))
+
+    items = {'a': ('description', ('Drake',)), 'b': ('comparison', ('Drake', 'Adele'))}
+    assert set(async_to_sync(acreate_groq_batch)('key', items)) == {'a', 'b'}
+
+
+def test_fake_backend_injects_errors(settings):
+    """Tests that a failing fake backend makes the helpers serve template roasts."""
+    settings.LLM_FAKE = {'error_rate': 1.0}
+    assert create_groq_description('key', ['Drake']) == description_roast(['Drake'])
+
+
+def test_unknown_backend_is_rejected(settings):
+    """Tests that a misspelled LLM_BACKEND fails loudly instead of calling Groq."""
+    settings.LLM_BACKEND = 'grok'
+    with pytest.raises(ValueError, match="Unknown LLM_BACKEND"):
+        llm_clients.get_groq_client('key')
+
+
+def test_standin_server_completions(llm_standin):
+    """Tests that the real Groq SDK gets the stand-in's completions over HTTP."""
+    llm_standin()
+    assert create_groq_description('key', ['Drake']) == create_groq_description('key',
+                                                                                ['Drake'])
+    assert not isinstance(llm_clients.get_groq_client('key'), FakeGroq)
+    comparison = async_to_sync(acreate_groq_comparison)('key', 'Drake', 'Adele')
+    assert comparison.endswith('.')
+
+    items = {'a': ('description', ('Drake',)), 'b': ('quirky', ('Adele',))}
+    assert set(async_to_sync(acreate_groq_batch)('key', items)) == {'a', 'b'}
+
+
+def test_standin_server_streams(llm_standin):
+    """Tests that stream=True is answered with one server-sent event per token."""
+    llm_standin(tokens_per_second=1000)
+    parts = async_to_sync(_collect)(astream_groq_quirky('key', ['Drake']))
+    assert len(parts) > 1
+    assert ''.join(parts).endswith('.')
+
+
+def test_standin_server_injects_errors(llm_standin):
+    """Tests that injected errors reach the helpers, which serve template roasts."""
+    llm_standin(error_rate=1.0)
+    assert create_groq_description('key', ['Drake']) == description_roast(['Drake'])
@@ -0,0 +1,53 @@
+"""Tests for closing per-loop clients in spotify_data/loop_clients."""
+
+from unittest.mock import MagicMock
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from spotify_data.async_client import get_async_client
+from spotify_data.llm_clients import get_async_groq_client
+from spotify_data.loop_clients import aclose_loop_clients, close_loop_clients
+
+
+@close_loop_clients
+async def clients_view(request):  # pylint: disable=unused-argument
+    """Opens both per-loop clients and returns them."""
+    return get_async_client(), get_async_groq_client('key')
+
+
+def test_clients_are_closed_after_wsgi_requests(settings):
+    """Tests that the clients opened by a request outside ASGI are closed with it."""
+    settings.LLM_BACKEND = 'groq'
+    spotify, groq = async_to_sync(clients_view)(MagicMock())
+    assert spotify.is_closed and groq.is_closed()
+
+
+def test_clients_are_kept_under_asgi(settings):
+    """Tests that the clients of an ASGI server's loop stay open for the next request."""
+    settings.LLM_BACKEND = 'groq'
+
+    async def serve():
+        spotify, groq = await clients_view(MagicMock(spec=ASGIRequest))
+        kept = not spotify.is_closed and not groq.is_closed()
+        await aclose_loop_clients()
+        return kept
+    assert async_to_sync(serve)()
+
+
+def test_clients_are_closed_after_streaming():
+    """Tests that the clients opened while streaming are closed once the stream ends."""
+    opened = []
+
+    @close_loop_clients
+    async def stream_view(request):  # pylint: disable=unused-argument
+        async def events():
+            opened.append(get_async_client())
+            yield b'data'
+        return StreamingHttpResponse(events())
+
+    async def read(response):
+        return b''.join([part async for part in response.streaming_content])
+
+    response = async_to_sync(stream_view)(MagicMock())
+    assert async_to_sync(read)(response) == b'data'
+    assert opened[0].is_closed
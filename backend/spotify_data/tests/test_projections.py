@@ -0,0 +1,84 @@
+"""Tests the compact projections from spotify_data/projections."""
+
+from importlib import import_module
+import pytest
+from django.apps import apps
+from django.contrib.auth.models import User
+from spotify_data.models import SpotifyUser, SpotifyWrapped
+from spotify_data.projections import project_artist, project_track
+
+compact_payloads = import_module(
+    'spotify_data.migrations.0008_compact_spotify_payloads').compact_payloads
+
+RAW_ARTIST = {
+    'id': 'artist_id',
+    'name': 'Artist',
+    'popularity': 42,
+    'genres': ['pop'],
+    'images': [{'url': 'large.jpg', 'height': 640, 'width': 640},
+               {'url': 'small.jpg', 'height': 64, 'width': 64}],
+    'external_urls': {'spotify': 'https://open.spotify.com/artist/artist_id'},
+    'followers': {'href': None, 'total': 1000},
+    'type': 'artist',
+    'uri': 'spotify:artist:artist_id',
+}
+
+RAW_TRACK = {
+    'id': 'track_id',
+    'name': 'Track',
+    'popularity': 70,
+    'available_markets': ['US', 'GB', 'DE'],
+    'artists': [{'id': 'artist_id', 'name': 'Artist', 'external_urls': {}},
+                {'id': 'feature_id', 'name': 'Feature', 'external_urls': {}}],
+    'album': {'id': 'album_id', 'name': 'Album', 'available_markets': ['US'],
+              'images': [{'url': 'cover.jpg', 'height': 640, 'width': 640}]},
+    'duration_ms': 200000,
+}
+
+COMPACT_ARTIST = {'id': 'artist_id', 'name': 'Artist', 'popularity': 42, 'genres': ['pop'],
+                  'images': [{'url': 'large.jpg'}]}
+
+COMPACT_TRACK = {'id': 'track_id', 'name': 'Track', 'popularity': 70,
+                 'artists': [{'id': 'artist_id', 'name': 'Artist'}],
+                 'album': {'images': [{'url': 'cover.jpg'}]}}
+
+
+def test_project_artist():
+    """Tests that only the fields the views read are kept, and projecting is idempotent."""
+    assert project_artist(RAW_ARTIST) == COMPACT_ARTIST
+    assert project_artist(COMPACT_ARTIST) == COMPACT_ARTIST
+
+
+def test_project_track():
+    """Tests that a track keeps its first artist and a single album image."""
+    assert project_track(RAW_TRACK) == COMPACT_TRACK
+    assert project_track(COMPACT_TRACK) == COMPACT_TRACK
+    assert project_track({'name': 'Track', 'album': {'images': []}}) == {
+        'name': 'Track', 'album': {'images': []}}
+
+
+@pytest.mark.django_db
+def test_compact_payloads_migration():
+    """Tests that the data migration shrinks rows that were stored raw."""
+    user = User.objects.create_user(username='testuser', password='password')
+    raw_wrap = {'id': 1, 'user': 'testuser', 'favorite_artists': [RAW_ARTIST],
+                'favorite_tracks': [RAW_TRACK], 'quirkiest_artists': [RAW_ARTIST]}
+    SpotifyUser.objects.create(user=user, spotify_id='spotify_id', display_name='testuser',
+                               favorite_artists_short=[RAW_ARTIST],
+                               favorite_tracks_long=[RAW_TRACK],
+                               quirkiest_artists_medium=[RAW_ARTIST],
+                               past_roasts=[raw_wrap])
+    wrapped = SpotifyWrapped.objects.create(user='testuser', favorite_artists=[RAW_ARTIST],
+                                            favorite_tracks=[RAW_TRACK],
+                                            quirkiest_artists=[RAW_ARTIST])
+
+    compact_payloads(apps, None)
+
+    spotify_user = SpotifyUser.objects.get(user=user)
+    assert spotify_user.favorite_artists_short == [COMPACT_ARTIST]
+    assert spotify_user.favorite_tracks_long == [COMPACT_TRACK]
+    assert spotify_user.quirkiest_artists_medium == [COMPACT_ARTIST]
+    assert spotify_user.past_roasts[0]['favorite_tracks'] == [COMPACT_TRACK]
+    wrapped.refresh_from_db()
+    assert wrapped.favorite_artists == [COMPACT_ARTIST]
+    assert wrapped.favorite_tracks == [COMPACT_TRACK]
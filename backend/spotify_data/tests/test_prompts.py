@@ -0,0 +1,54 @@
+"""Tests for the compact prompt builders in spotify_data/prompts."""
+
+from spotify_data.prompts import (comparison_prompt, description_prompt, estimate_tokens,
+                                  popularity_bucket, quirky_prompt, render_subject,
+                                  truncate_to_tokens)
+
+
+def _raw_artist(number, popularity=50, genres=('pop',)):
+    """Returns an artist shaped like Spotify's, with the fields prompts should not carry."""
+    return {
+        'id': f'artist_{number}',
+        'name': f'Artist {number}',
+        'popularity': popularity,
+        'genres': list(genres),
+        'images': [{'url': f'https://i.scdn.co/image/{number}', 'height': 640, 'width': 640}],
+        'followers': {'href': None, 'total': 1000},
+        'uri': f'spotify:artist:artist_{number}',
+    }
+
+
+def test_render_subject_keeps_names_genres_and_bucket():
+    """Tests that raw artists are reduced to names, top genres and a popularity bucket."""
+    artists = [_raw_artist(1, 90, ('rap', 'pop')), _raw_artist(2, 80, ('rap',))]
+    assert render_subject(artists) == 'Artist 1, Artist 2 (genres: rap, pop; mostly mainstream)'
+    assert render_subject('pop, rock') == 'pop, rock'
+    assert render_subject({'name': 'Song', 'artists': [{'name': 'Band'}]}) == 'Song by Band'
+
+
+def test_description_prompt_drops_raw_fields():
+    """Tests that a full list of raw artists becomes a short prompt."""
+    artists = [_raw_artist(number) for number in range(50)]
+    prompt = description_prompt(artists)
+    assert 'Artist 4' in prompt and 'Artist 5' not in prompt
+    assert 'https://' not in prompt and 'spotify:' not in prompt
+    assert estimate_tokens(prompt) <= 120
+    assert estimate_tokens(str(artists)) > 20 * estimate_tokens(prompt)
+
+
+def test_prompts_respect_the_token_cap(settings):
+    """Tests that long subjects are cut so every prompt stays within max_tokens."""
+    settings.LLM_PROMPT = {'max_tokens': 60, 'max_name_chars': 1000}
+    long_name = 'Very Long Band Name ' * 40
+    for prompt in (description_prompt(long_name), quirky_prompt([long_name] * 5),
+                   comparison_prompt(long_name, long_name)):
+        assert estimate_tokens(prompt) <= 60
+        assert prompt.endswith('.')
+
+
+def test_truncate_and_buckets():
+    """Tests the truncation and popularity bucket helpers."""
+    assert truncate_to_tokens('short', 10) == 'short'
+    assert truncate_to_tokens('one two three four five', 3) == 'one two...'
+    assert [popularity_bucket(score) for score in (95, 50, 30, 5)] == \
+        ['mainstream', 'popular', 'niche', 'underground']
@@ -0,0 +1,113 @@
+"""Tests for the shared Spotify rate limiter in spotify_data/ratelimit."""
+
+import threading
+from unittest.mock import patch, AsyncMock, Mock
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import override_settings
+from spotify_data import client, ratelimit
+from spotify_data.ratelimit import SpotifyRateLimitError
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Starts every test with an empty bucket and no metrics."""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@override_settings(SPOTIFY_RATE_LIMIT={'requests': 2, 'window': 10})
+def test_reserve_slot_refills_every_window():
+    """Tests that tokens run out within a window and come back in the next one."""
+    assert ratelimit.reserve_slot(now=100.0) == 0
+    assert ratelimit.reserve_slot(now=101.0) == 0
+    assert ratelimit.reserve_slot(now=102.0) == pytest.approx(8.0)
+    assert ratelimit.reserve_slot(now=110.0) == 0
+
+
+def test_retry_after_header_is_honoured():
+    """Tests that Retry-After wins over exponential backoff."""
+    assert ratelimit.retry_after_seconds(Mock(headers={'Retry-After': '7'}), 0) == 7
+    assert ratelimit.retry_after_seconds(Mock(headers={}), 2) == 4
+
+
+def test_record_rate_limited_blocks_all_callers():
+    """Tests that a 429 pauses the bucket for the Retry-After delay."""
+    with patch('spotify_data.ratelimit.time.time', return_value=1000.0):
+        ratelimit.record_rate_limited(5)
+        assert ratelimit.reserve_slot() == pytest.approx(5.0)
+    assert ratelimit.get_throttle_stats()['rate_limited_responses'] == 1
+
+
+@override_settings(SPOTIFY_RATE_LIMIT={'max_wait': 1})
+def test_wait_for_slot_fails_fast_on_long_waits():
+    """Tests that waits longer than max_wait raise instead of blocking."""
+    with patch('spotify_data.ratelimit.reserve_slot', return_value=30):
+        with pytest.raises(SpotifyRateLimitError):
+            ratelimit.wait_for_slot()
+
+
+def test_wait_for_slot_records_throttled_time():
+    """Tests that time spent waiting is added to the metrics."""
+    with patch('spotify_data.ratelimit.reserve_slot', side_effect=[0.5, 0]), \
+            patch('spotify_data.ratelimit.time.sleep') as mock_sleep:
+        ratelimit.wait_for_slot()
+
+    mock_sleep.assert_called_once_with(0.5)
+    stats = ratelimit.get_throttle_stats()
+    assert stats['throttled_seconds'] == 0.5
+    assert stats['throttled_waits'] == 1
+
+
+def test_async_record_rate_limited_blocks_all_callers():
+    """Tests that a 429 seen by the async client pauses the shared bucket."""
+    with patch('spotify_data.ratelimit.time.time', return_value=1000.0):
+        async_to_sync(ratelimit.arecord_rate_limited)(5)
+        assert ratelimit.reserve_slot() == pytest.approx(5.0)
+    assert ratelimit.get_throttle_stats()['rate_limited_responses'] == 1
+
+
+def test_await_slot_records_throttled_time_off_the_event_loop():
+    """Tests that the async wait records its time and reads the cache outside the loop."""
+    delays = [0.5, 0]
+    threads = []
+
+    def reserve_slot():
+        threads.append(threading.get_ident())
+        return delays.pop(0)
+
+    async def wait():
+        await ratelimit.await_slot()
+        return threading.get_ident()
+
+    with patch('spotify_data.ratelimit.reserve_slot', side_effect=reserve_slot), \
+            patch('spotify_data.ratelimit.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        loop_thread = async_to_sync(wait)()
+
+    mock_sleep.assert_awaited_once_with(0.5)
+    assert len(threads) == 2 and loop_thread not in threads
+    assert ratelimit.get_throttle_stats()['throttled_waits'] == 1
+
+
+def test_client_retries_429_then_succeeds():
+    """Tests that the client backs off on 429 and returns the next good response."""
+    throttled = Mock(status_code=429, headers={'Retry-After': '0'})
+    success = Mock(status_code=200)
+    with patch('requests.Session.get', side_effect=[throttled, success]) as mock_get:
+        response = client.get('https://api.spotify.com/v1/me', timeout=5)
+
+    assert response is success
+    assert mock_get.call_count == 2
+
+
+@override_settings(SPOTIFY_RATE_LIMIT={'max_retries': 1})
+def test_client_raises_after_max_retries():
+    """Tests that persistent 429s surface as SpotifyRateLimitError instead of a response."""
+    throttled = Mock(status_code=429, headers={'Retry-After': '0'})
+    with patch('requests.Session.get', return_value=throttled) as mock_get:
+        with pytest.raises(SpotifyRateLimitError):
+            client.get('https://api.spotify.com/v1/me', timeout=5)
+
+    assert mock_get.call_count == 2
@@ -0,0 +1,94 @@
+"""Tests for the roast catalogue in spotify_data/roast_catalogue."""
+
+from io import StringIO
+from unittest.mock import patch, AsyncMock
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from spotify_data.models import RoastCatalogue, SpotifyUser
+from spotify_data.roast_catalogue import awarm_catalogue, rank_subjects
+from spotify_data.slides import agenerate_slides
+
+pytestmark = pytest.mark.django_db
+
+
+def _artist(number):
+    return {'id': f'artist_{number}', 'name': f'Artist {number}', 'popularity': 50}
+
+
+def _track(number):
+    return {'id': f'track_{number}', 'name': f'Song {number}',
+            'artists': [{'id': 'artist_0', 'name': 'Artist 0'}]}
+
+
+@pytest.fixture
+def users():
+    """Creates users whose favorites overlap on artist 0 and track 0."""
+    for number in range(3):
+        user = User.objects.create_user(username=f'user{number}', password='password')
+        SpotifyUser.objects.create(
+            user=user, spotify_id=f'spotify_{number}', display_name=f'user{number}',
+            favorite_artists_short=[_artist(0), _artist(number + 1)],
+            favorite_artists_long=[_artist(0)],
+            favorite_tracks_medium=[_track(0), _track(number + 1)])
+
+
+def test_rank_subjects_by_appearances(users):  # pylint: disable=unused-argument
+    """Tests that artists and tracks are ranked by how often they are favorites."""
+    assert rank_subjects('artist', 2)[0] == ('artist_0', 'Artist 0', 6)
+    assert rank_subjects('track', 1) == [('track_0', 'Song 0 by Artist 0', 3)]
+    assert len(rank_subjects('artist', 10)) == 4
+
+
+def test_warm_catalogue_generates_top_subjects_once(users):  # pylint: disable=unused-argument
+    """Tests that the top subjects are generated once and kept on the next run."""
+    counts = async_to_sync(awarm_catalogue)('key', 'artist', 2, concurrency=2)
+    assert counts == {'ranked': 2, 'catalogued': 0, 'generated': 2, 'failed': 0}
+    roast = RoastCatalogue.objects.get(kind='artist', spotify_id='artist_0')
+    assert roast.appearances == 6 and roast.text
+
+    with patch('spotify_data.roast_catalogue.acreate_groq_description',
+               new_callable=AsyncMock, return_value="Roast") as mock_create:
+        counts = async_to_sync(awarm_catalogue)('key', 'artist', 3)
+    assert counts['catalogued'] == 2 and counts['generated'] == 1
+    mock_create.assert_called_once()
+
+
+def test_warm_catalogue_skips_failures(users, settings):  # pylint: disable=unused-argument
+    """Tests that template roasts served on LLM errors are not catalogued."""
+    settings.LLM_FAKE = {'error_rate': 1.0}
+    counts = async_to_sync(awarm_catalogue)('key', 'track', 2)
+    assert counts['failed'] == 2
+    assert not RoastCatalogue.objects.exists()
+
+
+@patch("spotify_data.slides.acreate_groq_description", new_callable=AsyncMock,
+       return_value="Described")
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock, return_value={})
+def test_slides_read_the_catalogue(mock_batch, mock_create_description):
+    """Tests that catalogued artists and tracks skip the LLM when slides are generated."""
+    RoastCatalogue.objects.create(kind='artist', spotify_id='artist_0', name='Artist 0',
+                                  text="Catalogued artist", model='llama')
+    RoastCatalogue.objects.create(kind='track', spotify_id='track_0', name='Song 0',
+                                  text="Catalogued track", model='llama')
+    wrap = {'favorite_artists': [_artist(0), _artist(1)], 'favorite_tracks': [_track(0)],
+            'favorite_genres': ['pop'], 'quirkiest_artists': [_artist(1)]}
+
+    slides, complete = async_to_sync(agenerate_slides)(wrap, False, ('artists', 'tracks'))
+
+    assert slides == {'artists': ["Catalogued artist", "Described"],
+                      'tracks': ["Catalogued track"]}
+    assert complete == {'artists', 'tracks'}
+    assert set(mock_batch.call_args.args[1]) == {'artists_1'}
+    mock_create_description.assert_called_once()
+
+
+def test_warm_command(users, monkeypatch):  # pylint: disable=unused-argument
+    """Tests that the command catalogues both kinds by default."""
+    monkeypatch.setenv('GROQ_API_KEY', 'key')
+    out = StringIO()
+    call_command('warm_roast_catalogue', '--top', '1', stdout=out)
+    assert 'artists: 1 ranked' in out.getvalue()
+    assert 'tracks: 1 ranked' in out.getvalue()
+    assert RoastCatalogue.objects.count() == 2
@@ -0,0 +1,66 @@
+"""Tests for the slide generation stage in spotify_data/slides."""
+
+import asyncio
+import time
+from unittest.mock import patch, AsyncMock
+from asgiref.sync import async_to_sync
+from spotify_data.slides import agenerate_slides
+
+WRAP = {
+    'favorite_artists': [{'name': f'Artist {i}'} for i in range(3)],
+    'favorite_tracks': [],
+    'favorite_genres': ['pop'],
+    'quirkiest_artists': [{'name': 'Artist 2'}],
+}
+
+
+@patch("spotify_data.slides.acreate_groq_comparison", new_callable=AsyncMock,
+       return_value="Compared")
+@patch("spotify_data.slides.acreate_groq_description", new_callable=AsyncMock,
+       return_value="Described")
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock)
+def test_agenerate_slides_batches_then_fills_gaps(mock_batch, mock_create_description,
+                                                  mock_create_comparison):
+    """Tests that one batch covers every section and only missing items are generated alone."""
+    mock_batch.return_value = {'artists_0': "Batched 0", 'artists_2': "Batched 2",
+                               'genres_0': "Batched genres", 'quirky_0': "Batched quirky"}
+
+    slides, complete = async_to_sync(agenerate_slides)(WRAP, is_duo=True)
+
+    items = mock_batch.call_args.args[1]
+    assert set(items) == {'artists_0', 'artists_1', 'artists_2', 'genres_0', 'quirky_0'}
+    assert items['artists_1'][0] == 'comparison'
+    assert items['artists_2'][0] == 'description'
+    assert slides == {'artists': ["Batched 0", "Compared", "Batched 2"], 'tracks': [],
+                      'genres': "Batched genres", 'quirky': "Batched quirky"}
+    assert complete == {'artists', 'tracks', 'genres', 'quirky'}
+    mock_create_comparison.assert_called_once()
+    mock_create_description.assert_not_called()
+
+
+@patch("spotify_data.slides.acreate_groq_description", new_callable=AsyncMock,
+       side_effect=Exception("down"))
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock, return_value={})
+def test_agenerate_slides_incomplete_sections(mock_batch, mock_create_description):
+    """Tests that sections with a fallback text are not reported as complete."""
+    slides, complete = async_to_sync(agenerate_slides)(WRAP, False, ('genres',))
+    assert "pop" in slides['genres']
+    assert complete == set()
+
+
+@patch("spotify_data.slides.acreate_groq_description", new_callable=AsyncMock)
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock)
+def test_agenerate_slides_shares_one_deadline(mock_batch, mock_create_description, settings):
+    """Tests that the calls made one by one only get what the batch left of the deadline."""
+    settings.LLM_DEADLINE = 0.3
+
+    async def slow(*args):  # pylint: disable=unused-argument
+        await asyncio.sleep(5)
+    mock_batch.side_effect = slow
+    mock_create_description.side_effect = slow
+
+    started = time.perf_counter()
+    slides, complete = async_to_sync(agenerate_slides)(WRAP, False, ('genres',))
+    assert time.perf_counter() - started < 0.5
+    assert "pop" in slides['genres']
+    assert complete == set()
@@ -0,0 +1,119 @@
+"""Integration tests running the spotify_data helpers against the local stand-in server."""
+
+import threading
+from datetime import timedelta
+import pytest
+import requests
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from accounts.models import SpotifyToken
+from accounts.utils import get_user_tokens, refresh_spotify_token
+from spotify_data import client
+from spotify_data.ratelimit import SpotifyRateLimitError
+from spotify_data.standin import StandinConfig, make_server, parse_latency
+from spotify_data.utils import (get_spotify_user_data, iter_user_top_items,
+                                get_spotify_recommendations, fetch_user_top_items)
+
+
+@pytest.fixture
+def clear_cache():
+    """Starts from an empty artist cache."""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def standin():
+    """Starts a stand-in server on a free port and points the client at it."""
+    servers = []
+
+    def start(**config):
+        server = make_server(port=0, config=StandinConfig(**config))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        base_url = f'http://127.0.0.1:{server.server_address[1]}'
+        settings_override = override_settings(SPOTIFY_API_BASE_URL=base_url,
+                                              SPOTIFY_ACCOUNTS_BASE_URL=base_url)
+        settings_override.enable()
+        servers.append(settings_override)
+        return base_url
+
+    yield start
+    for item in reversed(servers):
+        if hasattr(item, 'disable'):
+            item.disable()
+        else:
+            item.shutdown()
+            item.server_close()
+    client.close_sessions()
+
+
+def test_user_and_top_items(standin):
+    """Tests that a token maps onto a stable synthetic user with pageable top items."""
+    standin()
+    profile = get_spotify_user_data('token-a')
+    assert profile == get_spotify_user_data('token-a')
+    assert profile['id'].startswith('standin_user_')
+
+    artists = list(iter_user_top_items('token-a', 'artists', 'short_term', depth=80))
+    assert len(artists) == 80
+    assert len({artist['id'] for artist in artists}) == 80
+    assert set(artists[0]) == {'id', 'name', 'popularity', 'genres', 'images'}
+
+
+@pytest.mark.usefixtures('clear_cache')
+def test_fetch_enriches_track_artists(standin):
+    """Tests a full fetch, with track artists enriched through /v1/artists."""
+    standin()
+    results = fetch_user_top_items('token-a')
+    for result in results.values():
+        assert result['errors'] == []
+        assert 'genre_counts' not in result
+        assert all('genres' in track['artists'][0] for track in result['tracks'])
+
+
+def test_recommendations_and_token(standin):
+    """Tests the recommendations and token endpoints."""
+    base_url = standin()
+    assert len(get_spotify_recommendations('token-a', seed_genres=['pop'])) == 5
+
+    response = requests.post(f'{base_url}/api/token', timeout=5, data={
+        'grant_type': 'refresh_token', 'refresh_token': 'refresh'}).json()
+    assert response['refresh_token'] == 'refresh'
+    assert response['expires_in'] == 3600
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('clear_cache')
+def test_refresh_token_against_standin(standin, monkeypatch):
+    """Tests that accounts.utils refreshes a stored token through the token endpoint."""
+    standin()
+    monkeypatch.setenv('CLIENT_ID', 'client_id')
+    monkeypatch.setenv('CLIENT_SECRET', 'client_secret')
+    SpotifyToken.objects.create(user='standin', username='standin', access_token='old',
+                                refresh_token='refresh', token_type='Bearer',
+                                expires_in=timezone.now() - timedelta(seconds=1))
+
+    response = refresh_spotify_token('standin')
+
+    assert response['access_token'].startswith('standin-access-refresh-')
+    tokens = get_user_tokens('standin', use_cache=False)
+    assert tokens.access_token == response['access_token']
+    assert tokens.expires_in > timezone.now() + timedelta(seconds=3000)
+
+
+def test_injected_rate_limit(standin):
+    """Tests that injected 429s reach the client's rate limiting."""
+    standin(rate_limit_ratio=1.0, retry_after=0)
+    with override_settings(SPOTIFY_RATE_LIMIT={'max_retries': 1}), \
+            pytest.raises(SpotifyRateLimitError):
+        get_spotify_user_data('token-a')
+
+
+def test_parse_latency():
+    """Tests the latency distributions."""
+    assert parse_latency('fixed:250')(None) == 0.25
+    with pytest.raises(ValueError):
+        parse_latency('poisson:3')
@@ -1,12 +1,24 @@
 """Tests methods from spotify_data/utils."""
 
+import json
 import unittest
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch, Mock, MagicMock
 import pytest
+import requests
+from django.core.cache import cache
+from django.test import override_settings
 from groq import GroqError
-from ..utils import (get_spotify_user_data, get_user_favorite_artists, get_user_favorite_tracks,
-                     get_top_genres, get_quirkiest_artists,
-                     get_spotify_recommendations, create_groq_description)
+from spotify_data.utils import (get_spotify_user_data, get_user_favorite_artists,
+                                get_user_favorite_tracks, fetch_user_top_items,
+                                iter_user_top_items, summarize_user_top_artists,
+                                get_stale_terms, get_artists, apply_track_artist_genres,
+                                get_top_genres, get_quirkiest_artists,
+                                get_spotify_recommendations, create_groq_description,
+                                get_spotify_recommendations_batch, recommendation_seed_key,
+                                batch_prompt, parse_batch_response)
+from spotify_data.cache import TTLCache
 
 
 
@@ -19,7 +31,7 @@ from ..utils import (get_spotify_user_data, get_user_favorite_artists, get_user_
 def test_get_spotify_user_data(status_code, expected_result):
     """Tests that a user's profile can be retrieved."""
     access_token = 'valid_token'
-    with patch('requests.get') as mock_get:
+    with patch('spotify_data.client.get') as mock_get:
         mock_response = mock_get.return_value
         mock_response.status_code = status_code
         mock_response.json.return_value = {'id': '123',
@@ -37,7 +49,7 @@ def test_get_user_favorite_artists(status_code, expected_result):
     """Tests that a user's 20 favorites artists can be retrieved"""
     access_token = 'valid_token'
     timelimit = 'short_term'
-    with patch('requests.get') as mock_get:
+    with patch('spotify_data.client.get') as mock_get:
         mock_response = mock_get.return_value
         mock_response.status_code = status_code
         mock_response.json.return_value ={'items':
@@ -54,7 +66,7 @@ def test_get_user_favorite_tracks(status_code, expected_result):
     """Tests that a user's 20 favorite tracks can be retrieved."""
     access_token = 'valid_token'
     timelimit = 'short_term'
-    with patch('requests.get') as mock_get:
+    with patch('spotify_data.client.get') as mock_get:
         mock_response = mock_get.return_value
         mock_response.status_code = status_code
         mock_response.json.return_value = {
@@ -63,6 +75,140 @@ def test_get_user_favorite_tracks(status_code, expected_result):
         result = get_user_favorite_tracks(access_token, timelimit)
         assert result == expected_result
 
+def test_fetch_user_top_items_all_terms():
+    """Tests that tracks and artists are fetched for every term."""
+    artist = {'name': 'Artist', 'genres': ['pop'], 'popularity': 10}
+    with patch('spotify_data.utils.get_user_favorite_tracks',
+               side_effect=lambda token, term: [{'name': f'Track {term}'}]), \
+            patch('spotify_data.utils.iter_user_top_items', return_value=iter([artist])):
+        result = fetch_user_top_items('valid_token', terms=('short_term',))
+
+    assert result == {'short_term': {
+        'tracks': [{'name': 'Track short_term'}],
+        'artists': [artist],
+        'genres': ['pop'],
+        'quirkiest': [artist],
+        'errors': [],
+    }}
+
+
+def test_fetch_user_top_items_partial_failure():
+    """Tests that a failed request is reported against its own term only."""
+    def failing_artists(token, kind, term, depth=None):
+        if term == 'medium_term':
+            raise requests.exceptions.HTTPError("404 error fetching top artists")
+        if term == 'long_term':
+            raise requests.exceptions.Timeout("timed out")
+        return iter([{'name': 'Artist', 'genres': [], 'popularity': 1}])
+
+    with patch('spotify_data.utils.get_user_favorite_tracks', return_value=[{'name': 'Track'}]), \
+            patch('spotify_data.utils.iter_user_top_items', side_effect=failing_artists):
+        result = fetch_user_top_items('valid_token')
+
+    assert result['short_term']['errors'] == []
+    assert result['medium_term']['errors'] == ['artists: 404 error fetching top artists']
+    assert result['long_term']['errors'] == ['artists: timed out']
+    assert result['long_term']['artists'] is None
+    assert result['long_term']['tracks'] == [{'name': 'Track'}]
+
+
+def _page(items, has_next):
+    """Builds a mocked page of top items."""
+    response = Mock(status_code=200)
+    response.json.return_value = {'items': items, 'next': 'next-url' if has_next else None}
+    return response
+
+
+def test_iter_user_top_items_pages_until_depth():
+    """Tests that pages are requested with growing offsets and stop at the depth."""
+    pages = [_page([{'id': i} for i in range(50)], True),
+             _page([{'id': i} for i in range(50, 70)], True)]
+    with patch('spotify_data.client.get', side_effect=pages) as mock_get:
+        items = list(iter_user_top_items('valid_token', 'artists', 'short_term', depth=70))
+
+    assert [item['id'] for item in items] == list(range(70))
+    params = [call.kwargs['params'] for call in mock_get.call_args_list]
+    assert params == [{'time_range': 'short_term', 'limit': 50, 'offset': 0},
+                      {'time_range': 'short_term', 'limit': 20, 'offset': 50}]
+
+
+def test_iter_user_top_items_stops_on_last_page():
+    """Tests that the stream ends when Spotify reports no further pages."""
+    with patch('spotify_data.client.get',
+               return_value=_page([{'id': 1}, {'id': 2}], False)) as mock_get:
+        items = list(iter_user_top_items('valid_token', 'tracks', 'long_term', depth=100))
+
+    assert items == [{'id': 1}, {'id': 2}]
+    mock_get.assert_called_once()
+
+
+def test_summarize_user_top_artists_uses_full_depth():
+    """Tests that stats cover every streamed artist while only the first few are kept."""
+    artists = [{'name': f'Artist {i}', 'genres': ['pop'] if i < 3 else ['jazz'],
+                'popularity': 100 - i} for i in range(10)]
+    with patch('spotify_data.utils.iter_user_top_items', return_value=iter(artists)), \
+            override_settings(SPOTIFY_TOP_ITEMS_STORED=2):
+        result = summarize_user_top_artists('valid_token', 'short_term')
+
+    assert result['artists'] == artists[:2]
+    assert result['genres'] == ['jazz', 'pop']
+    assert [artist['name'] for artist in result['quirkiest']] == [
+        'Artist 9', 'Artist 8', 'Artist 7', 'Artist 6', 'Artist 5']
+
+def test_get_stale_terms_uses_per_term_ttl():
+    """Tests that each term goes stale after its own TTL."""
+    now = datetime(2024, 12, 1, 12, tzinfo=timezone.utc)
+    spotify_user = Mock(last_ingested_short=now - timedelta(hours=2),
+                        last_ingested_medium=now - timedelta(hours=2),
+                        last_ingested_long=None)
+    with override_settings(SPOTIFY_INGEST_TTL={'short_term': 3600, 'medium_term': 6 * 3600,
+                                               'long_term': 24 * 3600}):
+        assert get_stale_terms(spotify_user, now=now) == ('short_term', 'long_term')
+        assert get_stale_terms(None, now=now) == ('short_term', 'medium_term', 'long_term')
+
+
+def test_get_artists_batches_and_caches():
+    """Tests that artists are fetched 50 at a time and then served from the cache."""
+    cache.clear()
+    ids = [f'artist_{i}' for i in range(120)]
+
+    def fake_get(url, params=None, **kwargs):
+        response = Mock(status_code=200)
+        response.json.return_value = {'artists': [
+            {'id': artist_id, 'name': artist_id, 'genres': ['pop'], 'popularity': 5,
+             'external_urls': {}} for artist_id in params['ids'].split(',')]}
+        return response
+
+    with patch('spotify_data.client.get', side_effect=fake_get) as mock_get:
+        artists = get_artists('valid_token', ids)
+        assert [len(call.kwargs['params']['ids'].split(','))
+                for call in mock_get.call_args_list] == [50, 50, 20]
+        assert artists['artist_7'] == {'id': 'artist_7', 'name': 'artist_7',
+                                       'genres': ['pop'], 'popularity': 5}
+        mock_get.reset_mock()
+        assert get_artists('other_token', ids) == artists
+        mock_get.assert_not_called()
+    cache.clear()
+
+
+def test_apply_track_artist_genres():
+    """Tests that track artist genres are stored on the tracks and counted per term."""
+    results = {'short_term': {
+        'tracks': [{'name': 'A', 'artists': [{'id': 'x', 'name': 'X'}]},
+                   {'name': 'B', 'artists': [{'id': 'x', 'name': 'X'}]},
+                   {'name': 'C', 'artists': [{'id': 'unknown', 'name': 'U'}]}],
+        'genres': ['rock'], 'genre_counts': Counter({'rock': 1}), 'errors': []}}
+
+    apply_track_artist_genres(results, {'x': {'id': 'x', 'genres': ['jazz'], 'popularity': 3}})
+
+    term = results['short_term']
+    assert term['tracks'][0]['artists'][0] == {'id': 'x', 'name': 'X', 'genres': ['jazz'],
+                                               'popularity': 3}
+    assert term['tracks'][2]['artists'][0] == {'id': 'unknown', 'name': 'U'}
+    assert term['genres'] == ['jazz', 'rock']
+    assert 'genre_counts' not in term
+
+
 class NonAPIFunctions(unittest.TestCase):
     """
     Functions that do not rely on a JSON response from the API.
@@ -119,9 +265,10 @@ class NonAPIFunctions(unittest.TestCase):
         self.assertEqual(result, expected_output)
 
 
-@patch('spotify_data.utils.requests.get')
+@patch('spotify_data.client.get')
 def test_get_spotify_recommendations(mock_get):
     """Test fetching song recommendations using Spotify API."""
+    cache.clear()
     mock_user_token = "mock_access_token"
     seed_artists = ["artist_id_1"]
     mock_response_data = {'tracks':
@@ -152,6 +299,75 @@ def test_get_spotify_recommendations(mock_get):
     assert recommendations[0]["external_url"] == "http://example.com/song"
 
 
+def _recommendations_response(name):
+    """Builds a mocked recommendations response with one song."""
+    response = Mock(status_code=200)
+    response.json.return_value = {'tracks': [{
+        "id": name, "name": name, "artists": [{"name": "Artist"}], "album": {"name": "Album"},
+        "preview_url": None, "external_urls": {"spotify": "http://example.com/song"}}]}
+    return response
+
+
+@patch('spotify_data.client.get')
+def test_get_spotify_recommendations_cached_by_seed_set(mock_get):
+    """Test that the same seeds in another order are answered from the shared cache."""
+    cache.clear()
+    mock_get.return_value = _recommendations_response("Song 1")
+
+    first = get_spotify_recommendations("token_a", seed_artists=["a", "b"], seed_genres=["pop"])
+    second = get_spotify_recommendations("token_b", seed_artists=["b", "a"], seed_genres=["pop"])
+
+    assert first == second
+    mock_get.assert_called_once()
+    assert cache.get(recommendation_seed_key(["a", "b"], seed_genres=["pop"])) == first
+
+
+@patch('spotify_data.client.get')
+def test_get_spotify_recommendations_errors_not_cached(mock_get):
+    """Test that a failed request is retried on the next call."""
+    cache.clear()
+    mock_get.side_effect = [requests.exceptions.Timeout("timed out"),
+                            _recommendations_response("Song 1")]
+
+    assert not get_spotify_recommendations("token", seed_tracks=["t"])
+    assert get_spotify_recommendations("token", seed_tracks=["t"])[0]["name"] == "Song 1"
+
+
+@patch('spotify_data.client.get')
+def test_get_spotify_recommendations_batch(mock_get):
+    """Test that a batch requests each uncached seed set once, in input order."""
+    cache.clear()
+    mock_get.side_effect = lambda url, params=None, **kwargs: _recommendations_response(
+        params.get("seed_genres") or params.get("seed_artists"))
+    get_spotify_recommendations("token", seed_genres=["pop"])
+    mock_get.reset_mock()
+
+    results = get_spotify_recommendations_batch("token", [
+        {"seed_genres": ["rock"]},
+        {"seed_genres": ["pop"]},
+        {"seed_genres": ["rock"]},
+        {"seed_artists": ["x"]},
+    ])
+
+    assert [songs[0]["name"] for songs in results] == ["rock", "pop", "rock", "x"]
+    assert mock_get.call_count == 2
+
+
+def test_ttl_cache_expiry_and_lru_eviction():
+    """Test that entries expire after the TTL and the least recently used is evicted."""
+    now = [0]
+    ttl_cache = TTLCache(ttl=10, max_entries=2, clock=lambda: now[0])
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    assert ttl_cache.get("a") == 1
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+    now[0] = 11
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.stats()['evictions'] == 1
+
+
 
 def test_create_groq_description_returns_response():
     """Test that a response is successfully returned from the Groq API."""
@@ -164,7 +380,7 @@ def test_create_groq_description_returns_response():
     mock_response.choices[0].message.content = "Sample description."
 
     # Ensure the patch path matches exactly where Groq is imported in your code
-    with patch("spotify_data.utils.Groq") as MockGroq:
+    with patch("spotify_data.utils.get_groq_client") as MockGroq:
         mock_client = MockGroq.return_value
         mock_client.chat.completions.create.return_value = mock_response
 
@@ -190,7 +406,7 @@ def test_create_groq_description_key_error_handling():
     mock_groq_api_key = "mock_api_key"
     favorite_artists = ["Artist1", "Artist2"]
 
-    with patch("spotify_data.utils.Groq") as MockGroq:
+    with patch("spotify_data.utils.get_groq_client") as MockGroq:
         mock_client = MockGroq.return_value
         mock_client.chat.completions.create.side_effect = KeyError("choices")
 
@@ -204,7 +420,7 @@ def test_create_groq_description_general_exception_handling():
     mock_groq_api_key = "mock_api_key"
     favorite_artists = ["Artist1", "Artist2"]
 
-    with patch("spotify_data.utils.Groq") as MockGroq:
+    with patch("spotify_data.utils.get_groq_client") as MockGroq:
         mock_client = MockGroq.return_value
         mock_client.chat.completions.create.side_effect = Exception("API error")
 
@@ -223,10 +439,34 @@ def test_create_groq_description_varied_artist_list(favorite_artists):
     mock_response = MagicMock()
     mock_response.choices[0].message.content = "Sample description."
 
-    with patch("spotify_data.utils.Groq") as MockGroq:
+    with patch("spotify_data.utils.get_groq_client") as MockGroq:
         mock_client = MockGroq.return_value
         mock_client.chat.completions.create.return_value = mock_response
 
         llama_description = create_groq_description(mock_groq_api_key, favorite_artists)
 
         assert llama_description is not None, "Expected a response but got None."
+
+
+def test_batch_prompt_lists_each_request_by_key():
+    """Tests that a batch prompt is a JSON object of the per-item prompts."""
+    prompt = batch_prompt({'artists_0': ('description', ('Drake',)),
+                           'artists_1': ('comparison', ('Drake', 'Adele'))})
+    requests_by_key = json.loads(prompt)
+    assert set(requests_by_key) == {'artists_0', 'artists_1'}
+    assert 'Drake' in requests_by_key['artists_0']
+    assert 'Adele' in requests_by_key['artists_1']
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"a": "Roast A", "b": "Roast B"}', {'a': "Roast A", 'b': "Roast B"}),
+    ('Sure! {"a": " Roast A "} Enjoy.', {'a': "Roast A"}),
+    ('{"a": "Roast A", "b": ["not", "text"], "c": ""}', {'a': "Roast A"}),
+    ('{"a": "Roast A", "unexpected": "x"}', {'a': "Roast A"}),
+    ('{"a": "Roast A"', {}),
+    ('["Roast A"]', {}),
+    (None, {}),
+])
+def test_parse_batch_response(content, expected):
+    """Tests that only well-formed answers to requested keys are kept."""
+    assert parse_batch_response(content, ['a', 'b', 'c']) == expected
@@ -1,19 +1,24 @@
 """Unit tests for spotify_data/views (adding and updating users)."""
 
-from unittest.mock import patch, Mock, MagicMock
+from unittest.mock import patch, Mock, MagicMock, AsyncMock
+import asyncio
 import json
 from datetime import datetime
 import pytest
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.shortcuts import HttpResponse
+from django.test import override_settings
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 from accounts.models import SpotifyToken
 from spotify_data.views import update_or_add_spotify_user, add_spotify_wrapped, add_duo_wrapped
-from spotify_data.models import SpotifyUser, SpotifyWrapped
-
-from backend.spotify_data.views import display_artists, display_songs, display_genres
+from spotify_data.views import display_artists, display_songs, display_genres, display_quirky
+from spotify_data.views import stream_genres, stream_quirky
+from spotify_data.models import SpotifyUser, SpotifyWrapped, WrapSlides
+from spotify_data.ratelimit import SpotifyRateLimitError
+from spotify_data.roast_templates import description_roast
 
 
 def mock_getenv_side_effect(key):
@@ -93,9 +98,19 @@ def mock_request(mocker):
     """Fixture to mock the request object."""
     mock = mocker.Mock()
     mock.user = mocker.Mock()  # Mock user object
+    mock.auser = AsyncMock(return_value=mock.user)
     return mock
 
 
+@pytest.fixture
+def mock_slides():
+    """Fixture to skip generating and storing slide texts when a wrap is created."""
+    with patch('spotify_data.views.agenerate_slides', new_callable=AsyncMock,
+               return_value=({}, set())) as mock_generate, \
+            patch('spotify_data.views.astore_slides', new_callable=AsyncMock) as mock_store:
+        yield mock_generate, mock_store
+
+
 @pytest.fixture
 def session_id():
     """Instantiates test session id."""
@@ -126,14 +141,14 @@ def mock_user_data():
 @pytest.mark.django_db
 @patch('accounts.views.load_dotenv')
 @patch('accounts.views.os.getenv')
-def test_missing_access_token(request, user):
+def test_missing_access_token(mock_getenv, mock_load_dotenv, mock_request, user):
     """Test when access token does not exist."""
-    request.user = user
+    mock_request.auser.return_value = user
 
     # Patch the is_spotify_authenticated function
     with patch('accounts.views.is_spotify_authenticated', return_value=True), \
-            patch('accounts.models.SpotifyToken.objects.get', side_effect=ObjectDoesNotExist):
-        response = update_or_add_spotify_user(request)
+            patch('accounts.models.SpotifyToken.objects.aget', new_callable=AsyncMock, side_effect=ObjectDoesNotExist):
+        response = async_to_sync(update_or_add_spotify_user)(mock_request)
 
         assert response.status_code == 500  # Adjusted to match the expected behavior
         assert response.content == b'User add/update failed: missing access token'
@@ -188,32 +203,104 @@ def test_missing_access_token(request, user):
 
 @pytest.mark.django_db
 @patch('accounts.views.os.getenv')
-def test_failed_user_data_fetch(request, session_id, mock_token, user):
+def test_failed_user_data_fetch(mock_getenv, session_id, mock_token, user):
     """Test when fetching user data from Spotify fails."""
     # Create a mock request object
     request = Mock()
     request.session = Mock()
     request.session.session_key = session_id
-    request.user = user
+    request.auser = AsyncMock(return_value=user)
 
     token_entry = SpotifyToken(username=session_id, access_token=mock_token['access_token'],
                                expires_in=timezone.now() + timezone.timedelta(seconds=3600))
     SpotifyToken.objects.create(username=session_id, **mock_token)
 
     with patch('accounts.views.is_spotify_authenticated', return_value=True), \
-            patch('accounts.models.SpotifyToken.objects.get', return_value=token_entry), \
-            patch('spotify_data.views.get_spotify_user_data', return_value=None):
-        response = update_or_add_spotify_user(request)
+            patch('accounts.models.SpotifyToken.objects.aget', new_callable=AsyncMock, return_value=token_entry), \
+            patch('spotify_data.views.aget_spotify_user_data', return_value=None):
+        response = async_to_sync(update_or_add_spotify_user)(request)
         assert response.status_code == 500
         assert json.loads(response.content) == {'error': 'Could not fetch user data from Spotify'}
 
 
+@pytest.mark.django_db
+def test_rate_limited_user_data_fetch(mock_request, user):
+    """Test that a throttled Spotify answers 503 instead of storing a broken user."""
+    mock_request.auser.return_value = user
+    token_entry = Mock(access_token='test_access_token')
+
+    with patch('accounts.models.SpotifyToken.objects.aget', new_callable=AsyncMock,
+               return_value=token_entry), \
+            patch('spotify_data.views.aget_spotify_user_data', new_callable=AsyncMock,
+                  side_effect=SpotifyRateLimitError(4.2)), \
+            patch('spotify_data.views.SpotifyUser.objects.aupdate_or_create',
+                  new_callable=AsyncMock) as mock_update:
+        response = async_to_sync(update_or_add_spotify_user)(mock_request)
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '5'
+    mock_update.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_fresh_user_skips_spotify(mock_request, user):
+    """Test that a recently ingested user is returned from the database."""
+    mock_request.auser.return_value = user
+    mock_request.GET = {}
+    now = timezone.now()
+    SpotifyUser.objects.create(user=user, spotify_id='spotify_user_id',
+                               display_name=user.username, last_ingested_short=now,
+                               last_ingested_medium=now, last_ingested_long=now)
+
+    with patch('accounts.models.SpotifyToken.objects.aget', new_callable=AsyncMock,
+               return_value=Mock(access_token='test_access_token')), \
+            patch('spotify_data.views.aget_spotify_user_data',
+                  new_callable=AsyncMock) as mock_user_data:
+        response = async_to_sync(update_or_add_spotify_user)(mock_request)
+
+    assert response.status_code == 200
+    assert json.loads(response.content)['spotify_user']['spotify_id'] == 'spotify_user_id'
+    mock_user_data.assert_not_called()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("force, expected_terms", [
+    ({}, ('short_term',)),
+    ({'force': 'true'}, ('short_term', 'medium_term', 'long_term')),
+])
+def test_stale_terms_are_refetched(force, expected_terms, mock_request, user, mock_user_data):
+    """Test that only stale terms are refetched unless force is passed."""
+    mock_request.auser.return_value = user
+    mock_request.GET = force
+    now = timezone.now()
+    SpotifyUser.objects.create(user=user, spotify_id='spotify_user_id',
+                               display_name=user.username,
+                               last_ingested_short=now - timezone.timedelta(days=1),
+                               last_ingested_medium=now, last_ingested_long=now)
+    fetched = {term: {'tracks': ['track'], 'artists': ['artist'], 'genres': ['pop'],
+                      'quirkiest': ['artist'], 'errors': []} for term in expected_terms}
+
+    with patch('accounts.models.SpotifyToken.objects.aget', new_callable=AsyncMock,
+               return_value=Mock(access_token='test_access_token')), \
+            patch('spotify_data.views.aget_spotify_user_data', new_callable=AsyncMock,
+                  return_value=mock_user_data), \
+            patch('spotify_data.views.afetch_user_top_items', new_callable=AsyncMock,
+                  return_value=fetched) as mock_fetch:
+        response = async_to_sync(update_or_add_spotify_user)(mock_request)
 
+    assert response.status_code == 200
+    assert mock_fetch.call_args.kwargs['terms'] == expected_terms
+    spotify_user = SpotifyUser.objects.get(user=user)
+    assert spotify_user.favorite_tracks_short == ['track']
+    assert spotify_user.last_ingested_short > now - timezone.timedelta(minutes=1)
+
+
+@pytest.mark.usefixtures('mock_slides')
 @patch('spotify_data.views.SpotifyWrappedSerializer')  # Patch the serializer
-@patch('spotify_data.views.SpotifyUser.objects.get')  # Patch SpotifyUser retrieval
-@patch('spotify_data.views.SpotifyToken.objects.get')  # Patch SpotifyToken retrieval
-@patch('spotify_data.views.create_groq_description')  # Patch description generator
-@patch('spotify_data.views.SpotifyWrapped.objects.create')  # Patch object creation
+@patch('spotify_data.views.SpotifyUser.objects.aget', new_callable=AsyncMock)  # Patch SpotifyUser retrieval
+@patch('spotify_data.views.SpotifyToken.objects.aget', new_callable=AsyncMock)  # Patch SpotifyToken retrieval
+@patch('spotify_data.views.acreate_groq_description')  # Patch description generator
+@patch('spotify_data.views.SpotifyWrapped.objects.acreate', new_callable=AsyncMock)  # Patch object creation
 def test_add_spotify_wrapped_short_term(mock_create_wrapped,
                                         mock_create_description, mock_get_token,
                                         mock_get_user, mock_serializer):
@@ -228,7 +315,8 @@ def test_add_spotify_wrapped_short_term(mock_create_wrapped,
         favorite_tracks_short=["track1", "track2"],
         favorite_genres_short=["genre1", "genre2"],
         quirkiest_artists_short=["quirky_artist1"],
-        past_roasts=[]
+        past_roasts=[],
+        asave=AsyncMock()
     )
 
     # Mock token with access_token as a string
@@ -266,13 +354,14 @@ def test_add_spotify_wrapped_short_term(mock_create_wrapped,
 
     # Simulate the request
     mock_request = MagicMock()
+    mock_request.auser = AsyncMock(return_value=mock_user)
 
     mock_request.GET.get.return_value = '0'
 
     assert mock_request.GET.get('termselection') == '0'
 
     # Call the function
-    response = add_spotify_wrapped(mock_request)
+    response = async_to_sync(add_spotify_wrapped)(mock_request)
 
     # Assertions
     assert isinstance(response, JsonResponse)
@@ -295,11 +384,12 @@ def test_add_spotify_wrapped_short_term(mock_create_wrapped,
     assert response_data['spotify_wrapped'] == mock_serializer.return_value.data
 
 
+@pytest.mark.usefixtures('mock_slides')
 @patch('spotify_data.views.SpotifyWrappedSerializer')  # Patch the serializer
-@patch('spotify_data.views.SpotifyUser.objects.get')  # Patch SpotifyUser retrieval
-@patch('spotify_data.views.SpotifyToken.objects.get')  # Patch SpotifyToken retrieval
-@patch('spotify_data.views.create_groq_description')  # Patch description generator
-@patch('spotify_data.views.SpotifyWrapped.objects.create')  # Patch object creation
+@patch('spotify_data.views.SpotifyUser.objects.aget', new_callable=AsyncMock)  # Patch SpotifyUser retrieval
+@patch('spotify_data.views.SpotifyToken.objects.aget', new_callable=AsyncMock)  # Patch SpotifyToken retrieval
+@patch('spotify_data.views.acreate_groq_description')  # Patch description generator
+@patch('spotify_data.views.SpotifyWrapped.objects.acreate', new_callable=AsyncMock)  # Patch object creation
 def test_add_spotify_wrapped_medium_term(mock_create_wrapped,
                                         mock_create_description, mock_get_token,
                                         mock_get_user, mock_serializer):
@@ -314,7 +404,8 @@ def test_add_spotify_wrapped_medium_term(mock_create_wrapped,
         favorite_tracks_medium=["track1", "track2"],
         favorite_genres_medium=["genre1", "genre2"],
         quirkiest_artists_medium=["quirky_artist1"],
-        past_roasts=[]
+        past_roasts=[],
+        asave=AsyncMock()
     )
 
     # Mock token with access_token as a string
@@ -346,13 +437,14 @@ def test_add_spotify_wrapped_medium_term(mock_create_wrapped,
 
     # Simulate the request
     mock_request = MagicMock()
+    mock_request.auser = AsyncMock(return_value=mock_user)
 
     mock_request.GET.get.return_value = '1'
 
     assert mock_request.GET.get('termselection') == '1'
 
     # Call the function
-    response = add_spotify_wrapped(mock_request)
+    response = async_to_sync(add_spotify_wrapped)(mock_request)
 
     # Assertions
     assert isinstance(response, JsonResponse)
@@ -377,11 +469,12 @@ def test_add_spotify_wrapped_medium_term(mock_create_wrapped,
 
 
 
+@pytest.mark.usefixtures('mock_slides')
 @patch('spotify_data.views.SpotifyWrappedSerializer')  # Patch the serializer
-@patch('spotify_data.views.SpotifyUser.objects.get')  # Patch SpotifyUser retrieval
-@patch('spotify_data.views.SpotifyToken.objects.get')  # Patch SpotifyToken retrieval
-@patch('spotify_data.views.create_groq_description')  # Patch description generator
-@patch('spotify_data.views.SpotifyWrapped.objects.create')  # Patch object creation
+@patch('spotify_data.views.SpotifyUser.objects.aget', new_callable=AsyncMock)  # Patch SpotifyUser retrieval
+@patch('spotify_data.views.SpotifyToken.objects.aget', new_callable=AsyncMock)  # Patch SpotifyToken retrieval
+@patch('spotify_data.views.acreate_groq_description')  # Patch description generator
+@patch('spotify_data.views.SpotifyWrapped.objects.acreate', new_callable=AsyncMock)  # Patch object creation
 def test_add_spotify_wrapped_long_term(mock_create_wrapped,
                                         mock_create_description, mock_get_token,
                                         mock_get_user, mock_serializer):
@@ -396,7 +489,8 @@ def test_add_spotify_wrapped_long_term(mock_create_wrapped,
         favorite_tracks_long=["track1", "track2"],
         favorite_genres_long=["genre1", "genre2"],
         quirkiest_artists_long=["quirky_artist1"],
-        past_roasts=[]
+        past_roasts=[],
+        asave=AsyncMock()
     )
 
     # Mock token with access_token as a string
@@ -428,13 +522,14 @@ def test_add_spotify_wrapped_long_term(mock_create_wrapped,
 
     # Simulate the request
     mock_request = MagicMock()
+    mock_request.auser = AsyncMock(return_value=mock_user)
 
     mock_request.GET.get.return_value = '2'
 
     assert mock_request.GET.get('termselection') == '2'
 
     # Call the function
-    response = add_spotify_wrapped(mock_request)
+    response = async_to_sync(add_spotify_wrapped)(mock_request)
 
     # Assertions
     assert isinstance(response, JsonResponse)
@@ -457,10 +552,10 @@ def test_add_spotify_wrapped_long_term(mock_create_wrapped,
     assert response_data['spotify_wrapped'] == mock_serializer.return_value.data
 
 
-@patch('spotify_data.views.SpotifyUser.objects.get')
-@patch('spotify_data.views.SpotifyToken.objects.get')
-@patch('spotify_data.views.create_groq_description')
-@patch('spotify_data.views.SpotifyWrapped.objects.create')
+@patch('spotify_data.views.SpotifyUser.objects.aget', new_callable=AsyncMock)
+@patch('spotify_data.views.SpotifyToken.objects.aget', new_callable=AsyncMock)
+@patch('spotify_data.views.acreate_groq_description')
+@patch('spotify_data.views.SpotifyWrapped.objects.acreate', new_callable=AsyncMock)
 def test_add_spotify_wrapped_invalid_term(mock_create_wrapped,
                                           mock_create_description, mock_get_token,
                                           mock_get_user, mock_request, mock_spotify_user):
@@ -474,12 +569,12 @@ def test_add_spotify_wrapped_invalid_term(mock_create_wrapped,
     mock_create_description.return_value = "Generated description"
     mock_create_wrapped.return_value = Mock(spec=SpotifyWrapped)
 
-    response = add_spotify_wrapped(mock_request)
+    response = async_to_sync(add_spotify_wrapped)(mock_request)
 
     assert isinstance(response, HttpResponse)
     assert response.status_code == 400
     mock_create_wrapped.assert_not_called()
-    mock_spotify_user.save.assert_not_called()
+    mock_spotify_user.asave.assert_not_called()
 
 
 #     # Assertions
@@ -508,55 +603,102 @@ def test_add_spotify_wrapped_invalid_term(mock_create_wrapped,
 #     assert response_data['duo_wrapped'] == mock_serializer.return_value.data
 
 
-@patch('spotify_data.views.SpotifyUser.objects.get')
-@patch('spotify_data.views.DuoWrapped.objects.create')
+@patch('spotify_data.views.SpotifyUser.objects.aget', new_callable=AsyncMock)
+@patch('spotify_data.views.DuoWrapped.objects.acreate', new_callable=AsyncMock)
 def test_add_duo_wrapped_user_not_found(mock_create, mock_get, mock_request, mock_spotify_user):
     """
     Test proper exit for invalid user display name
     """
     mock_get.side_effect = [mock_spotify_user, SpotifyUser.DoesNotExist]
 
-    response = add_duo_wrapped(mock_request)
+    response = async_to_sync(add_duo_wrapped)(mock_request)
 
     assert isinstance(response, HttpResponse)
     assert response.status_code == 500
     mock_create.assert_not_called()
-    mock_spotify_user.save.assert_not_called()
+    mock_spotify_user.asave.assert_not_called()
 
 @pytest.mark.django_db
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock, return_value={})
+@patch("spotify_data.slides.acreate_groq_description", return_value="Generated description")
 @patch("spotify_data.models.DuoWrapped.objects.filter")
-def test_display_artists_duo(mock_filter, mock_request):
+def test_display_artists_duo(mock_filter, mock_create_description, mock_batch, mock_request):
     """
     Test display_artists with DuoWrapped data.
     """
     mock_request.GET.get.side_effect = lambda key: {"id": "1", "isDuo": "true"}.get(key)
-    mock_filter.return_value.values.return_value = [{"favorite_artists": [{"name": "Artist 1", "images": [{"url": "http://example.com/img.jpg"}]}]}]
+    mock_filter.return_value.values.return_value.afirst = AsyncMock(return_value={"favorite_artists": [{"name": "Artist 1", "images": [{"url": "http://example.com/img.jpg"}]}]})
 
-    response = display_artists(mock_request)
+    response = async_to_sync(display_artists)(mock_request)
     assert response.status_code == 200
-    assert response.json()[0]["name"] == "Artist 1"
+    assert json.loads(response.content)[0]["name"] == "Artist 1"
 
 @pytest.mark.django_db
-@patch("spotify_data.models.DuoWrapped.objects.create")
-@patch("spotify_data.models.SpotifyUser.objects.get")
-@patch("spotify_data.views.create_groq_description")
-def test_add_duo_wrapped_success(mock_create_description, mock_get_user, mock_create_duo, mock_request):
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock, return_value={})
+@patch("spotify_data.slides.acreate_groq_comparison", new_callable=AsyncMock)
+@patch("spotify_data.slides.acreate_groq_description", new_callable=AsyncMock)
+@patch("spotify_data.models.DuoWrapped.objects.filter")
+def test_display_songs_duo_generates_in_parallel(mock_filter, mock_create_description,
+                                                 mock_create_comparison, mock_batch,
+                                                 mock_request):
+    """
+    Test that display_songs compares each track with the next one, describes the last one,
+    and falls back per item when a generation misses the deadline.
+    """
+    mock_request.GET.get.side_effect = lambda key: {"id": "1", "isDuo": "true"}.get(key)
+    tracks = [{"name": f"Song {i}", "artists": [{"name": "Artist"}],
+               "album": {"images": [{"url": "http://example.com/img.jpg"}]}} for i in range(3)]
+    mock_filter.return_value.values.return_value.afirst = AsyncMock(
+        return_value={"favorite_tracks": tracks})
+
+    async def slow_comparison(key, first, second):
+        if first.startswith("Song 1"):
+            await asyncio.sleep(5)
+        return f"{first} vs {second}"
+    mock_create_comparison.side_effect = slow_comparison
+    mock_create_description.return_value = "Described"
+
+    with override_settings(LLM_DEADLINE=0.2):
+        response = async_to_sync(display_songs)(mock_request)
+
+    descs = [song["desc"] for song in json.loads(response.content)]
+    assert descs[0] == "Song 0 by Artist vs Song 1 by Artist"
+    assert "Song 1 by Artist" in descs[1] and "Song 2 by Artist" in descs[1]
+    assert descs[1] != "Song 1 by Artist vs Song 2 by Artist"
+    assert descs[2] == "Described"
+    mock_create_description.assert_called_once()
+
+
+@pytest.mark.usefixtures('mock_slides')
+@pytest.mark.django_db
+@patch("spotify_data.views.DuoWrappedSerializer")
+@patch("spotify_data.models.DuoWrapped.objects.acreate", new_callable=AsyncMock)
+@patch("spotify_data.models.SpotifyUser.objects.aget", new_callable=AsyncMock)
+@patch("spotify_data.views.acreate_groq_description")
+def test_add_duo_wrapped_success(mock_create_description, mock_get_user, mock_create_duo,
+                                 mock_serializer, mock_request):
     """
     Test successful creation of DuoWrapped data.
     """
     mock_request.GET.get.side_effect = lambda key: {"user1": "user1", "user2": "user2", "termselection": "0"}.get(key)
-    mock_get_user.side_effect = [Mock(favorite_artists_short=["artist1"]), Mock(favorite_artists_short=["artist2"])]
+    user_fields = ['favorite_artists_short', 'favorite_tracks_short',
+                   'favorite_genres_short', 'quirkiest_artists_short']
+    mock_get_user.side_effect = [
+        Mock(past_roasts=[], asave=AsyncMock(), **{f: ["a1", "a2", "a3"] for f in user_fields}),
+        Mock(past_roasts=[], asave=AsyncMock(), **{f: ["b1", "b2"] for f in user_fields}),
+    ]
     mock_create_description.return_value = "Generated description"
     mock_create_duo.return_value = Mock()
+    mock_serializer.return_value.data = {"id": 1}
 
-    response = add_duo_wrapped(mock_request)
+    response = async_to_sync(add_duo_wrapped)(mock_request)
     assert isinstance(response, JsonResponse)
     assert response.status_code == 200
-    assert "duo_wrapped" in response.json()
+    assert "duo_wrapped" in json.loads(response.content)
 
 
 @pytest.mark.django_db
-@patch("spotify_data.models.SpotifyUser.objects.get")
+@patch("spotify_data.models.SpotifyUser.objects.aget", new_callable=AsyncMock)
 def test_add_duo_wrapped_user2_not_found(mock_get_user, mock_request):
     """
     Test handling of user2 not found for DuoWrapped.
@@ -564,36 +706,40 @@ def test_add_duo_wrapped_user2_not_found(mock_get_user, mock_request):
     mock_request.GET.get.side_effect = lambda key: {"user1": "user1", "user2": "invalid_user", "termselection": "0"}.get(key)
     mock_get_user.side_effect = [Mock(), SpotifyUser.DoesNotExist]
 
-    response = add_duo_wrapped(mock_request)
+    response = async_to_sync(add_duo_wrapped)(mock_request)
     assert isinstance(response, HttpResponse)
     assert response.status_code == 500
     assert response.content == b"User display name not found"
 
 
 @pytest.mark.django_db
-@patch("spotify_data.models.DuoWrapped.objects.get")
-def test_display_genres_duo_success(mock_get_duo, mock_request):
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock, return_value={})
+@patch("spotify_data.slides.acreate_groq_description", return_value="Generated description")
+@patch("spotify_data.models.DuoWrapped.objects.filter")
+def test_display_genres_duo_success(mock_filter, mock_create_description, mock_batch,
+                                    mock_request):
     """
     Test display_genres with DuoWrapped data.
     """
     mock_request.GET.get.side_effect = lambda key: {"id": "1", "isDuo": "true"}.get(key)
-    mock_get_duo.return_value = Mock(favorite_genres=["Genre 1", "Genre 2"])
-    response = display_genres(mock_request)
+    mock_filter.return_value.values.return_value.afirst = AsyncMock(
+        return_value={"favorite_genres": ["Genre 1", "Genre 2"]})
+    response = async_to_sync(display_genres)(mock_request)
     assert response.status_code == 200
-    data = response.json()
+    data = json.loads(response.content)
     assert data["genres"] == "Genre 1, Genre 2"
     assert "desc" in data
 
 
 @pytest.mark.django_db
-@patch("spotify_data.models.DuoWrapped.objects.get")
-def test_display_genres_duo_no_data(mock_get_duo, mock_request):
+@patch("spotify_data.models.DuoWrapped.objects.filter")
+def test_display_genres_duo_no_data(mock_filter, mock_request):
     """
     Test display_genres with DuoWrapped data when no data is found.
     """
     mock_request.GET.get.side_effect = lambda key: {"id": "1", "isDuo": "true"}.get(key)
-    mock_get_duo.side_effect = ObjectDoesNotExist
-    response = display_genres(mock_request)
+    mock_filter.return_value.values.return_value.afirst = AsyncMock(return_value=None)
+    response = async_to_sync(display_genres)(mock_request)
     assert response.status_code == 500
     assert response.content == b"Wrapped grab failed: no data"
 
@@ -605,8 +751,126 @@ def test_display_genres_single_no_data(mock_filter, mock_request):
     Test display_genres with SpotifyWrapped data when no data is found.
     """
     mock_request.GET.get.side_effect = lambda key: {"id": "1", "isDuo": "false"}.get(key)
-    mock_filter.return_value.values.side_effect = ObjectDoesNotExist
-    response = display_genres(mock_request)
+    mock_filter.return_value.values.return_value.afirst = AsyncMock(return_value=None)
+    response = async_to_sync(display_genres)(mock_request)
     assert response.status_code == 500
     assert response.content == b"Wrapped grab failed: no data"
 
+
+
+def _wrap_fields():
+    """Returns the stored fields of a small wrap."""
+    return {
+        'favorite_artists': [{'name': f'Artist {i}', 'images': [{'url': 'http://img'}]}
+                             for i in range(2)],
+        'favorite_tracks': [{'name': 'Song', 'artists': [{'name': 'Artist 0'}],
+                             'album': {'images': [{'url': 'http://img'}]}}],
+        'favorite_genres': ['pop', 'rock'],
+        'quirkiest_artists': [{'name': 'Artist 1'}],
+    }
+
+
+@pytest.mark.django_db
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock, return_value={})
+@patch("spotify_data.slides.acreate_groq_quirky", new_callable=AsyncMock,
+       return_value="Quirky roast")
+@patch("spotify_data.slides.acreate_groq_description", new_callable=AsyncMock)
+@patch("spotify_data.views.acreate_groq_description", new_callable=AsyncMock,
+       return_value="Wrap description")
+def test_add_spotify_wrapped_precomputes_slides(mock_wrap_description, mock_create_description,
+                                                mock_create_quirky, mock_batch, mock_request,
+                                                user):
+    """
+    Test that creating a wrap stores every slide text, so displaying it calls no LLM.
+    """
+    mock_create_description.side_effect = lambda key, subject: f"About {subject}"
+    fields = _wrap_fields()
+    SpotifyUser.objects.create(user=user, spotify_id='spotify_user_id', display_name='testuser',
+                               **{f'{field}_short': value for field, value in fields.items()})
+    mock_request.auser.return_value = user
+    mock_request.GET = {'termselection': '0'}
+
+    response = async_to_sync(add_spotify_wrapped)(mock_request)
+    wrap_id = json.loads(response.content)['spotify_wrapped']['id']
+    slides = WrapSlides.objects.get(wrap_id=wrap_id, is_duo=False)
+    assert slides.artists == ["About Artist 0", "About Artist 1"]
+    assert slides.tracks == ["About Song by Artist 0"]
+    assert slides.genres == "About pop, rock"
+    assert slides.quirky == "Quirky roast"
+
+    mock_create_description.reset_mock()
+    mock_create_quirky.reset_mock()
+    mock_request.GET = {'id': str(wrap_id), 'isDuo': 'false'}
+    artists = json.loads(async_to_sync(display_artists)(mock_request).content)
+    assert [artist['desc'] for artist in artists] == ["About Artist 0", "About Artist 1"]
+    assert json.loads(async_to_sync(display_quirky)(mock_request).content) == "Quirky roast"
+    mock_create_description.assert_not_called()
+    mock_create_quirky.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("spotify_data.slides.acreate_groq_batch", new_callable=AsyncMock, return_value={})
+@patch("spotify_data.slides.acreate_groq_description", new_callable=AsyncMock,
+       return_value="Generated")
+def test_display_genres_backfills_missing_slides(mock_create_description, mock_batch,
+                                                 mock_request):
+    """
+    Test that a wrap created without slide texts gets them generated once, on first display.
+    """
+    wrapped = SpotifyWrapped.objects.create(user='testuser', **_wrap_fields())
+    mock_request.GET = {'id': str(wrapped.id), 'isDuo': 'false'}
+
+    for _ in range(2):
+        response = async_to_sync(display_genres)(mock_request)
+        assert json.loads(response.content)['desc'] == "Generated"
+    mock_create_description.assert_called_once()
+    assert WrapSlides.objects.get(wrap_id=wrapped.id).artists is None
+
+
+async def _read_stream(response):
+    """Returns the body of a streaming response."""
+    return ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+
+@pytest.mark.django_db
+def test_stream_quirky_streams_and_stores(mock_request):
+    """
+    Test that the quirky slide is streamed as server-sent events, then served from storage.
+    """
+    wrapped = SpotifyWrapped.objects.create(user='testuser', **_wrap_fields())
+    mock_request.GET = {'id': str(wrapped.id), 'isDuo': 'false'}
+
+    async def stream(key, names):
+        yield "Quirky "
+        yield "roast"
+
+    with patch("spotify_data.slides.astream_groq_quirky", side_effect=stream) as mock_stream:
+        response = async_to_sync(stream_quirky)(mock_request)
+        assert response['Content-Type'] == 'text/event-stream'
+        body = async_to_sync(_read_stream)(response)
+        stored = async_to_sync(_read_stream)(async_to_sync(stream_quirky)(mock_request))
+
+    assert body == 'data: "Quirky "\n\ndata: "roast"\n\nevent: done\ndata: {}\n\n'
+    assert stored == 'data: "Quirky roast"\n\nevent: done\ndata: {}\n\n'
+    mock_stream.assert_called_once()
+    assert WrapSlides.objects.get(wrap_id=wrapped.id).quirky == "Quirky roast"
+
+
+@pytest.mark.django_db
+def test_stream_genres_falls_back_on_error(mock_request):
+    """
+    Test that a stream failing before any text sends the template roast and stores nothing.
+    """
+    wrapped = SpotifyWrapped.objects.create(user='testuser', **_wrap_fields())
+    mock_request.GET = {'id': str(wrapped.id), 'isDuo': 'false'}
+
+    async def stream(key, genres):
+        raise Exception("down")
+        yield  # pylint: disable=unreachable
+
+    with patch("spotify_data.slides.astream_groq_description", side_effect=stream):
+        body = async_to_sync(_read_stream)(async_to_sync(stream_genres)(mock_request))
+
+    assert body.startswith('event: genres\ndata: "pop, rock"\n\ndata: ')
+    assert json.dumps(description_roast("pop, rock")) in body
+    assert not WrapSlides.objects.filter(wrap_id=wrapped.id).exists()
@@ -5,7 +5,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import SongViewSet, update_or_add_spotify_user, add_spotify_wrapped, add_duo_wrapped
 from .views import display_artists, display_genres, display_songs, display_quirky, display_summary
-from .views import display_history, check_username_exists
+from .views import display_history, check_username_exists, stream_genres, stream_quirky
+from .views import display_llm_metrics
 
 router = DefaultRouter()
 router.register(r'songs', SongViewSet)
@@ -18,9 +19,12 @@ urlpatterns = [
     path('addduo/', add_duo_wrapped, name='add_duo_wrapped'),
     path('displayartists', display_artists, name='display_artists'),
     path('displaygenres', display_genres, name='display_genres'),
+    path('displaygenres/stream', stream_genres, name='stream_genres'),
     path('displaytracks', display_songs, name='display_songs'),
     path('displayquirky', display_quirky, name='display_quirky'),
+    path('displayquirky/stream', stream_quirky, name='stream_quirky'),
     path('displaysummary', display_summary, name='display_summary'),
     path('displayhistory', display_history, name='display_history'),
+    path('llmmetrics', display_llm_metrics, name='display_llm_metrics'),
     path('checkusername', check_username_exists, name='check_username_exists')
 ]
@@ -2,10 +2,57 @@
 Utils used in spotify_data/views.
 """
 
+import hashlib
+import heapq
+import json
 from collections import Counter
-from datetime import datetime
-from groq import Groq,  GroqError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from groq import GroqError
 import requests
+from . import client as spotify_client
+from . import llm_cache
+from .llm_breaker import get_llm_breaker, llm_call_timeout
+from .llm_clients import get_groq_client
+from .llm_hedging import model_api_key, primary_model
+from .llm_metrics import LLMCallTimer, record_llm_call
+from .prompts import (ROAST_SYSTEM_PROMPT, COMPARISON_SYSTEM_PROMPT, description_prompt,
+                      quirky_prompt, comparison_prompt)
+from .projections import PROJECTIONS, project_artist
+from .ratelimit import SpotifyRateLimitError
+from .roast_templates import description_roast, quirky_roast, comparison_roast
+
+TERMS = ('short_term', 'medium_term', 'long_term')
+
+TOP_ITEMS_PAGE_SIZE = 50  # the most items Spotify returns per page
+DEFAULT_TOP_ITEMS_DEPTH = 100
+DEFAULT_TOP_ITEMS_STORED = 20
+
+DEFAULT_RECOMMENDATIONS_CACHE = {
+    'ttl': 6 * 60 * 60,
+}
+RECOMMENDATIONS_CACHE_PREFIX = 'spotify_recommendations'
+
+ARTISTS_BATCH_SIZE = 50  # the most ids /v1/artists accepts per request
+DEFAULT_ARTIST_CACHE_TTL = 24 * 60 * 60
+ARTIST_CACHE_PREFIX = 'spotify_artist'
+
+# Seconds before a term's stored top items are refetched (short term changes fastest)
+DEFAULT_INGEST_TTL = {
+    'short_term': 60 * 60,
+    'medium_term': 6 * 60 * 60,
+    'long_term': 24 * 60 * 60,
+}
+
+# Maps Spotify time ranges onto the SpotifyUser field suffixes
+TERM_SUFFIXES = {
+    'short_term': 'short',
+    'medium_term': 'medium',
+    'long_term': 'long',
+}
 
 def get_spotify_user_data(access_token):
     """
@@ -23,10 +70,71 @@ def get_spotify_user_data(access_token):
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json'
     }
-    response = requests.get('https://api.spotify.com/v1/me', headers=headers, timeout=5)
+    response = spotify_client.get(spotify_client.api_url('/v1/me'), headers=headers, timeout=5)
     return response.json() if response.status_code == 200 else None
 
-def get_user_favorite_tracks(access_token, timelimit):
+def top_items_depth():
+    """
+    Returns how many top artists are streamed per term to compute genre and
+    quirkiness stats (SPOTIFY_TOP_ITEMS_DEPTH).
+    """
+    return getattr(settings, 'SPOTIFY_TOP_ITEMS_DEPTH', DEFAULT_TOP_ITEMS_DEPTH)
+
+def top_items_stored():
+    """
+    Returns how many top tracks and artists are kept per term (SPOTIFY_TOP_ITEMS_STORED).
+    """
+    return getattr(settings, 'SPOTIFY_TOP_ITEMS_STORED', DEFAULT_TOP_ITEMS_STORED)
+
+def top_items_page_params(timelimit, offset, depth):
+    """
+    Returns the query parameters for the page of top items starting at offset.
+    """
+    return {
+        'time_range': timelimit,
+        'limit': min(TOP_ITEMS_PAGE_SIZE, depth - offset),
+        'offset': offset
+    }
+
+def iter_user_top_items(access_token, kind, timelimit, depth=None):
+    """
+    Yields the user's favorite tracks or artists one at a time, requesting them from
+    Spotify a page (up to 50 items) at a time, so only one page is held in memory.
+    Items are projected down to the fields we store (see spotify_data/projections.py).
+
+    Parameters:
+        - access_token: the access token associated with the current session
+        - kind: 'tracks' or 'artists'
+        - timelimit: the desired term
+        - depth: the most items to yield (defaults to SPOTIFY_TOP_ITEMS_DEPTH)
+
+    Raises:
+        requests.exceptions.HTTPError if the first page cannot be fetched.
+        A failure on a later page ends the stream early instead.
+    """
+    depth = top_items_depth() if depth is None else depth
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+    offset = 0
+    while offset < depth:
+        response = spotify_client.get(spotify_client.api_url(f'/v1/me/top/{kind}'),
+                                      headers=headers,
+                                      params=top_items_page_params(timelimit, offset, depth),
+                                      timeout=5)
+        if response.status_code != 200:
+            if offset == 0:
+                raise requests.exceptions.HTTPError(
+                    f"{response.status_code} error fetching top {kind}", response=response)
+            return
+        page = response.json()
+        yield from map(PROJECTIONS[kind], page['items'])
+        offset += len(page['items'])
+        if not page['items'] or not page.get('next'):
+            return
+
+def get_user_favorite_tracks(access_token, timelimit, depth=None):
     """
     Returns a list of 20 user favorite tracks over one of three time periods:
     - short-term: 4 weeks
@@ -36,25 +144,18 @@ def get_user_favorite_tracks(access_token, timelimit):
     Parameters:
         - access_token: the access token associated with the current session
         - timelimit: the desired term
+        - depth: how many tracks to return (defaults to SPOTIFY_TOP_ITEMS_STORED)
 
     Returns:
         JSON response containing user favorite tracks
     """
+    depth = top_items_stored() if depth is None else depth
+    try:
+        return list(iter_user_top_items(access_token, 'tracks', timelimit, depth))
+    except requests.exceptions.HTTPError:
+        return None
 
-    # Fetch the user's data from Spotify API
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    params = {
-        'time_range': timelimit,
-        'limit': 20
-    }
-    response = requests.get('https://api.spotify.com/v1/me/top/tracks',
-                            headers=headers, params=params, timeout=5)
-    return response.json()['items'] if response.status_code == 200 else None
-
-def get_user_favorite_artists(access_token, timelimit):
+def get_user_favorite_artists(access_token, timelimit, depth=None):
     """
     Returns a list of 20 user favorite artists over one of three time periods:
     - short-term: 4 weeks
@@ -64,43 +165,271 @@ def get_user_favorite_artists(access_token, timelimit):
     Parameters:
         - access_token: the access token associated with the current session
         - timelimit: the desired term
+        - depth: how many artists to return (defaults to SPOTIFY_TOP_ITEMS_STORED)
 
     Returns:
         JSON response containing user favorite artists
     """
+    depth = top_items_stored() if depth is None else depth
+    try:
+        return list(iter_user_top_items(access_token, 'artists', timelimit, depth))
+    except requests.exceptions.HTTPError:
+        return None
 
-    # Fetch the user's data from Spotify API
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    params = {
-        'time_range': timelimit,
-        'limit': 20
-    }
-    response = requests.get('https://api.spotify.com/v1/me/top/artists',
-                            headers=headers, params=params, timeout=5)
-    return response.json()['items'] if response.status_code == 200 else None
+def most_common_genres(genre_counts):
+    """
+    Returns the 3 most common genres of a Counter of genres.
+    """
+    return [genre for genre, count in genre_counts.most_common(3)]
 
+class TopArtistsSummary:
+    """
+    Collects everything we store about a term's favorite artists while they stream in,
+    one artist at a time, without keeping the whole stream in memory.
 
-def get_top_genres(favorite_artists):
+    Attributes:
+        - artists: the first `keep` artists, in Spotify's order
+        - genre_counts: how often each genre appears across every artist seen
+        - quirkiest: the 5 least popular artists seen so far
+    """
+    def __init__(self, keep=None):
+        self.keep = top_items_stored() if keep is None else keep
+        self.artists = []
+        self.genre_counts = Counter()
+        self.quirkiest = []
+
+    def add(self, artist):
+        """
+        Adds one artist from the stream.
+        """
+        if len(self.artists) < self.keep:
+            self.artists.append(artist)
+        self.genre_counts.update(artist['genres'])
+        self.quirkiest = get_quirkiest_artists(self.quirkiest + [artist])
+
+    def result(self):
+        """
+        Returns {'artists': list, 'genres': top 3 genres, 'quirkiest': 5 quirkiest artists}.
+        Also returns 'genre_counts', which fetch_user_top_items adds the genres of
+        track artists to before dropping it.
+        """
+        return {
+            'artists': self.artists,
+            'genres': most_common_genres(self.genre_counts),
+            'genre_counts': self.genre_counts,
+            'quirkiest': self.quirkiest,
+        }
+
+def summarize_user_top_artists(access_token, timelimit, depth=None):
     """
-    Extracts genres from a list of favorite artists and returns the top 3 genres.
+    Streams the user's top artists for a term and summarizes them in one pass.
+    Genre and quirkiness stats cover the full depth; only the first
+    SPOTIFY_TOP_ITEMS_STORED artists are kept.
+
+    Returns:
+        Dictionary from TopArtistsSummary.result()
+    """
+    summary = TopArtistsSummary()
+    for artist in iter_user_top_items(access_token, 'artists', timelimit, depth):
+        summary.add(artist)
+    return summary.result()
+
+def fetch_user_top_items(access_token, terms=TERMS, max_workers=6):
+    """
+    Fetches favorite tracks and artists for every term concurrently, so a refresh
+    takes about as long as the slowest single request instead of the sum of all of them.
 
     Parameters:
-        favorite_artists: List of favorite artists from Spotify API containing their genre info.
+        - access_token: the access token associated with the current session
+        - terms: the terms to fetch (defaults to short, medium and long term)
+        - max_workers: upper bound on the number of simultaneous requests
 
     Returns:
-        List of the top 3 genres.
+        Dictionary mapping each term to
+        {'tracks': list, 'artists': list, 'genres': list, 'quirkiest': list, 'errors': list}.
+        A failed request leaves its lists as None and adds a message to that term's errors.
+    """
+    results = {term: {'tracks': None, 'artists': None, 'genres': None, 'quirkiest': None,
+                      'errors': []}
+               for term in terms}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for term in terms:
+            futures[executor.submit(get_user_favorite_tracks, access_token, term)] = (
+                term, 'tracks')
+            futures[executor.submit(summarize_user_top_artists, access_token, term)] = (
+                term, 'artists')
+        for future in as_completed(futures):
+            term, kind = futures[future]
+            try:
+                items = future.result()
+            except (requests.exceptions.RequestException, SpotifyRateLimitError) as e:
+                results[term]['errors'].append(f"{kind}: {str(e)}")
+                continue
+            if kind == 'artists':
+                results[term].update(items)
+            elif items is None:
+                results[term]['errors'].append("tracks: request failed")
+            else:
+                results[term]['tracks'] = items
+
+    artists = get_artists(access_token, track_artist_ids(results))
+    apply_track_artist_genres(results, artists)
+    return results
+
+
+def artist_cache_key(artist_id):
     """
-    genres = []
+    Returns the cache key of an artist looked up through /v1/artists.
+    """
+    return f'{ARTIST_CACHE_PREFIX}:{artist_id}'
 
-    # Extract genres from each artist
-    for artist in favorite_artists:
-        genres.extend(artist['genres'])
+def artist_cache_ttl():
+    """
+    Returns how many seconds looked up artists stay cached (SPOTIFY_ARTIST_CACHE_TTL).
+    """
+    return getattr(settings, 'SPOTIFY_ARTIST_CACHE_TTL', DEFAULT_ARTIST_CACHE_TTL)
+
+def track_artist_ids(results):
+    """
+    Returns the unique ids of the artists credited on the tracks of every term,
+    in the order they first appear.
+    """
+    ids = {}
+    for term_result in results.values():
+        for track in term_result['tracks'] or []:
+            for artist in track.get('artists', []):
+                if artist.get('id'):
+                    ids[artist['id']] = True
+    return list(ids)
+
+def get_cached_artists(artist_ids):
+    """
+    Looks artists up in the cache shared by every user.
+
+    Returns:
+        Tuple of ({artist id: artist} for the cached ones, list of the missing ids)
+    """
+    cached = cache.get_many([artist_cache_key(artist_id) for artist_id in artist_ids])
+    artists = {artist_id: cached[artist_cache_key(artist_id)]
+               for artist_id in artist_ids if artist_cache_key(artist_id) in cached}
+    return artists, [artist_id for artist_id in artist_ids if artist_id not in artists]
 
+def artist_batches(artist_ids):
+    """
+    Splits artist ids into the comma-separated batches /v1/artists accepts.
+    """
+    return [','.join(artist_ids[i:i + ARTISTS_BATCH_SIZE])
+            for i in range(0, len(artist_ids), ARTISTS_BATCH_SIZE)]
+
+def cacheable_artists(response_json):
+    """
+    Projects the artists of a /v1/artists response into {artist id: artist}.
+    Unknown ids come back as null and are skipped.
+    """
+    return {artist['id']: project_artist(artist)
+            for artist in response_json.get('artists', []) if artist}
+
+def get_artists(access_token, artist_ids):
+    """
+    Returns full artist objects (with genres and popularity) for the given ids.
+    Artists are cached by id for every user, and the missing ones are requested
+    50 at a time, so enriching a user usually costs one or two requests.
+
+    Parameters:
+        - access_token: the access token associated with the current session
+        - artist_ids: list of Spotify artist ids
+
+    Returns:
+        Dictionary mapping artist id to artist. Enrichment is best effort: ids that could
+        not be fetched are left out.
+    """
+    artists, missing = get_cached_artists(artist_ids)
+    headers = {'Authorization': f'Bearer {access_token}'}
+    for batch in artist_batches(missing):
+        try:
+            response = spotify_client.get(spotify_client.api_url('/v1/artists'),
+                                          headers=headers, params={'ids': batch}, timeout=5)
+        except (requests.exceptions.RequestException, SpotifyRateLimitError):
+            break
+        if response.status_code != 200:
+            break
+        fetched = cacheable_artists(response.json())
+        cache.set_many({artist_cache_key(artist_id): artist
+                        for artist_id, artist in fetched.items()}, timeout=artist_cache_ttl())
+        artists.update(fetched)
+    return artists
+
+def apply_track_artist_genres(results, artists):
+    """
+    Adds genres and popularity to the artists credited on each term's tracks, and adds
+    their genres to the term's genre stats (once per track).
+
+    Parameters:
+        - results: fetch_user_top_items results, whose 'genre_counts' are consumed
+        - artists: dictionary mapping artist id to artist, from get_artists
+    """
+    for term_result in results.values():
+        genre_counts = term_result.pop('genre_counts', None)
+        for track in term_result['tracks'] or []:
+            for artist in track.get('artists', []):
+                enriched = artists.get(artist.get('id'))
+                if enriched is None:
+                    continue
+                artist['genres'] = enriched.get('genres', [])
+                artist['popularity'] = enriched.get('popularity')
+                if genre_counts is not None:
+                    genre_counts.update(artist['genres'])
+        if genre_counts is not None:
+            term_result['genres'] = most_common_genres(genre_counts)
+
+
+def ingest_ttl(term):
+    """
+    Returns how long a term's top items stay fresh, from SPOTIFY_INGEST_TTL.
+    """
+    ttls = {**DEFAULT_INGEST_TTL, **getattr(settings, 'SPOTIFY_INGEST_TTL', {})}
+    return timedelta(seconds=ttls[term])
+
+def get_stale_terms(spotify_user, terms=TERMS, now=None):
+    """
+    Returns the terms whose top items need to be fetched from Spotify again.
+
+    Parameters:
+        - spotify_user: the stored SpotifyUser, or None if the user has never been ingested
+        - terms: the terms to check (defaults to short, medium and long term)
+        - now: the current time (defaults to timezone.now())
+
+    Returns:
+        Tuple of the terms that were never ingested or are older than their TTL
+    """
+    if spotify_user is None:
+        return tuple(terms)
+    now = timezone.now() if now is None else now
+    stale = []
+    for term in terms:
+        ingested = getattr(spotify_user, f'last_ingested_{TERM_SUFFIXES[term]}')
+        if ingested is None or now - ingested >= ingest_ttl(term):
+            stale.append(term)
+    return tuple(stale)
+
+
+def get_top_genres(favorite_artists):
+    """
+    Extracts genres from favorite artists and returns the top 3 genres.
+
+    Parameters:
+        favorite_artists: List (or any iterable, consumed one artist at a time) of
+        favorite artists from Spotify API containing their genre info.
+
+    Returns:
+        List of the top 3 genres.
+    """
     # Count the occurrences of each genre
-    genre_counts = Counter(genres)
+    genre_counts = Counter()
+    for artist in favorite_artists:
+        genre_counts.update(artist['genres'])
 
     # Get the top 3 genres
     top_genres = genre_counts.most_common(3)
@@ -113,81 +442,186 @@ def get_quirkiest_artists(favorite_artists):
     Returns the 5 quirkiest artists based on their popularity scores.
 
     Parameters:
-        - favorite_artists: a list of favorite artists
+        - favorite_artists: a list (or any iterable) of favorite artists
                 (dictionaries with 'id', 'name', and 'popularity')
 
     Returns:
         A list of the 5 quirkiest artists based on popularity scores.
     """
-    # Sort the artists by popularity (lower scores are quirkier)
-    sorted_artists = sorted(favorite_artists, key=lambda x: x['popularity'])
+    # Keep the 5 lowest popularity scores (lower scores are quirkier) without sorting
+    # the whole stream; ties keep their original order like sorted() would
+    return heapq.nsmallest(5, favorite_artists, key=lambda x: x['popularity'])
 
-    # Return the top 5 quirkiest artists
-    return sorted_artists[:5]
+DEFAULT_LLM_CONCURRENCY = 5
+DEFAULT_LLM_DEADLINE = 8  # seconds
 
-def create_groq_description(groq_api_key, favorite_artists):
+def llm_concurrency():
     """
-    Create a description of user tastes/ lifestyle based on favorite artists
+    Returns how many LLM calls one request may run at once (LLM_CONCURRENCY).
+    """
+    return getattr(settings, 'LLM_CONCURRENCY', DEFAULT_LLM_CONCURRENCY)
 
-    Args:
-        - favorite_artists: List of favorite artists
-        (dictionaries with 'id', 'name', and 'popularity')
+def llm_deadline():
+    """
+    Returns how many seconds one request waits for its LLM calls (LLM_DEADLINE).
+    """
+    return getattr(settings, 'LLM_DEADLINE', DEFAULT_LLM_DEADLINE)
+
+# Prompts of each kind of generated text, by the function name used in the LLM cache stats
+ITEM_PROMPTS = {
+    'description': (ROAST_SYSTEM_PROMPT, description_prompt),
+    'quirky': (ROAST_SYSTEM_PROMPT, quirky_prompt),
+    'comparison': (COMPARISON_SYSTEM_PROMPT, comparison_prompt),
+}
+
+BATCH_SYSTEM_PROMPT = ("You are a music critic who roasts people and artists "
+                       "(use 2nd perspective). Be witty and sarcastic. You are given a JSON "
+                       "object of requests. Answer each request in less than 100 words and "
+                       "reply with only a JSON object mapping every key of the requests to "
+                       "its answer as a string.")
+
+def item_prompts(function, args):
+    """
+    Returns the (system prompt, user prompt) of one generated text.
+
+    Parameters:
+        - function: 'description', 'quirky' or 'comparison'
+        - args: arguments of the matching prompt builder, e.g. (artist_1, artist_2)
+    """
+    system_prompt, build_prompt = ITEM_PROMPTS[function]
+    return system_prompt, build_prompt(*args)
+
+def batch_prompt(items):
+    """
+    Builds the user prompt asking for several texts at once.
+
+    Parameters:
+        - items: dictionary mapping each key to a (function, args) tuple
 
     Returns:
-        - llama_description: the description construced by the LLM
+        JSON object mapping each key to its request
+    """
+    return json.dumps({key: item_prompts(function, args)[1]
+                       for key, (function, args) in items.items()})
 
+def parse_batch_response(content, keys):
+    """
+    Splits the reply to a batch prompt into one text per key.
+
+    Parameters:
+        - content: the generated reply, expected to be a JSON object
+        - keys: the keys that were requested
+
+    Returns:
+        Dictionary with the keys that have a non-empty string answer; missing and
+        malformed answers are left out
+    """
+    try:
+        answers = json.loads(content[content.index('{'):content.rindex('}') + 1])
+    except (AttributeError, ValueError):
+        return {}
+    if not isinstance(answers, dict):
+        return {}
+    return {key: answers[key].strip() for key in keys
+            if isinstance(answers.get(key), str) and answers[key].strip()}
+
+def groq_messages(system_prompt, user_prompt):
+    """
+    Returns the chat messages sent to Groq for a system prompt and a user prompt.
+    """
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": user_prompt
+        }
+    ]
+
+def _groq_chat(groq_api_key, system_prompt, user_prompt, function, template):
+    """
+    Sends one chat completion to Groq and returns the generated text.
+    Completions are served from and saved to the LLM cache (see llm_cache.py), calls
+    go through the LLM circuit breaker (see llm_breaker.py), and every call is recorded
+    for latency and token accounting (see llm_metrics.py). Calls go to the primary model
+    of the model registry; only async calls are hedged (see llm_hedging.py).
+
+    Args:
+        - groq_api_key: API key for Groq
+        - system_prompt: instructions for the model
+        - user_prompt: the question to answer
+        - function: name of the calling function, for the cache stats
+        - template: template roast returned if the call fails, times out or is skipped
+
+    Returns:
+        - the text generated by the LLM, or the template roast
     """
     if not groq_api_key:
         raise GroqError("GROQ_API_KEY environment variable is not set.")
 
-    client = Groq(api_key=groq_api_key)
-    description_prompt = (
-        f"Describe how someone who listens to artists like {favorite_artists} "
-        "tends to act, think, and dress."
-    )
+    use_cache = llm_cache.llm_cache_enabled()
+    model = primary_model()
+    key = llm_cache.completion_key(model['model'], system_prompt, user_prompt)
+    timer = LLMCallTimer(function, model['model'], key, system_prompt + user_prompt)
+    if use_cache:
+        cached = llm_cache.get_cached_completion(function, key)
+        if cached is not None:
+            record_llm_call(timer.finish('ok', 'hit'))
+            return cached
+    cache_status = 'miss' if use_cache else 'off'
+
+    breaker = get_llm_breaker()
+    if not breaker.allow():
+        record_llm_call(timer.finish('rejected', cache_status))
+        return template
+    client = get_groq_client(model_api_key(model, groq_api_key), model['base_url'])
 
     try:
         response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a music analyst who roasts and insults the user "
-                               "(use 2nd perspective) behavior based on their music tastes"
-                               " in less than 100 words."
-                },
-                {
-                    "role": "user",
-                    "content": description_prompt
-                }
-            ],
-            model="llama3-8b-8192",
+            messages=groq_messages(system_prompt, user_prompt),
+            model=model['model'],
+            timeout=llm_call_timeout(),
         )
 
         llama_description = response.choices[0].message.content
-    except KeyError as e:
-        llama_description = f"Key error: {str(e)}"
-    except Exception as e:
-        llama_description = f"Description unavailable due to API error: {str(e)}"  # pylint: disable=broad-exception-caught
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        breaker.record_failure()
+        record_llm_call(timer.finish('error', cache_status))
+        print(f"Groq {function} failed, serving a template roast: {e}")
+        return template
+    breaker.record_success()
+    record_llm_call(timer.finish('ok', cache_status, getattr(response, 'usage', None),
+                                 llama_description or ''))
+    if use_cache and llama_description:
+        llm_cache.store_completion(function, key, model['model'], llama_description)
     return llama_description
 
+def create_groq_description(groq_api_key, favorite_artists):
+    """
+    Create a description of user tastes/ lifestyle based on favorite artists
 
-SPOTIFY_RECOMMENDATIONS_URL = "https://api.spotify.com/v1/recommendations"
+    Args:
+        - favorite_artists: List of favorite artists
+        (dictionaries with 'id', 'name', and 'popularity')
+
+    Returns:
+        - llama_description: the description construced by the LLM
 
-def get_spotify_recommendations(user_token, seed_artists=None,
-                                seed_tracks=None, seed_genres=None):
     """
-    Fetches a list of recommended songs from Spotify based on provided seeds and target attributes.
+    return _groq_chat(groq_api_key, ROAST_SYSTEM_PROMPT,
+                      description_prompt(favorite_artists), 'description',
+                      description_roast(favorite_artists))
 
-    Args:
-        user_token (str): The Spotify access token for the user.
-        seed_artists (list of str): List of Spotify artist IDs to base recommendations on.
-        seed_tracks (list of str): List of Spotify track IDs to base recommendations on.
-        seed_genres (list of str): List of genres to base recommendations on.
 
+def _fetch_spotify_recommendations(user_token, seed_artists=None,
+                                   seed_tracks=None, seed_genres=None):
+    """
+    Requests recommendations from Spotify, bypassing the cache.
 
     Returns:
-        list: A list of recommended songs, where each song
-        is represented as a dictionary with details.
+        list of recommended songs, or None if the request failed
     """
     headers = {
         "Authorization": f"Bearer {user_token}"
@@ -205,8 +639,8 @@ def get_spotify_recommendations(user_token, seed_artists=None,
 
 
     try:
-        response = requests.get(SPOTIFY_RECOMMENDATIONS_URL,
-                                headers=headers, params=params, timeout=5)
+        response = spotify_client.get(spotify_client.api_url('/v1/recommendations'),
+                                      headers=headers, params=params, timeout=5)
         response.raise_for_status()
         data = response.json()['tracks']
 
@@ -223,9 +657,88 @@ def get_spotify_recommendations(user_token, seed_artists=None,
         ]
         return recommended_songs
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, SpotifyRateLimitError) as e:
         print(f"Error fetching recommendations: {e}")
-        return []
+        return None
+
+def recommendations_cache_ttl():
+    """
+    Returns how many seconds recommendations stay cached (SPOTIFY_RECOMMENDATIONS_CACHE).
+    """
+    return {**DEFAULT_RECOMMENDATIONS_CACHE,
+            **getattr(settings, 'SPOTIFY_RECOMMENDATIONS_CACHE', {})}['ttl']
+
+def recommendation_seed_key(seed_artists=None, seed_tracks=None, seed_genres=None):
+    """
+    Returns a canonical cache key for a seed set: the same seeds in any order, or
+    repeated, give the same key.
+    """
+    canonical = json.dumps([sorted(set(seed_artists or [])), sorted(set(seed_tracks or [])),
+                            sorted(set(seed_genres or []))])
+    return f'{RECOMMENDATIONS_CACHE_PREFIX}:{hashlib.sha256(canonical.encode()).hexdigest()}'
+
+def get_spotify_recommendations(user_token, seed_artists=None,
+                                seed_tracks=None, seed_genres=None):
+    """
+    Fetches a list of recommended songs from Spotify based on provided seeds and target attributes.
+
+    Recommendations depend only on the seeds, so they are cached in the shared Django cache
+    for every user by seed set (see SPOTIFY_RECOMMENDATIONS_CACHE). Failed requests are not
+    cached.
+
+    Args:
+        user_token (str): The Spotify access token for the user.
+        seed_artists (list of str): List of Spotify artist IDs to base recommendations on.
+        seed_tracks (list of str): List of Spotify track IDs to base recommendations on.
+        seed_genres (list of str): List of genres to base recommendations on.
+
+
+    Returns:
+        list: A list of recommended songs, where each song
+        is represented as a dictionary with details.
+    """
+    key = recommendation_seed_key(seed_artists, seed_tracks, seed_genres)
+    recommended_songs = cache.get(key)
+    if recommended_songs is None:
+        recommended_songs = _fetch_spotify_recommendations(user_token, seed_artists,
+                                                           seed_tracks, seed_genres)
+        if recommended_songs is None:
+            return []
+        cache.set(key, recommended_songs, timeout=recommendations_cache_ttl())
+    return list(recommended_songs)
+
+def get_spotify_recommendations_batch(user_token, seed_sets, max_workers=6):
+    """
+    Resolves many seed sets at once, e.g. for every user of a batch job. Cached seed sets
+    are answered from the cache, repeated ones are requested once, and the rest are
+    requested concurrently.
+
+    Parameters:
+        - user_token: any valid access token (recommendations do not depend on the user)
+        - seed_sets: list of dictionaries with optional 'seed_artists', 'seed_tracks'
+                     and 'seed_genres' lists
+        - max_workers: upper bound on the number of simultaneous requests
+
+    Returns:
+        List of recommended songs for each seed set, in the order of seed_sets
+    """
+    keys = [recommendation_seed_key(**seeds) for seeds in seed_sets]
+    resolved = cache.get_many(set(keys))
+    missing = {key: seeds for key, seeds in zip(keys, seed_sets) if key not in resolved}
+
+    if missing:
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_fetch_spotify_recommendations, user_token, **seeds): key
+                       for key, seeds in missing.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                recommended_songs = future.result()
+                if recommended_songs is not None:
+                    fetched[key] = recommended_songs
+                resolved[key] = recommended_songs or []
+        cache.set_many(fetched, timeout=recommendations_cache_ttl())
+    return [list(resolved[key]) for key in keys]
 
 def create_groq_quirky(groq_api_key, favorite_artists):
     """
@@ -239,38 +752,9 @@ def create_groq_quirky(groq_api_key, favorite_artists):
         - llama_description: the description construced by the LLM
 
     """
-    if not groq_api_key:
-        raise GroqError("GROQ_API_KEY environment variable is not set.")
-
-    client = Groq(api_key=groq_api_key)
-    description_prompt = (
-        f"Describe how someone who only listens to artists like {favorite_artists} "
-        "just to be quirky and stand out from the crowd tends to act, think, and dress."
-    )
-
-    try:
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a music analyst who roasts and insults the user "
-                               "(use 2nd perspective) behavior based on their music tastes "
-                               "in less than 100 words."
-                },
-                {
-                    "role": "user",
-                    "content": description_prompt
-                }
-            ],
-            model="llama3-8b-8192",
-        )
-
-        llama_description = response.choices[0].message.content
-    except KeyError as e:
-        llama_description = f"Key error: {str(e)}"
-    except Exception as e:
-        llama_description = f"Description unavailable due to API error: {str(e)}"  # pylint: disable=broad-exception-caught
-    return llama_description
+    return _groq_chat(groq_api_key, ROAST_SYSTEM_PROMPT,
+                      quirky_prompt(favorite_artists), 'quirky',
+                      quirky_roast(favorite_artists))
 
 def datetime_to_str(dt):
     """
@@ -298,34 +782,6 @@ def create_groq_comparison(groq_api_key, artist_1, artist_2):
     Returns:
         - llama_description: A funny roasty description of the comparison between the two artists
     """
-    if not groq_api_key:
-        raise GroqError("GROQ_API_KEY environment variable is not set.")
-
-    client = Groq(api_key=groq_api_key)
-    description_prompt = (
-        f"Compare {artist_1} and {artist_2} in a funny and way that roasts both. "
-        "Highlight their differences in style, fanbase, and anything else that makes them opposites."
-    )
-
-    try:
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a music critic who roasts and humorously compares two artists "
-                               "(use 2nd perspective) in less than 100 words. Be witty and sarcastic."
-                },
-                {
-                    "role": "user",
-                    "content": description_prompt
-                }
-            ],
-            model="llama3-8b-8192",
-        )
-
-        llama_description = response.choices[0].message.content
-    except KeyError as e:
-        llama_description = f"Key error: {str(e)}"
-    except Exception as e:
-        llama_description = f"Comparison unavailable due to API error: {str(e)}"  # pylint: disable=broad-exception-caught
-    return llama_description
+    return _groq_chat(groq_api_key, COMPARISON_SYSTEM_PROMPT,
+                      comparison_prompt(artist_1, artist_2), 'comparison',
+                      comparison_roast(artist_1, artist_2))
@@ -3,22 +3,31 @@ Views for managing Spotify user data, including updating user profiles,
 fetching favorite tracks and artists, and generating dynamic descriptions using Groq API.
 """
 
+import asyncio
+import json
+import math
 import os
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv  # Third-party imports
 from rest_framework import viewsets
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import HttpResponse
+from django.utils import timezone
 from accounts.models import SpotifyToken  # Local imports
-from .utils import (get_spotify_user_data, get_user_favorite_artists,
-                    get_user_favorite_tracks,
-                    get_top_genres, get_quirkiest_artists,
-                    create_groq_description,
-                    create_groq_quirky, create_groq_comparison)
+from .async_utils import (aget_spotify_user_data, afetch_user_top_items,
+                          acreate_groq_description)
+from .llm_metrics import get_llm_metrics, set_llm_wrap_id, tag_llm_calls
+from .loop_clients import close_loop_clients
+from .ratelimit import SpotifyRateLimitError
+from .slides import SLIDE_ITEMS, agenerate_slides, astore_slides, aget_slide, astream_slide
+from .utils import TERMS, TERM_SUFFIXES, get_stale_terms
 from .models import Song, SpotifyUser, SpotifyWrapped, DuoWrapped
 from .serializers import (SongSerializer, SpotifyUserSerializer,
                           DuoWrappedSerializer, SpotifyWrappedSerializer)
 
+load_dotenv()  # once per process, rather than re-reading .env on every request
+
 # pylint: disable=too-many-ancestors
 class SongViewSet(viewsets.ModelViewSet):
     """
@@ -36,82 +45,104 @@ class SpotifyUserViewSet(viewsets.ModelViewSet):
     serializer_class = SpotifyUserSerializer
 
 
+async def _aget_wrapped_data(wrap_id, is_duo):
+    """
+    Returns the stored fields of a SpotifyWrapped (or DuoWrapped if is_duo is 'true')
+    as a dictionary, or None if no wrap has that id.
+    """
+    model = DuoWrapped if is_duo == 'true' else SpotifyWrapped
+    return await model.objects.filter(id=wrap_id).values().afirst()  # pylint: disable=no-member
+
 
-def update_or_add_spotify_user(request):
+@close_loop_clients
+async def update_or_add_spotify_user(request):
     """
     Adds or updates the user's profile, favorite tracks, and dynamic description
     generated by the Llama3 API based on their music preferences.
+
+    Terms ingested less than SPOTIFY_INGEST_TTL ago are not refetched, and if every term
+    is fresh the stored user is returned without calling Spotify at all.
+    Pass ?force=true to refetch every term regardless.
     """
 
     # Load environment variables for later use
-    user = request.user
+    user = await request.auser()
     # Check for existing SpotifyToken
     try:
-        token_entry = SpotifyToken.objects.get(username=user.username) # pylint: disable=no-member
+        token_entry = await SpotifyToken.objects.aget(username=user.username) # pylint: disable=no-member
     except ObjectDoesNotExist:
         return HttpResponse("User add/update failed: missing access token", status=500)
 
     access_token = token_entry.access_token
 
+    force = request.GET.get('force') == 'true'
+    stored_user = await SpotifyUser.objects.select_related('user').filter(  # pylint: disable=no-member
+        user=user).afirst()
+    stale_terms = TERMS if force else get_stale_terms(stored_user)
+    if not stale_terms:
+        return JsonResponse({'spotify_user': SpotifyUserSerializer(stored_user).data})
+
     # Fetch user data from Spotify API
-    user_data = get_spotify_user_data(access_token)
+    try:
+        user_data = await aget_spotify_user_data(access_token)
+    except SpotifyRateLimitError as e:
+        # Leave the stored profile untouched and let the frontend retry later
+        response = JsonResponse({'error': 'Spotify rate limit reached, try again later'},
+                                status=503)
+        response['Retry-After'] = str(math.ceil(e.retry_after))
+        return response
 
     if user_data:
-        # Update or create the SpotifyUser
-        tracks_short = get_user_favorite_tracks(access_token, 'short_term')
-        tracks_medium = get_user_favorite_tracks(access_token, 'medium_term')
-        tracks_long = get_user_favorite_tracks(access_token, 'long_term')
-        artists_short = get_user_favorite_artists(access_token, 'short_term')
-        artists_medium = get_user_favorite_artists(access_token, 'medium_term')
-        artists_long = get_user_favorite_artists(access_token, 'long_term')
-        genres_short = get_top_genres(artists_short)
-        genres_medium = get_top_genres(artists_medium)
-        genres_long = get_top_genres(artists_long)
-        quirky_short = get_quirkiest_artists(artists_short)
-        quirky_medium = get_quirkiest_artists(artists_medium)
-        quirky_long = get_quirkiest_artists(artists_long)
-        #llama_description = get_groq_description(groq_api_key, artists_long)
-        # this has been added for demonstration purposes
-        spotify_user, created = SpotifyUser.objects.update_or_create(  # pylint: disable=no-member
+        # Fetch the stale terms' top-item lists in parallel now that /me succeeded
+        top_items = await afetch_user_top_items(access_token, terms=stale_terms)
+        ingested_at = timezone.now()
+
+        defaults = {
+            'user': user,
+            'spotify_id': user_data.get('id'),
+            'display_name': user.username,
+            'email': user_data.get('email'),
+            'profile_image_url': user_data.get('images')[0]['url']
+            if user_data.get('images') else None,
+        }
+        errors = {}
+        for term, result in top_items.items():
+            if result['errors']:
+                # Keep whatever is already stored for a term that failed
+                errors[term] = result['errors']
+                continue
+            suffix = TERM_SUFFIXES[term]
+            defaults[f'favorite_tracks_{suffix}'] = result['tracks']
+            defaults[f'favorite_artists_{suffix}'] = result['artists']
+            defaults[f'favorite_genres_{suffix}'] = result['genres']
+            defaults[f'quirkiest_artists_{suffix}'] = result['quirkiest']
+            defaults[f'last_ingested_{suffix}'] = ingested_at
+
+        spotify_user, created = await SpotifyUser.objects.aupdate_or_create(  # pylint: disable=no-member
             spotify_id=user_data['id'],
-            defaults={
-                'user': user,
-                'spotify_id': user_data.get('id'),
-                'display_name': user.username,
-                'email': user_data.get('email'),
-                'profile_image_url': user_data.get('images')[0]['url']
-                if user_data.get('images') else None,
-                'favorite_tracks_short': tracks_short,
-                'favorite_tracks_medium': tracks_medium,
-                'favorite_tracks_long': tracks_long,
-                'favorite_artists_short': artists_short,
-                'favorite_artists_medium': artists_medium,
-                'favorite_artists_long': artists_long,
-                'favorite_genres_short': genres_short,
-                'favorite_genres_medium': genres_medium,
-                'favorite_genres_long': genres_long,
-                'quirkiest_artists_short': quirky_short,
-                'quirkiest_artists_medium': quirky_medium,
-                'quirkiest_artists_long': quirky_long
-            }
+            defaults=defaults
         )
-        return JsonResponse({'spotify_user': SpotifyUserSerializer(spotify_user).data})
+        response_data = {'spotify_user': SpotifyUserSerializer(spotify_user).data}
+        if errors:
+            response_data['errors'] = errors
+        return JsonResponse(response_data)
 
 
     return JsonResponse({'error': 'Could not fetch user data from Spotify'}, status=500)
 
-def add_spotify_wrapped(request):
+@close_loop_clients
+@tag_llm_calls
+async def add_spotify_wrapped(request):
     """
     Adds a Spotify Wrapped containing all necessary information to the user's profile.
     Parameters:
         - request: incoming web request.
         - term_selection: short_term, medium_term, or long_term. User-selected.
     """
-    load_dotenv()
     groq_api_key = os.getenv('GROQ_API_KEY')
     term_selection = request.GET.get('termselection')
-    user = request.user
-    spotify_user = SpotifyUser.objects.get(display_name=user.username) # pylint: disable=no-member
+    user = await request.auser()
+    spotify_user = await SpotifyUser.objects.aget(display_name=user.username) # pylint: disable=no-member
     favorite_artists = None
     favorite_tracks = None
     favorite_genres = None
@@ -134,22 +165,34 @@ def add_spotify_wrapped(request):
             quirkiest_artists = spotify_user.quirkiest_artists_long
     if favorite_artists is None:
         return HttpResponse("Bad term selection", status=400)
-    wrapped = SpotifyWrapped.objects.create(  # pylint: disable=no-member
+
+    # Generate the slide texts alongside the description, so the slides only read them
+    llama_description, (slides, complete) = await asyncio.gather(
+        acreate_groq_description(groq_api_key, favorite_artists),
+        agenerate_slides({'favorite_artists': favorite_artists,
+                          'favorite_tracks': favorite_tracks,
+                          'favorite_genres': favorite_genres,
+                          'quirkiest_artists': quirkiest_artists}, is_duo=False))
+    wrapped = await SpotifyWrapped.objects.acreate(  # pylint: disable=no-member
         user=spotify_user.display_name,
         favorite_artists=favorite_artists,
         favorite_tracks=favorite_tracks,
         favorite_genres=favorite_genres,
         quirkiest_artists=quirkiest_artists,
-        llama_description=create_groq_description(groq_api_key, favorite_artists),
+        llama_description=llama_description,
         llama_songrecs=["placeholder1", "placeholder2", "placeholder3"],)
+    set_llm_wrap_id(wrapped.id)
+    await astore_slides(wrapped.id, False, {section: slides[section] for section in complete})
 
     wrapped_data = SpotifyWrappedSerializer(wrapped).data
     spotify_user.past_roasts.append(wrapped_data)
-    spotify_user.save(update_fields=['past_roasts'])
+    await spotify_user.asave(update_fields=['past_roasts'])
     return JsonResponse({'spotify_wrapped': wrapped_data})
 
 
-def add_duo_wrapped(request):
+@close_loop_clients
+@tag_llm_calls
+async def add_duo_wrapped(request):
     """
     Adds a Duo Wrapped containing all necessary information to both users' profiles.
     Parameters:
@@ -157,15 +200,14 @@ def add_duo_wrapped(request):
         - user2: display name of invited user.
         - term_selection: short_term, medium_term, or long_term. Selected by user1.
     """
-    load_dotenv()
     groq_api_key = os.getenv('GROQ_API_KEY')
     user1 = request.GET.get('user1')
     user2 = request.GET.get('user2')
     term_selection = request.GET.get('termselection')
 
-    spotify_user1 = SpotifyUser.objects.get(display_name=user1)  # pylint: disable=no-member
+    spotify_user1 = await SpotifyUser.objects.aget(display_name=user1)  # pylint: disable=no-member
     try:
-        spotify_user2 = SpotifyUser.objects.get(display_name=user2)  # pylint: disable=no-member
+        spotify_user2 = await SpotifyUser.objects.aget(display_name=user2)  # pylint: disable=no-member
     except SpotifyUser.DoesNotExist:  # pylint: disable=no-member
         return HttpResponse("User display name not found", status=500)
 
@@ -216,183 +258,167 @@ def add_duo_wrapped(request):
     if favorite_artists is None:
         return HttpResponse("Bad term selection", status=400)
 
-    wrapped = DuoWrapped.objects.create(  # pylint: disable=no-member
+    # Generate the slide texts alongside the description, so the slides only read them
+    llama_description, (slides, complete) = await asyncio.gather(
+        acreate_groq_description(groq_api_key, favorite_artists),
+        agenerate_slides({'favorite_artists': favorite_artists,
+                          'favorite_tracks': favorite_tracks,
+                          'favorite_genres': favorite_genres,
+                          'quirkiest_artists': quirkiest_artists}, is_duo=True))
+    wrapped = await DuoWrapped.objects.acreate(  # pylint: disable=no-member
         user=spotify_user1.display_name,
         user2=spotify_user2.display_name,
         favorite_artists=favorite_artists,
         favorite_tracks=favorite_tracks,
         quirkiest_artists=quirkiest_artists,
         favorite_genres=favorite_genres,
-        llama_description=create_groq_description(groq_api_key, favorite_artists),
+        llama_description=llama_description,
         llama_songrecs='none'
     )
+    set_llm_wrap_id(wrapped.id)
+    await astore_slides(wrapped.id, True, {section: slides[section] for section in complete})
 
     wrapped_data = DuoWrappedSerializer(wrapped).data
     spotify_user1.past_roasts.append(wrapped_data)
-    spotify_user1.save(update_fields=['past_roasts'])
+    await spotify_user1.asave(update_fields=['past_roasts'])
     spotify_user2.past_roasts.append(wrapped_data)
-    spotify_user2.save(update_fields=['past_roasts'])
+    await spotify_user2.asave(update_fields=['past_roasts'])
 
-    print(wrapped.id)
     return JsonResponse({'duo_wrapped': wrapped_data})
 
-def display_artists(request):
+@close_loop_clients
+@tag_llm_calls
+async def display_artists(request):
     """Displays artists for the frontend depending on the timeframe"""
-    load_dotenv()
     id = request.GET.get('id')
     is_duo = request.GET.get('isDuo')
-    if is_duo == 'true':
-        try:
-            wrapped_data = DuoWrapped.objects.filter(id=id).values()
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-        wrapped_data = list(wrapped_data)[0]
-    else:
-        try:
-            wrapped_data = SpotifyWrapped.objects.filter(id=id).values()
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-        wrapped_data = list(wrapped_data)[0]
-
-    # Assume artists are limited to top 5 as per the original code
-    artists = wrapped_data['favorite_artists'][:5]
+    wrapped_data = await _aget_wrapped_data(id, is_duo)
+    if wrapped_data is None:
+        return HttpResponse("Wrapped grab failed: no data", status=500)
+
+    artists = wrapped_data['favorite_artists'][:SLIDE_ITEMS]
+    descriptions = await aget_slide(wrapped_data, is_duo == 'true', 'artists')
 
     out = []
-    for i, artist in enumerate(artists):
-        artist_info = {
+    for artist, desc in zip(artists, descriptions):
+        out.append({
             'name': artist['name'],
             'image': artist['images'][0]['url'],
-            'desc': create_groq_description(os.getenv('GROQ_API_KEY'), artist['name']),
-        }
-        if is_duo == 'true':
-        # Add comparison with the next artist if it exists
-            if i + 1 < len(artists):
-                next_artist = artists[i + 1]
-                comparison = create_groq_comparison(
-                    os.getenv('GROQ_API_KEY'),
-                    {'name': artist['name'], 'popularity': artist.get('popularity', 0)},
-                    {'name': next_artist['name'], 'popularity': next_artist.get('popularity', 0)}
-                )
-                artist_info['desc'] = comparison
-
-        out.append(artist_info)
+            'desc': desc,
+        })
 
     return JsonResponse(out, safe=False, status=200)
 
-def display_genres(request):
+@close_loop_clients
+@tag_llm_calls
+async def display_genres(request):
     '''Displays the genres for the frontend depending on the timeframe'''
-    load_dotenv()
     id = request.GET.get('id')
     is_duo = request.GET.get('isDuo')
-
-    if is_duo == 'true':
-        try:
-            wrapped_data = DuoWrapped.objects.get(id=id)
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-    else:
-        try:
-            wrapped_data = SpotifyWrapped.objects.filter(id=id).values()
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-    wrapped_data = list(wrapped_data)[0]
-    genres = wrapped_data['favorite_genres'][:5]
+    wrapped_data = await _aget_wrapped_data(id, is_duo)
+    if wrapped_data is None:
+        return HttpResponse("Wrapped grab failed: no data", status=500)
+    genres = wrapped_data['favorite_genres'][:SLIDE_ITEMS]
 
     out = {
         'genres': ', '.join(genres),
-        'desc': create_groq_description(os.getenv('GROQ_API_KEY'), ', '.join(genres))
+        'desc': await aget_slide(wrapped_data, is_duo == 'true', 'genres')
     }
     return JsonResponse(out, safe=False, status=200)
 
-def display_songs(request):
+async def _asse_events(contents, **events):
+    """
+    Formats a stream of text as server-sent events: one message per piece of text,
+    preceded by the given named events and followed by a 'done' event.
+    """
+    for name, data in events.items():
+        yield f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    async for content in contents:
+        yield f"data: {json.dumps(content)}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+def _sse_response(events):
+    """
+    Returns a streaming response for server-sent events that proxies will not buffer.
+    """
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@close_loop_clients
+@tag_llm_calls
+async def stream_genres(request):
+    '''Streams the genres slide description as server-sent events'''
+    id = request.GET.get('id')
+    is_duo = request.GET.get('isDuo')
+    wrapped_data = await _aget_wrapped_data(id, is_duo)
+    if wrapped_data is None:
+        return HttpResponse("Wrapped grab failed: no data", status=500)
+    genres = ', '.join(wrapped_data['favorite_genres'][:SLIDE_ITEMS])
+    return _sse_response(_asse_events(astream_slide(wrapped_data, is_duo == 'true', 'genres'),
+                                      genres=genres))
+
+@close_loop_clients
+@tag_llm_calls
+async def display_songs(request):
     """Displays the songs for the frontend depending on the timeframe."""
-    load_dotenv()
     id = request.GET.get('id')
     is_duo = request.GET.get('isDuo')
 
     # Fetch the appropriate wrapped data (DuoWrapped or SpotifyWrapped)
-    try:
-        if is_duo == 'true':
-            wrapped_data = DuoWrapped.objects.filter(id=id).values()
-        else:
-            wrapped_data = SpotifyWrapped.objects.filter(id=id).values()
-    except ObjectDoesNotExist:
+    wrapped_data = await _aget_wrapped_data(id, is_duo)
+    if wrapped_data is None:
         return HttpResponse("Wrapped grab failed: no data", status=500)
 
-    wrapped_data = list(wrapped_data)[0]
-
     # Get the top 5 tracks
-    tracks = wrapped_data['favorite_tracks'][:5]
+    tracks = wrapped_data['favorite_tracks'][:SLIDE_ITEMS]
+    descriptions = await aget_slide(wrapped_data, is_duo == 'true', 'tracks')
 
     out = []
-    for i, track in enumerate(tracks):
-        artist_info = {
+    for track, desc in zip(tracks, descriptions):
+        out.append({
             'name': track['name'],
             'artist': track['artists'][0]['name'],
             'image': track['album']['images'][0]['url'],
-            'desc': create_groq_description(os.getenv('GROQ_API_KEY'),
-                                            track['name'] + ' by ' + track['artists'][0]['name'])
-        }
-
-        # Add duo comparison logic
-        if is_duo == 'true' and i + 1 < len(tracks):
-            next_track = tracks[i + 1]
-            comparison = create_groq_comparison(
-                os.getenv('GROQ_API_KEY'),
-                track['name'] + " by " + track['artists'][0]['name'],
-                next_track['name'] + " by " + next_track['artists'][0]['name'],
-            )
-            artist_info['desc'] = comparison
-
-        out.append(artist_info)
+            'desc': desc,
+        })
 
     return JsonResponse(out, safe=False, status=200)
 
-def display_quirky(request):
+@close_loop_clients
+@tag_llm_calls
+async def display_quirky(request):
     '''Displays the songs for the frontend depending on the timeframe'''
-    load_dotenv()
     id = request.GET.get('id')
 
     is_duo = request.GET.get('isDuo')
-
-    if is_duo == 'true':
-        try:
-            wrapped_data = DuoWrapped.objects.filter(id=id).values()
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-    else:
-        try:
-            wrapped_data = SpotifyWrapped.objects.filter(id=id).values()
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-    wrapped_data = list(wrapped_data)[0]
-    tracks = wrapped_data['quirkiest_artists'][:5]
-    out = []
-    for track in tracks:
-        out.append(track['name'])
-
-    desc = create_groq_quirky(os.getenv('GROQ_API_KEY'),
-                                            ', '.join(out))
+    wrapped_data = await _aget_wrapped_data(id, is_duo)
+    if wrapped_data is None:
+        return HttpResponse("Wrapped grab failed: no data", status=500)
+    desc = await aget_slide(wrapped_data, is_duo == 'true', 'quirky')
     return JsonResponse(desc, safe=False, status=200)
 
-def display_summary(request):
+@close_loop_clients
+@tag_llm_calls
+async def stream_quirky(request):
+    '''Streams the quirky slide roast as server-sent events'''
+    id = request.GET.get('id')
+    is_duo = request.GET.get('isDuo')
+    wrapped_data = await _aget_wrapped_data(id, is_duo)
+    if wrapped_data is None:
+        return HttpResponse("Wrapped grab failed: no data", status=500)
+    return _sse_response(_asse_events(astream_slide(wrapped_data, is_duo == 'true', 'quirky')))
+
+@close_loop_clients
+async def display_summary(request):
     '''Displays a summary of a users music taste'''
-    load_dotenv()
     id = request.GET.get('id')
 
     is_duo = request.GET.get('isDuo')
-
-    if is_duo == 'true':
-        try:
-            wrapped_data = DuoWrapped.objects.filter(id=id).values()
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-    else:
-        try:
-            wrapped_data = SpotifyWrapped.objects.filter(id=id).values()
-        except ObjectDoesNotExist:
-            return HttpResponse("Wrapped grab failed: no data", status=500)
-    wrapped_data = list(wrapped_data)[0]
+    wrapped_data = await _aget_wrapped_data(id, is_duo)
+    if wrapped_data is None:
+        return HttpResponse("Wrapped grab failed: no data", status=500)
     artists = wrapped_data['favorite_artists'][:5]
     genres = wrapped_data['favorite_genres'][:5]
     tracks = wrapped_data['favorite_tracks'][:5]
@@ -415,12 +441,31 @@ def display_summary(request):
 
     return JsonResponse(summary, safe=False, status=200)
 
-def display_history(request):
+@close_loop_clients
+async def display_llm_metrics(request):
+    """
+    Returns latency and token aggregates of the LLM calls of the last hours (default 24),
+    in total, per function, per view and per answering model, with the `top` (default 10)
+    heaviest prompts. Only staff users may read them.
+    """
+    user = await request.auser()
+    if not user.is_staff:
+        return HttpResponse("LLM metrics are only available to staff", status=403)
+    try:
+        hours = float(request.GET.get('hours', 24))
+        top = int(request.GET.get('top', 10))
+    except ValueError:
+        return HttpResponse("hours and top must be numbers", status=400)
+    metrics = await sync_to_async(get_llm_metrics)(hours=hours, top=top)
+    return JsonResponse(metrics, status=200)
+
+@close_loop_clients
+async def display_history(request):
     '''Display history of wraps for a user'''
-    user = request.user
+    user = await request.auser()
 
     try:
-        user_data = SpotifyUser.objects.get(display_name=user.username)
+        user_data = await SpotifyUser.objects.aget(display_name=user.username)
     except ObjectDoesNotExist:
         return HttpResponse("User grab failed: no data", status=500)
 
@@ -446,10 +491,6 @@ def check_username_exists(request):
     """
     username = request.GET.get('username')  # Get the username from the request
 
-    users = SpotifyUser.objects.all()  # Retrieve all SpotifyUser objects
-    for user in users:
-        print(user.display_name)
-
     if not username:
         return JsonResponse({'error': 'No username provided'}, status=400)
 
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -118,6 +119,27 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/ref/settings/#caches
+# Shared by every worker: the Spotify rate limit, tokens, artists and recommendations are
+# kept here. Set REDIS_URL in production; without it each process has its own cache.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -158,3 +180,167 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Spotify base URLs. Point them at the local stand-in server for load and integration
+# testing, e.g. SPOTIFY_API_BASE_URL=http://127.0.0.1:8765 after manage.py run_spotify_standin
+
+SPOTIFY_API_BASE_URL = os.environ.get('SPOTIFY_API_BASE_URL', 'https://api.spotify.com')
+SPOTIFY_ACCOUNTS_BASE_URL = os.environ.get('SPOTIFY_ACCOUNTS_BASE_URL',
+                                           'https://accounts.spotify.com')
+
+# Spotify HTTP connection pooling (see spotify_data/client.py)
+
+SPOTIFY_HTTP_POOL_CONNECTIONS = 4
+SPOTIFY_HTTP_POOL_MAXSIZE = 20
+SPOTIFY_HTTP_HOST_LIMITS = {
+    'api.spotify.com': 20,
+    'accounts.spotify.com': 10,
+}
+SPOTIFY_HTTP_POOL_BLOCK = False
+# HTTP/2 for the async client, only used when the optional h2 package is installed
+SPOTIFY_HTTP2 = False
+
+# App-wide Spotify rate limit shared through the cache (see spotify_data/ratelimit.py).
+# Spotify measures its limit over a rolling 30 second window.
+
+SPOTIFY_RATE_LIMIT = {
+    'requests': 100,  # tokens per window
+    'window': 30,  # seconds
+    'max_retries': 3,  # retries of a 429 response before giving up
+    'max_wait': 10,  # seconds a request may wait before failing with a rate-limit error
+}
+
+# How deep to page through each term's top items (Spotify returns at most 50 per page).
+# Genre and quirkiness stats use the full depth; only the first STORED items are saved.
+
+SPOTIFY_TOP_ITEMS_DEPTH = 100
+SPOTIFY_TOP_ITEMS_STORED = 20
+
+# Seconds before updateuser refetches a term's top items from Spotify
+# (pass ?force=true to refetch regardless).
+
+SPOTIFY_INGEST_TTL = {
+    'short_term': 60 * 60,
+    'medium_term': 6 * 60 * 60,
+    'long_term': 24 * 60 * 60,
+}
+
+# Seconds that artists looked up through /v1/artists to enrich track artists stay cached.
+# The cache is shared by every user, so popular artists are only fetched once per TTL.
+
+SPOTIFY_ARTIST_CACHE_TTL = 24 * 60 * 60
+
+# Spotify recommendations are kept in the shared Django cache for every user, keyed by
+# seed set.
+
+SPOTIFY_RECOMMENDATIONS_CACHE = {
+    'ttl': 6 * 60 * 60,  # seconds
+}
+
+# Spotify token caching and proactive refresh (see accounts/utils.py)
+
+SPOTIFY_TOKEN_CACHE = {
+    'ttl': 300,  # seconds a token stays in the shared Django cache
+    'local_ttl': 30,  # seconds a token stays in each process's LRU cache
+    'max_entries': 1024,  # tokens kept per process
+    'refresh_margin': 300,  # refresh in the background this many seconds before expiry
+    'refresh_lock_timeout': 15,  # seconds a refresh may hold the per-user lock
+    'refresh_wait': 10,  # seconds concurrent callers wait for that refresh
+}
+
+# LLM calls made while rendering one slide run concurrently, at most LLM_CONCURRENCY at a
+# time. Calls not finished after LLM_DEADLINE seconds are replaced with fallback text.
+
+LLM_CONCURRENCY = 5
+LLM_DEADLINE = 8  # seconds
+
+# LLM completions are cached in the LLMCompletion table behind an in-memory LRU, keyed by
+# model, system prompt and normalized user prompt (see spotify_data/llm_cache.py).
+
+LLM_CACHE = {
+    'enabled': True,
+    'ttl': 7 * 24 * 60 * 60,  # seconds a completion is reused
+    'memory_entries': 2048,  # completions kept in memory per process
+    'max_rows': 50000,  # the oldest rows beyond this are deleted
+}
+
+# Bounds of the user prompts sent to the LLM (see spotify_data/prompts.py). Subjects are
+# rendered as at most max_items names with their top genres and a popularity bucket, and
+# every prompt is cut to max_tokens estimated tokens.
+
+LLM_PROMPT = {
+    'max_items': 5,
+    'max_genres': 3,
+    'max_name_chars': 40,
+    'max_tokens': 120,
+}
+
+# LLM backend behind the create_groq_* functions (see spotify_data/llm_clients.py):
+# 'groq' for the Groq API, 'standin' for an OpenAI/Groq-compatible server at
+# LLM_STANDIN_URL (e.g. manage.py run_llm_standin), or 'fake' for deterministic
+# in-process completions. LLM_FAKE sets the fake's latency, tokens_per_second and
+# error_rate (see spotify_data/llm_standin.py).
+
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'groq')
+LLM_STANDIN_URL = os.environ.get('LLM_STANDIN_URL', 'http://127.0.0.1:8766')
+LLM_FAKE = {
+    'latency': 'fixed:0',  # latency distribution in ms before the first token
+    'tokens_per_second': 0,  # 0 sends the whole completion at once
+    'error_rate': 0.0,
+}
+
+# Registry of the LLM models and their providers (see spotify_data/llm_hedging.py).
+# Providers other than 'groq' are OpenAI/Groq-compatible APIs at base_url, called with the
+# API key in the api_key_env environment variable. Every call goes to LLM_PRIMARY_MODEL.
+
+LLM_PROVIDERS = {
+    'groq': {'base_url': None, 'api_key_env': None},  # the key passed to create_groq_*
+}
+LLM_MODELS = {
+    'llama3-8b': {'provider': 'groq', 'model': 'llama3-8b-8192'},
+    'llama3.1-8b': {'provider': 'groq', 'model': 'llama-3.1-8b-instant'},
+}
+LLM_PRIMARY_MODEL = 'llama3-8b'
+
+# Hedged LLM calls (see spotify_data/llm_hedging.py). When enabled, an async call the
+# primary model has not answered after its recent p90 latency (percentile) is also sent
+# to the alternate model; the first answer wins and the other request is cancelled.
+
+LLM_HEDGING = {
+    'enabled': False,
+    'alternate': 'llama3.1-8b',
+    'percentile': 0.9,
+    'window': 200,  # latest calls per function the delay is derived from
+    'min_samples': 20,  # calls before the delay is derived rather than initial_delay
+    'initial_delay': 1.0,  # seconds
+    'min_delay': 0.1,  # seconds
+    'max_delay': 3.0,  # seconds
+    'max_rate': 0.2,  # the most of the window's calls that may be hedged
+}
+
+# Groq clients are shared per API key, each with a keep-alive connection pool
+# (see spotify_data/llm_clients.py)
+
+GROQ_HTTP_POOL_MAXSIZE = 20
+GROQ_HTTP_KEEPALIVE_EXPIRY = 30  # seconds an idle connection is kept open
+GROQ_MAX_RETRIES = 0  # failures are handled by the circuit breaker below
+
+# Every LLM call is recorded with its latency and tokens in the LLMCall table (see
+# spotify_data/llm_metrics.py), written in batches of flush_every. Aggregates are served
+# at /spotify_data/llmmetrics and printed by manage.py llm_report.
+
+LLM_METRICS = {
+    'enabled': True,
+    'flush_every': 20,  # records buffered before one bulk insert
+    'max_rows': 100000,  # the oldest rows beyond this are deleted
+}
+
+# Circuit breaker around Groq calls (see spotify_data/llm_breaker.py). After
+# failure_threshold failures in a row, slides get template roasts without calling Groq
+# for reset_timeout seconds, then a single probe call checks whether Groq has recovered.
+
+LLM_CIRCUIT_BREAKER = {
+    'failure_threshold': 5,
+    'reset_timeout': 30,  # seconds
+    'call_timeout': 5,  # seconds a single Groq call may take
+}